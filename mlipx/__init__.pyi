@@ -1,4 +1,6 @@
 from . import abc, spec
+from .cache import CachedModel
+from .memoize import set_output_cache_size
 from .nodes.adsorption import BuildASEslab, RelaxAdsorptionConfigs
 from .nodes.apply_calculator import ApplyCalculator
 from .nodes.co_splitting import COSplitting
@@ -16,7 +18,11 @@ from .nodes.invariances import (
 )
 from .nodes.io import LoadDataFile
 from .nodes.modifier import TemperatureRampModifier
-from .nodes.molecular_dynamics import LangevinConfig, MolecularDynamics
+from .nodes.molecular_dynamics import (
+    LangevinConfig,
+    MolecularDynamics,
+    MolecularDynamicsEnsemble,
+)
 from .nodes.mp_api import MPRester
 from .nodes.nebs import NEBinterpolate, NEBs
 from .nodes.observer import MaximumForceObserver
@@ -25,7 +31,11 @@ from .nodes.phase_diagram import PhaseDiagram
 from .nodes.pourbaix_diagram import PourbaixDiagram
 from .nodes.rattle import Rattle
 from .nodes.smiles import BuildBox, Smiles2Conformers
-from .nodes.structure_optimization import StructureOptimization
+from .nodes.structure_optimization import (
+    BatchedStructureOptimization,
+    CascadeStructureOptimization,
+    StructureOptimization,
+)
 from .nodes.updated_frames import UpdateFramesCalc
 from .nodes.vibrational_analysis import VibrationalAnalysis
 from .project import Project
@@ -34,10 +44,13 @@ from .version import __version__
 __all__ = [
     "abc",
     "StructureOptimization",
+    "BatchedStructureOptimization",
+    "CascadeStructureOptimization",
     "LoadDataFile",
     "MaximumForceObserver",
     "TemperatureRampModifier",
     "MolecularDynamics",
+    "MolecularDynamicsEnsemble",
     "LangevinConfig",
     "ApplyCalculator",
     "CalculateFormationEnergy",
@@ -53,6 +66,8 @@ __all__ = [
     "HomonuclearDiatomics",
     "MPRester",
     "GenericASECalculator",
+    "CachedModel",
+    "set_output_cache_size",
     "FilterAtoms",
     "EnergyVolumeCurve",
     "BuildBox",
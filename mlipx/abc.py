@@ -2,18 +2,23 @@
 
 import abc
 import dataclasses
+import functools
 import pathlib
 import typing as t
 from enum import Enum
 
 import ase
 import h5py
+import numpy as np
 import plotly.graph_objects as go
-import znh5md
 import zntrack
 from ase.calculators.calculator import Calculator
 from ase.md.md import MolecularDynamics
 
+from mlipx.columnar import COLUMNS, read_h5md_columns
+from mlipx.frames import H5MDFrames
+from mlipx.memoize import cached_output
+
 T = t.TypeVar("T", bound=zntrack.Node)
 
 
@@ -21,6 +26,14 @@ class Optimizer(str, Enum):
     FIRE = "FIRE"
     BFGS = "BFGS"
     LBFGS = "LBFGS"
+    PreconLBFGS = "PreconLBFGS"
+    PreconFIRE = "PreconFIRE"
+
+
+class CellFilter(str, Enum):
+    FrechetCellFilter = "FrechetCellFilter"
+    ExpCellFilter = "ExpCellFilter"
+    UnitCellFilter = "UnitCellFilter"
 
 
 class ASEKeys(str, Enum):
@@ -42,6 +55,31 @@ class NodeWithCalculator(t.Protocol[T]):
         ...
 
 
+class BatchCalculator(t.Protocol):
+    def calculate_batch(
+        self, frames: list[ase.Atoms], properties: list[str] | None = None
+    ) -> list[dict[str, t.Any]]:
+        """Evaluate multiple structures in a single call.
+
+        Returns one ASE-style results dictionary per structure,
+        in the same order as `frames`.
+        """
+        ...
+
+
+class NodeWithBatchCalculator(NodeWithCalculator[T], t.Protocol[T]):
+    """Optional extension of `NodeWithCalculator` for batched inference.
+
+    Models that can evaluate many structures at once should implement
+    `get_batch_calculator`. For all other models, `mlipx.batching.get_batch_calculator`
+    wraps the ASE calculator from `get_calculator` instead.
+    """
+
+    def get_batch_calculator(self, **kwargs) -> BatchCalculator:
+        """Load a calculator that evaluates lists of structures at once."""
+        ...
+
+
 class NodeWithMolecularDynamics(t.Protocol[T]):
     def get_molecular_dynamics(self, atoms: ase.Atoms) -> MolecularDynamics: ...
 
@@ -55,8 +93,61 @@ class ComparisonResults(t.TypedDict):
     figures: FIGURES
 
 
+@dataclasses.dataclass
+class DynamicsStep:
+    """Quantities of a single dynamics step.
+
+    Each quantity is computed once on first access and shared by the plots,
+    observers and modifiers of the step.
+
+    Parameters
+    ----------
+    step : int
+        Index of the step.
+    atoms : ase.Atoms
+        Atoms object with the calculator attached.
+    """
+
+    step: int
+    atoms: ase.Atoms
+
+    @functools.cached_property
+    def energy(self) -> float:
+        return self.atoms.get_potential_energy()
+
+    @functools.cached_property
+    def forces(self) -> np.ndarray:
+        return self.atoms.get_forces()
+
+    @functools.cached_property
+    def force_norms(self) -> np.ndarray:
+        return np.linalg.norm(self.forces, axis=1)
+
+    @functools.cached_property
+    def fmax(self) -> float:
+        return np.max(self.force_norms)
+
+    @functools.cached_property
+    def fnorm(self) -> float:
+        return np.linalg.norm(self.forces)
+
+    @functools.cached_property
+    def temperature(self) -> float:
+        return self.atoms.get_temperature()
+
+
 @dataclasses.dataclass
 class DynamicsObserver:
+    """Check the state of a dynamics simulation.
+
+    Parameters
+    ----------
+    interval : int, default=1
+        Only check every `interval`-th step.
+    """
+
+    interval: int = dataclasses.field(default=1, kw_only=True)
+
     @property
     def name(self) -> str:
         return self.__class__.__name__
@@ -67,6 +158,10 @@ class DynamicsObserver:
     @abc.abstractmethod
     def check(self, atoms: ase.Atoms) -> bool: ...
 
+    def check_step(self, step: DynamicsStep) -> bool:
+        """Check a step, reusing the quantities already computed for it."""
+        return self.check(step.atoms)
+
 
 @dataclasses.dataclass
 class DynamicsModifier:
@@ -77,6 +172,10 @@ class DynamicsModifier:
     @abc.abstractmethod
     def modify(self, thermostat, step, total_steps) -> None: ...
 
+    def modify_step(self, thermostat, step: DynamicsStep) -> None:
+        """Modify the thermostat, reusing the quantities computed for the step."""
+        self.modify(thermostat, step.step)
+
 
 class ProcessAtoms(zntrack.Node):
     data: list[ase.Atoms] = zntrack.deps()
@@ -84,11 +183,23 @@ class ProcessAtoms(zntrack.Node):
 
     frames_path: pathlib.Path = zntrack.outs_path(zntrack.nwd / "frames.h5")
 
-    @property
-    def frames(self) -> FRAMES:
-        with self.state.fs.open(self.frames_path, "r") as f:
+    @cached_output
+    def frames(self) -> H5MDFrames:
+        return H5MDFrames(self.state.fs, self.frames_path)
+
+    def get_columns(
+        self,
+        keys: t.Sequence[str] = ("numbers", "positions", "energy", "forces"),
+        start: int | None = None,
+        stop: int | None = None,
+    ) -> COLUMNS:
+        """Read properties of the frames as NumPy arrays without building atoms.
+
+        See `mlipx.columnar.read_h5md_columns` for the layout of the arrays.
+        """
+        with self.state.fs.open(self.frames_path, "rb") as f:
             with h5py.File(f, "r") as h5f:
-                return znh5md.IO(file_handle=h5f)[:]
+                return read_h5md_columns(h5f, keys, start, stop)
 
     @property
     def figures(self) -> FIGURES: ...
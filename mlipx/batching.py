@@ -0,0 +1,295 @@
+"""Helpers for evaluating calculators on batches of structures."""
+
+import collections
+import contextlib
+import dataclasses
+import itertools
+import math
+import multiprocessing
+import os
+import time
+import typing as t
+from concurrent.futures import Future, ProcessPoolExecutor
+
+import ase
+from ase.calculators.calculator import Calculator
+from ase.calculators.singlepoint import SinglePointCalculator
+
+from mlipx.abc import BatchCalculator, NodeWithCalculator
+from mlipx.cache import CacheInfo, get_cache_info
+from mlipx.utils import calculate_properties
+
+
+def batched(iterable: t.Iterable, size: int) -> t.Iterator[list]:
+    """Yield successive lists of length `size` from `iterable`.
+
+    The last batch may be shorter. Equivalent to `itertools.batched`
+    which is only available for Python 3.12+.
+    """
+    if size < 1:
+        raise ValueError(f"Batch size must be at least 1, got {size}")
+    iterator = iter(iterable)
+    while batch := list(itertools.islice(iterator, size)):
+        yield batch
+
+
+def calculate_frames(
+    calc: BatchCalculator,
+    frames: list[ase.Atoms],
+    properties: list[str] | None = None,
+) -> None:
+    """Evaluate `frames` in a single batch and attach the results to each atoms.
+
+    The results are attached with a `SinglePointCalculator`, so they can be
+    accessed through the ASE API, e.g. `atoms.get_forces()`, until the atoms
+    are modified.
+    """
+    results = calc.calculate_batch(frames, properties)
+    for atoms, atoms_results in zip(frames, results):
+        atoms.calc = SinglePointCalculator(atoms)
+        atoms.calc.results = atoms_results
+
+
+@dataclasses.dataclass
+class ASEBatchCalculator:
+    """Adapter to use a plain ASE calculator as `BatchCalculator`.
+
+    The structures are evaluated one after another with the wrapped calculator.
+
+    Parameters
+    ----------
+    calc : Calculator
+        The ASE calculator to wrap.
+    """
+
+    calc: Calculator
+
+    def calculate_batch(
+        self, frames: list[ase.Atoms], properties: list[str] | None = None
+    ) -> list[dict[str, t.Any]]:
+        if properties is None:
+            properties = ["energy"]
+        return [calculate_properties(atoms, self.calc, properties) for atoms in frames]
+
+
+def _is_out_of_memory(error: Exception) -> bool:
+    # torch.cuda.OutOfMemoryError is not a MemoryError
+    return isinstance(error, MemoryError) or type(error).__name__ == "OutOfMemoryError"
+
+
+@dataclasses.dataclass
+class AtomBudgetScheduler:
+    """Evaluate structures in batches limited by the total number of atoms.
+
+    The structures are sorted by size and grouped into batches with at most
+    `max_atoms` atoms, so small structures are evaluated together, while large
+    structures are evaluated alone. If a batch runs out of memory, the budget
+    is halved and the batch is retried. The results are returned in the
+    original order.
+
+    Parameters
+    ----------
+    calc : BatchCalculator
+        Calculator to evaluate the batches with.
+    max_atoms : int
+        Initial maximum number of atoms per batch.
+
+    Attributes
+    ----------
+    histogram : collections.Counter
+        Number of evaluated batches for each batch size.
+    """
+
+    calc: BatchCalculator
+    max_atoms: int
+    histogram: collections.Counter = dataclasses.field(
+        default_factory=collections.Counter, init=False
+    )
+
+    def calculate_batch(
+        self, frames: list[ase.Atoms], properties: list[str] | None = None
+    ) -> list[dict[str, t.Any]]:
+        order = sorted(range(len(frames)), key=lambda idx: len(frames[idx]))
+        results: list[dict | None] = [None] * len(frames)
+        position = 0
+        while position < len(order):
+            indices = [order[position]]
+            n_atoms = len(frames[order[position]])
+            for idx in order[position + 1 :]:
+                if n_atoms + len(frames[idx]) > self.max_atoms:
+                    break
+                indices.append(idx)
+                n_atoms += len(frames[idx])
+
+            try:
+                batch_results = self.calc.calculate_batch(
+                    [frames[idx] for idx in indices], properties
+                )
+            except Exception as error:
+                if len(indices) == 1 or not _is_out_of_memory(error):
+                    raise
+                self.max_atoms = max(1, self.max_atoms // 2)
+                continue
+
+            for idx, atoms_results in zip(indices, batch_results):
+                results[idx] = atoms_results
+            self.histogram[len(indices)] += 1
+            position += len(indices)
+        return results
+
+
+def get_batch_calculator(model: NodeWithCalculator, **kwargs) -> BatchCalculator:
+    """Get a batched calculator for the given model.
+
+    Uses `get_batch_calculator` if the model provides it and falls back
+    to wrapping the ASE calculator from `get_calculator` otherwise.
+    """
+    if hasattr(model, "get_batch_calculator"):
+        return model.get_batch_calculator(**kwargs)
+    return ASEBatchCalculator(model.get_calculator(**kwargs))
+
+
+_WORKER_CALCULATOR: BatchCalculator | None = None
+
+
+def _init_worker(
+    model: NodeWithCalculator, n_threads: int, max_atoms: int | None
+) -> None:
+    global _WORKER_CALCULATOR
+    for key in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[key] = str(n_threads)
+    with contextlib.suppress(ImportError):
+        import torch
+
+        torch.set_num_threads(n_threads)
+    _WORKER_CALCULATOR = get_batch_calculator(model)
+    if max_atoms is not None:
+        _WORKER_CALCULATOR = AtomBudgetScheduler(_WORKER_CALCULATOR, max_atoms)
+
+
+def _calculate_in_worker(
+    frames: list[ase.Atoms], properties: list[str] | None
+) -> tuple[list[dict[str, t.Any]], float, collections.Counter, CacheInfo | None]:
+    histogram = getattr(_WORKER_CALCULATOR, "histogram", collections.Counter())
+    previous = histogram.copy()
+    previous_cache_info = get_cache_info(_WORKER_CALCULATOR)
+    start = time.perf_counter()
+    results = _WORKER_CALCULATOR.calculate_batch(frames, properties)
+    busy_time = time.perf_counter() - start
+
+    cache_info = get_cache_info(_WORKER_CALCULATOR)
+    if cache_info is not None:
+        cache_info = CacheInfo(
+            hits=cache_info.hits - previous_cache_info.hits,
+            misses=cache_info.misses - previous_cache_info.misses,
+            currsize=cache_info.currsize,
+        )
+    return results, busy_time, histogram - previous, cache_info
+
+
+@dataclasses.dataclass
+class ProcessPoolBatchCalculator:
+    """Evaluate batches of structures in a pool of worker processes.
+
+    Each worker loads its own calculator from the model
+    and limits the number of threads it uses.
+
+    Parameters
+    ----------
+    model : NodeWithCalculator
+        Model providing the calculator. Must be picklable.
+    n_workers : int
+        Number of worker processes.
+    n_threads : int, optional
+        Number of threads per worker. Defaults to the
+        number of CPUs divided by `n_workers`.
+    max_atoms : int, optional
+        If given, each worker evaluates the structures
+        it receives with an `AtomBudgetScheduler`.
+
+    Attributes
+    ----------
+    busy_time : float
+        Accumulated time in seconds the workers spent evaluating structures.
+    histogram : collections.Counter
+        Number of evaluated batches for each batch size, if `max_atoms` is set.
+    cache_info : CacheInfo, optional
+        Cache hits and misses summed over all workers, if the model
+        is a `CachedModel`.
+
+    Notes
+    -----
+    By default, the workers are started for each call and shut down afterwards.
+    Use the calculator as context manager to keep them running for many calls,
+    e.g. once per step of a simulation.
+    """
+
+    model: NodeWithCalculator
+    n_workers: int
+    n_threads: int | None = None
+    max_atoms: int | None = None
+    busy_time: float = dataclasses.field(default=0.0, init=False)
+    histogram: collections.Counter = dataclasses.field(
+        default_factory=collections.Counter, init=False
+    )
+    cache_info: CacheInfo | None = dataclasses.field(default=None, init=False)
+    _pool: ProcessPoolExecutor | None = dataclasses.field(
+        default=None, init=False, repr=False
+    )
+
+    def _start_pool(self) -> ProcessPoolExecutor:
+        n_threads = self.n_threads or max(1, (os.cpu_count() or 1) // self.n_workers)
+        return ProcessPoolExecutor(
+            max_workers=self.n_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.model, n_threads, self.max_atoms),
+        )
+
+    def __enter__(self) -> "ProcessPoolBatchCalculator":
+        self._pool = self._start_pool()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self._pool.shutdown()
+        self._pool = None
+
+    def imap(
+        self, batches: t.Iterable[list[ase.Atoms]], properties: list[str] | None = None
+    ) -> t.Iterator[tuple[list[ase.Atoms], list[dict[str, t.Any]]]]:
+        """Yield each batch together with its results, in the original order.
+
+        At most two batches per worker are in flight at the same time.
+        """
+        pending: collections.deque[tuple[list[ase.Atoms], Future]] = collections.deque()
+        with contextlib.ExitStack() as stack:
+            pool = self._pool or stack.enter_context(self._start_pool())
+            for batch in batches:
+                future = pool.submit(_calculate_in_worker, batch, properties)
+                pending.append((batch, future))
+                if len(pending) >= 2 * self.n_workers:
+                    yield self._collect(*pending.popleft())
+            while pending:
+                yield self._collect(*pending.popleft())
+
+    def _collect(self, batch: list[ase.Atoms], future: Future):
+        results, busy_time, histogram, cache_info = future.result()
+        self.busy_time += busy_time
+        self.histogram.update(histogram)
+        if cache_info is not None:
+            previous = self.cache_info or CacheInfo(hits=0, misses=0, currsize=0)
+            self.cache_info = CacheInfo(
+                hits=previous.hits + cache_info.hits,
+                misses=previous.misses + cache_info.misses,
+                currsize=cache_info.currsize,
+            )
+        return batch, results
+
+    def calculate_batch(
+        self, frames: list[ase.Atoms], properties: list[str] | None = None
+    ) -> list[dict[str, t.Any]]:
+        size = max(1, math.ceil(len(frames) / self.n_workers))
+        results = []
+        for _, batch_results in self.imap(batched(frames, size), properties):
+            results.extend(batch_results)
+        return results
@@ -0,0 +1,226 @@
+"""Persistent cache for single point calculator results."""
+
+import dataclasses
+import hashlib
+import json
+import os
+import pathlib
+import tempfile
+import typing as t
+
+import ase
+import numpy as np
+import zntrack
+from ase.calculators.calculator import Calculator, all_changes
+from zntrack.config import FIELD_TYPE, FieldTypes
+
+from mlipx.abc import NodeWithCalculator
+from mlipx.utils import calculate_properties, hash_atoms
+
+
+class CacheInfo(t.NamedTuple):
+    hits: int
+    misses: int
+    currsize: int
+
+
+def get_model_identity(model: NodeWithCalculator) -> str:
+    """Stable string identifying a model by its class, parameters and spec.
+
+    For models which are zntrack nodes, only the parameters are used.
+    """
+    cls = type(model)
+    if isinstance(model, zntrack.Node):
+        params = json.dumps(
+            {
+                field.name: getattr(model, field.name)
+                for field in dataclasses.fields(model)
+                if field.metadata.get(FIELD_TYPE) == FieldTypes.PARAMS
+            },
+            sort_keys=True,
+            default=str,
+        )
+    elif dataclasses.is_dataclass(model):
+        params = json.dumps(dataclasses.asdict(model), sort_keys=True, default=str)
+    else:
+        params = repr(model)
+    try:
+        spec = model.get_spec()
+    except Exception:
+        spec = None
+    if hasattr(spec, "model_dump_json"):
+        spec = spec.model_dump_json()
+    return f"{cls.__module__}.{cls.__qualname__}({params}, spec={spec})"
+
+
+def get_cache_info(calc: t.Any) -> CacheInfo | None:
+    """Cache statistics of a `CachedCalculator`, which can be wrapped.
+
+    Wrappers, e.g. batch calculators, are unwrapped via their `calc` attribute.
+    Returns None if no `CachedCalculator` is found.
+    """
+    while calc is not None:
+        if isinstance(calc, CachedCalculator):
+            return calc.cache_info()
+        calc = getattr(calc, "calc", None)
+    return None
+
+
+class ResultStore:
+    """Size-bounded directory of results with least recently used eviction.
+
+    Every entry is stored as a `.npz` file named after its key.
+    Reading an entry updates its modification time,
+    which is used to determine the least recently used entries.
+
+    Parameters
+    ----------
+    path : str | pathlib.Path
+        Directory to store the results in. Can be shared between nodes and projects.
+    max_size_mb : float
+        Maximum size of the directory before the oldest entries are removed.
+    """
+
+    def __init__(self, path: str | pathlib.Path, max_size_mb: float):
+        self.path = pathlib.Path(path).expanduser()
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.max_size = max_size_mb * 1e6
+        self.size = sum(f.stat().st_size for f in self.path.glob("*.npz"))
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self.path.glob("*.npz"))
+
+    def get(self, key: str) -> dict | None:
+        file = self.path / f"{key}.npz"
+        try:
+            with np.load(file) as data:
+                results = {
+                    name: value.item() if value.ndim == 0 else value
+                    for name, value in data.items()
+                }
+            os.utime(file)
+        except (FileNotFoundError, OSError, ValueError):
+            return None
+        return results
+
+    def set(self, key: str, results: dict) -> None:
+        file = self.path / f"{key}.npz"
+        with tempfile.NamedTemporaryFile(
+            dir=self.path, suffix=".tmp", delete=False
+        ) as f:
+            np.savez(f, **results)
+        # atomic, if multiple processes write the same entry
+        os.replace(f.name, file)
+        self.size += file.stat().st_size
+        if self.size > self.max_size:
+            self.evict()
+
+    def evict(self) -> None:
+        """Remove the least recently used entries until the size limit is met."""
+        files = []
+        for file in self.path.glob("*.npz"):
+            try:
+                stat = file.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, file))
+        files.sort()
+        self.size = sum(size for _, size, _ in files)
+        for _, size, file in files:
+            if self.size <= self.max_size:
+                break
+            file.unlink(missing_ok=True)
+            self.size -= size
+
+
+class CachedCalculator(Calculator):
+    """Wrap an ASE calculator and cache its results in a `ResultStore`.
+
+    The cache key is computed from the model identity, the
+    atomic numbers, positions, cell, pbc and the requested properties.
+    """
+
+    def __init__(self, calc: Calculator, store: ResultStore, identity: str, **kwargs):
+        Calculator.__init__(self, **kwargs)
+        self.calc = calc
+        self.store = store
+        self.identity = identity
+        self.implemented_properties = list(calc.implemented_properties)
+        self.hits = 0
+        self.misses = 0
+
+    def get_key(self, atoms: ase.Atoms, properties: list[str]) -> str:
+        key = hashlib.sha256(self.identity.encode())
+        key.update(hash_atoms(atoms).encode())
+        key.update(",".join(sorted(properties)).encode())
+        return key.hexdigest()
+
+    def calculate(
+        self,
+        atoms: ase.Atoms | None = None,
+        properties: list[str] | None = None,
+        system_changes=all_changes,
+    ):
+        if properties is None:
+            properties = ["energy"]
+        Calculator.calculate(self, atoms, properties, system_changes)
+        key = self.get_key(self.atoms, properties)
+        results = self.store.get(key)
+        if results is None:
+            self.misses += 1
+            results = calculate_properties(self.atoms, self.calc, properties)
+            self.store.set(key, results)
+        else:
+            self.hits += 1
+        self.results = results
+
+    def cache_info(self) -> CacheInfo:
+        return CacheInfo(hits=self.hits, misses=self.misses, currsize=len(self.store))
+
+
+@dataclasses.dataclass
+class CachedModel:
+    """Cache the single point results of a model on disk.
+
+    Identical structures evaluated by the same model, e.g. isolated
+    atoms or gas phase references in different nodes, are computed only once.
+    The cache directory can be shared between nodes and projects.
+
+    Parameters
+    ----------
+    model : NodeWithCalculator
+        The model to cache the results for.
+    path : str
+        Directory to store the cached results in.
+    max_size_mb : float, default=1024
+        Maximum size of the cache directory. The least recently
+        used results are removed once this size is exceeded.
+
+    Example
+    -------
+
+    >>> mace = mlipx.GenericASECalculator(...)
+    >>> model = mlipx.CachedModel(model=mace, path="~/.cache/mlipx")
+    >>> with project:
+    ...     mlipx.HomonuclearDiatomics(model=model, ...)
+    """
+
+    model: NodeWithCalculator
+    path: str = "~/.cache/mlipx"
+    max_size_mb: float = 1024
+
+    def get_calculator(self, **kwargs) -> CachedCalculator:
+        """Load the calculator of the model and wrap it with the cache.
+
+        The keyword arguments are passed to the model
+        and are part of the cache key.
+        """
+        settings = json.dumps(kwargs, sort_keys=True, default=str)
+        return CachedCalculator(
+            self.model.get_calculator(**kwargs),
+            store=ResultStore(self.path, self.max_size_mb),
+            identity=f"{get_model_identity(self.model)}, kwargs={settings}",
+        )
+
+    def get_spec(self):
+        return self.model.get_spec()
@@ -0,0 +1,149 @@
+"""Checkpoints to resume interrupted simulations.
+
+Checkpoints are stored next to the outputs in the node working directory,
+but are not declared as outputs, so they survive a rerun of the node.
+"""
+
+import copy
+import hashlib
+import os
+import pathlib
+import pickle
+import typing as t
+import warnings
+
+import ase
+import ase.io
+import h5py
+import numpy as np
+
+from mlipx.utils import hash_atoms
+
+# attributes of ASE dynamics that are recreated by the constructor
+RUNTIME_ATTRIBUTES = {
+    "atoms",
+    "_actual_atoms",
+    "optimizable",
+    "observers",
+    "logfile",
+    "comm",
+    "trajectory",
+    "_orig_trajectory",
+    "_master",
+    "restart",
+}
+
+
+class GlobalRandomState(t.NamedTuple):
+    """State of the global NumPy random number generator."""
+
+    state: tuple
+
+
+def get_dynamics_state(dyn) -> dict[str, t.Any]:
+    """Copy the internal state of an ASE optimizer or MD integrator.
+
+    This includes the step counter, the optimizer memory, e.g. the L-BFGS
+    history, and the state of the random number generator of thermostats.
+    """
+    state = {}
+    for key, value in vars(dyn).items():
+        if key in RUNTIME_ATTRIBUTES:
+            continue
+        if value is np.random:
+            value = GlobalRandomState(np.random.get_state())
+        state[key] = copy.deepcopy(value)
+    return state
+
+
+def set_dynamics_state(dyn, state: dict[str, t.Any]) -> None:
+    """Restore the state from `get_dynamics_state` on a new ASE dynamics object."""
+    for key, value in state.items():
+        if isinstance(value, GlobalRandomState):
+            np.random.set_state(value.state)
+            value = np.random
+        setattr(dyn, key, value)
+
+
+def get_atoms_state(atoms: ase.Atoms) -> dict[str, np.ndarray]:
+    return {
+        "positions": atoms.get_positions(),
+        "momenta": atoms.get_momenta(),
+        "cell": atoms.cell.array.copy(),
+    }
+
+
+def set_atoms_state(atoms: ase.Atoms, state: dict[str, np.ndarray]) -> None:
+    atoms.set_cell(state["cell"])
+    # the stored positions already satisfy the constraints
+    atoms.set_positions(state["positions"], apply_constraint=False)
+    atoms.set_momenta(state["momenta"], apply_constraint=False)
+
+
+def get_fingerprint(frames: list[ase.Atoms], *settings: t.Any) -> str:
+    """Hash identifying the initial structures and the settings of a simulation."""
+    fingerprint = hashlib.sha256(repr(settings).encode())
+    for atoms in frames:
+        fingerprint.update(hash_atoms(atoms).encode())
+    return fingerprint.hexdigest()
+
+
+def write_checkpoint(path: pathlib.Path, checkpoint: dict[str, t.Any]) -> None:
+    """Write the checkpoint atomically, so it is never left half written."""
+    tmp_path = path.with_name(f"{path.name}.tmp")
+    with tmp_path.open("wb") as f:
+        pickle.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+
+def read_checkpoint(path: pathlib.Path, fingerprint: str) -> dict[str, t.Any] | None:
+    """Load a checkpoint, if it exists and was written for the same inputs."""
+    if not path.exists():
+        return None
+    try:
+        with path.open("rb") as f:
+            checkpoint = pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        checkpoint = {}
+    if checkpoint.get("fingerprint") != fingerprint:
+        warnings.warn(f"Can not resume from '{path}', starting from the first step.")
+        return None
+    return checkpoint
+
+
+def truncate_trajectory(path: pathlib.Path, n_frames: int) -> bool:
+    """Remove frames written after the checkpoint from a trajectory file.
+
+    Supports H5MD files and all formats ASE can write. Returns False
+    if the file holds less than `n_frames` frames or can not be read.
+    """
+    try:
+        if path.suffix in [".h5", ".h5md"]:
+            with h5py.File(path, "r+") as file:
+                datasets = []
+                file.visititems(
+                    lambda name, obj: (
+                        datasets.append(obj) if name.endswith("/value") else None
+                    )
+                )
+                # keys of only some frames end with the last frame that has them
+                core = [
+                    dataset
+                    for dataset in datasets
+                    if dataset.name.startswith("/particles/")
+                    and dataset.name.endswith(("/species/value", "/position/value"))
+                ]
+                if not core or any(len(dataset) < n_frames for dataset in core):
+                    return False
+                for dataset in datasets:
+                    if len(dataset) > n_frames:
+                        dataset.resize(n_frames, axis=0)
+            return True
+        frames = ase.io.read(path, index=":")
+    except (OSError, KeyError, ValueError):
+        return False
+    if len(frames) < n_frames:
+        return False
+    if len(frames) > n_frames:
+        ase.io.write(path, frames[:n_frames])
+    return True
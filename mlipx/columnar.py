@@ -0,0 +1,154 @@
+"""Columnar access to trajectory data without building `ase.Atoms` objects.
+
+All readers return a dictionary of NumPy arrays.
+Per-atom properties, e.g. positions or forces, of all frames are concatenated
+along the first axis. The atoms of frame `i` are given by
+`columns["offsets"][i]:columns["offsets"][i + 1]`.
+Per-frame properties, e.g. energy or cell, have the number of frames
+as their first dimension.
+"""
+
+import typing as t
+
+import ase
+import h5py
+import numpy as np
+
+# ASE style names and their location in an H5MD file written by znh5md
+H5MD_KEYS: dict[str, tuple[str, str]] = {
+    "numbers": ("particles", "species"),
+    "positions": ("particles", "position"),
+    "forces": ("particles", "force"),
+    "velocities": ("particles", "velocity"),
+    "cell": ("particles", "box/edges"),
+    "pbc": ("particles", "box/pbc"),
+    "energy": ("observables", "potential_energy"),
+    "stress": ("observables", "stress"),
+}
+
+PER_FRAME_PARTICLES_KEYS = ("box/edges", "box/pbc")
+
+COLUMNS = dict[str, np.ndarray]
+
+
+def _find_dataset(file: h5py.File, key: str) -> tuple[h5py.Dataset, bool]:
+    """Return the dataset for `key` and whether it is a per-atom property."""
+    particles_group = next(iter(file["particles"].keys()))
+    group, name = H5MD_KEYS.get(key, (None, key))
+    for group in [group] if group else ["particles", "observables"]:
+        path = f"{group}/{particles_group}/{name}/value"
+        if path in file:
+            per_atom = group == "particles" and name not in PER_FRAME_PARTICLES_KEYS
+            return file[path], per_atom
+    raise KeyError(f"'{key}' not found in the H5MD file")
+
+
+def read_h5md_columns(
+    file: h5py.File,
+    keys: t.Sequence[str] = ("numbers", "positions", "energy", "forces"),
+    start: int | None = None,
+    stop: int | None = None,
+) -> COLUMNS:
+    """Read the given properties of the frames `start:stop` from an H5MD file.
+
+    Parameters
+    ----------
+    file : h5py.File
+        Open H5MD file, e.g. written by `znh5md.IO`.
+    keys : list[str]
+        Properties to read. Supports the ASE names 'numbers', 'positions',
+        'forces', 'velocities', 'cell', 'pbc', 'energy', 'stress'
+        and the names of other datasets in the H5MD file.
+    start, stop : int, optional
+        Range of frames to read. Can be used to process large files in chunks.
+
+    Returns
+    -------
+    dict[str, np.ndarray]
+        The requested properties and the per-frame atom `offsets`.
+    """
+    species, _ = _find_dataset(file, "numbers")
+    frame_slice = slice(start, stop)
+    species = species[frame_slice]
+    # variable shape data is padded with NaN
+    mask = ~np.isnan(species)
+    n_atoms = mask.sum(axis=1)
+
+    columns: COLUMNS = {"offsets": np.concatenate([[0], np.cumsum(n_atoms)])}
+    for key in keys:
+        if key == "numbers":
+            columns[key] = species[mask].astype(int)
+            continue
+        dataset, per_atom = _find_dataset(file, key)
+        values = dataset[frame_slice]
+        columns[key] = values[mask] if per_atom else values
+    if "pbc" in columns:
+        columns["pbc"] = columns["pbc"].astype(bool)
+    return columns
+
+
+def _get_frame_property(atoms: ase.Atoms, key: str) -> np.ndarray:
+    if key == "numbers":
+        return atoms.numbers
+    if key == "positions":
+        return atoms.positions
+    if key == "cell":
+        return atoms.cell.array
+    if key == "pbc":
+        return atoms.pbc
+    if key == "velocities":
+        return atoms.get_velocities()
+    if key == "energy" and atoms.calc is not None:
+        return atoms.get_potential_energy()
+    if key == "forces" and atoms.calc is not None:
+        # apply constraints like `atoms.get_forces()`
+        return atoms.get_forces()
+    if atoms.calc is not None and key in atoms.calc.results:
+        return atoms.calc.results[key]
+    if key in atoms.arrays:
+        return atoms.arrays[key]
+    return atoms.info[key]
+
+
+def frames_to_columns(
+    frames: t.Sequence[ase.Atoms],
+    keys: t.Sequence[str] = ("numbers", "positions", "energy", "forces"),
+) -> COLUMNS:
+    """Convert a list of atoms into the same columnar layout as `read_h5md_columns`.
+
+    Calculator results, `atoms.arrays` and `atoms.info` are searched for keys
+    other than 'numbers', 'positions', 'cell', 'pbc' and 'velocities'.
+    """
+    n_atoms = np.array([len(atoms) for atoms in frames], dtype=int)
+    columns: COLUMNS = {"offsets": np.concatenate([[0], np.cumsum(n_atoms)])}
+    for key in keys:
+        values = [np.asarray(_get_frame_property(atoms, key)) for atoms in frames]
+        per_atom = len(values) > 0 and all(
+            value.ndim > 0 and len(value) == len(atoms)
+            for value, atoms in zip(values, frames)
+        )
+        if key in ("cell", "pbc", "stress"):
+            per_atom = False
+        if per_atom:
+            columns[key] = (
+                np.concatenate(values) if len(values) > 0 else np.zeros((0, 3))
+            )
+        else:
+            columns[key] = np.array(values)
+    return columns
+
+
+def get_columns(
+    frames: t.Sequence[ase.Atoms],
+    keys: t.Sequence[str] = ("numbers", "positions", "energy", "forces"),
+    start: int | None = None,
+    stop: int | None = None,
+) -> COLUMNS:
+    """Columnar arrays of `frames[start:stop]`.
+
+    Uses `frames.get_columns` if available, e.g. for frames stored in H5MD files,
+    otherwise the frames are converted with `frames_to_columns`.
+    """
+    if hasattr(frames, "get_columns"):
+        return frames.get_columns(keys, start, stop)
+    return frames_to_columns(frames[start:stop], keys)
@@ -0,0 +1,265 @@
+"""Lazy sequences of frames that only load the frames which are accessed."""
+
+import abc
+import collections.abc
+import contextlib
+import itertools
+import json
+import operator
+import pathlib
+import typing as t
+
+import ase
+import h5py
+import numpy as np
+import znh5md
+from fsspec import AbstractFileSystem
+
+from mlipx.columnar import COLUMNS, frames_to_columns, read_h5md_columns
+
+
+def iter_consecutive(indices: t.Sequence[int]) -> t.Iterator[list[int]]:
+    """Group consecutive indices, e.g. [0, 1, 2, 5, 6] -> [0, 1, 2], [5, 6]."""
+    for _, group in itertools.groupby(
+        enumerate(indices), key=lambda item: item[1] - item[0]
+    ):
+        yield [idx for _, idx in group]
+
+
+def iter_frames(
+    frames: t.Sequence[ase.Atoms], start: int = 0, chunk_size: int = 1000
+) -> t.Iterator[ase.Atoms]:
+    """Iterate `frames[start:]`, loading `chunk_size` frames at a time."""
+    for chunk_start in range(start, len(frames), chunk_size):
+        yield from frames[chunk_start : chunk_start + chunk_size]
+
+
+DTYPES_ATTRIBUTE = "mlipx_dtypes"
+"""H5MD file attribute with the JSON of `update_dtypes` for `restore_dtypes`."""
+
+MIXED = "mixed"
+_EXACT_FLOAT_INTEGER = 2**53
+
+
+def update_dtypes(dtypes: dict[str, str], atoms: ase.Atoms) -> None:
+    """Record the dtype of integer and boolean `info` and `arrays` values.
+
+    H5MD files store all numbers as floats. Keys with differing dtypes
+    or integers that are not exact as floats are marked as `MIXED`,
+    these can not be restored.
+    """
+    values = itertools.chain(
+        atoms.info.items(),
+        ((key, value) for key, value in atoms.arrays.items() if key != "positions"),
+    )
+    for key, value in values:
+        if key == "numbers" or isinstance(value, (str, dict)):
+            continue
+        array = np.asarray(value)
+        if array.dtype.kind not in "biuf":
+            continue
+        dtype = array.dtype.str if array.dtype.kind in "biu" else "float"
+        if (
+            array.dtype.kind in "iu"
+            and array.size
+            and np.abs(array).max() >= _EXACT_FLOAT_INTEGER
+        ):
+            dtype = MIXED
+        if dtypes.setdefault(key, dtype) != dtype:
+            dtypes[key] = MIXED
+
+
+def restore_dtypes(atoms: ase.Atoms, dtypes: dict[str, str]) -> None:
+    """Cast the `info` and `arrays` values read from H5MD back to `dtypes`."""
+    for key, dtype in dtypes.items():
+        if dtype in ("float", MIXED):
+            continue
+        if key in atoms.info:
+            value = np.asarray(atoms.info[key]).astype(dtype)
+            atoms.info[key] = value.item() if value.ndim == 0 else value
+        elif key in atoms.arrays:
+            atoms.arrays[key] = atoms.arrays[key].astype(dtype)
+
+
+def get_dtypes(file: h5py.File) -> dict[str, str]:
+    """The dtypes stored by `set_dtypes`, empty if there are none."""
+    return json.loads(file.attrs.get(DTYPES_ATTRIBUTE, "{}"))
+
+
+def set_dtypes(file: h5py.File, dtypes: dict[str, str]) -> None:
+    """Store the integer and boolean dtypes of the frames in the file attributes."""
+    file.attrs[DTYPES_ATTRIBUTE] = json.dumps(
+        {key: dtype for key, dtype in dtypes.items() if dtype != "float"}
+    )
+
+
+class FrameSequence(collections.abc.Sequence):
+    """Read-only list of frames, which are loaded on access.
+
+    Indexing loads a single frame and slicing returns a list of the selected
+    frames. Iterating loads `chunk_size` frames at a time.
+    """
+
+    chunk_size: int = 1000
+
+    @abc.abstractmethod
+    def __len__(self) -> int: ...
+
+    @abc.abstractmethod
+    def read(self, indices: list[int]) -> list[ase.Atoms]:
+        """Load the frames at the given non-negative indices."""
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.read(list(range(len(self))[index]))
+        index = operator.index(index)
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("frame index out of range")
+        return self.read([index])[0]
+
+    def __iter__(self) -> t.Iterator[ase.Atoms]:
+        return iter_frames(self, chunk_size=self.chunk_size)
+
+    def __add__(self, other: t.Sequence[ase.Atoms]) -> list[ase.Atoms]:
+        return list(self) + list(other)
+
+    def __radd__(self, other: t.Sequence[ase.Atoms]) -> list[ase.Atoms]:
+        return list(other) + list(self)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(<{len(self)} frames>)"
+
+    def get_columns(
+        self,
+        keys: t.Sequence[str] = ("numbers", "positions", "energy", "forces"),
+        start: int | None = None,
+        stop: int | None = None,
+    ) -> COLUMNS:
+        """Properties of the frames `start:stop` as NumPy arrays.
+
+        See `mlipx.columnar.read_h5md_columns` for the layout of the arrays.
+        """
+        return frames_to_columns(self[start:stop], keys)
+
+
+class H5MDFrames(FrameSequence):
+    """Frames stored in an H5MD file.
+
+    Parameters
+    ----------
+    fs : AbstractFileSystem
+        File system to open `path` with, e.g. `node.state.fs`.
+    path : str
+        Path to the H5MD file.
+    indices : range, optional
+        Frames of the file that are part of the sequence. Defaults to all frames.
+    """
+
+    def __init__(self, fs: AbstractFileSystem, path: str, indices: range | None = None):
+        self.fs = fs
+        self.path = path
+        if indices is None:
+            with self._open() as io:
+                # files without frames have no particles group
+                is_empty = "particles" not in io.file_handle
+                indices = range(0 if is_empty else len(io))
+        self.indices = indices
+
+    @contextlib.contextmanager
+    def _open(self) -> t.Iterator[znh5md.IO]:
+        with self.fs.open(self.path, "rb") as f:
+            with h5py.File(f) as file:
+                yield znh5md.IO(file_handle=file)
+
+    def __len__(self) -> int:
+        return len(self.indices)
+
+    def read(self, indices: list[int]) -> list[ase.Atoms]:
+        frames = []
+        with self._open() as io:
+            dtypes = get_dtypes(io.file_handle)
+            for group in iter_consecutive([self.indices[idx] for idx in indices]):
+                frames.extend(io[group[0] : group[-1] + 1])
+        for atoms in frames:
+            restore_dtypes(atoms, dtypes)
+        return frames
+
+    def get_columns(
+        self,
+        keys: t.Sequence[str] = ("numbers", "positions", "energy", "forces"),
+        start: int | None = None,
+        stop: int | None = None,
+    ) -> COLUMNS:
+        indices = self.indices[start:stop]
+        if indices.step != 1:
+            return super().get_columns(keys, start, stop)
+        with self.fs.open(self.path, "rb") as f:
+            with h5py.File(f) as file:
+                return read_h5md_columns(file, keys, indices.start, indices.stop)
+
+
+class ChainedFrames(FrameSequence):
+    """Frames of several sequences, one after another.
+
+    Parameters
+    ----------
+    sequences : list[Sequence[ase.Atoms]]
+        The sequences, e.g. `H5MDFrames`, which are only read when accessed.
+    """
+
+    def __init__(self, sequences: t.Sequence[t.Sequence[ase.Atoms]]):
+        self.sequences = list(sequences)
+        self.offsets = np.cumsum([0] + [len(seq) for seq in self.sequences])
+
+    def __len__(self) -> int:
+        return int(self.offsets[-1])
+
+    def read(self, indices: list[int]) -> list[ase.Atoms]:
+        sequence_ids = np.searchsorted(self.offsets, indices, side="right") - 1
+        frames = []
+        for sequence_id, group in itertools.groupby(
+            zip(sequence_ids, indices), key=operator.itemgetter(0)
+        ):
+            sequence = self.sequences[sequence_id]
+            local = [idx - int(self.offsets[sequence_id]) for _, idx in group]
+            if isinstance(sequence, FrameSequence):
+                frames.extend(sequence.read(local))
+            else:
+                frames.extend(sequence[idx] for idx in local)
+        return frames
+
+
+class BufferedH5MDWriter:
+    """Collect frames in memory and append them to an H5MD file in blocks.
+
+    Parameters
+    ----------
+    path : str | pathlib.Path
+        Path to the H5MD file. Frames are appended to existing files.
+    flush_interval : int, default=100
+        Number of frames kept in memory before they are written.
+    """
+
+    def __init__(self, path: str | pathlib.Path, flush_interval: int = 100):
+        self.io = znh5md.IO(path)
+        self.flush_interval = flush_interval
+        self.buffer: list[ase.Atoms] = []
+
+    def append(self, atoms: ase.Atoms) -> None:
+        """Add a frame, which must not be modified afterwards."""
+        self.buffer.append(atoms)
+        if len(self.buffer) >= self.flush_interval:
+            self.flush()
+
+    def flush(self) -> None:
+        if self.buffer:
+            self.io.extend(self.buffer)
+            self.buffer = []
+
+    def __enter__(self) -> "BufferedH5MDWriter":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.flush()
@@ -0,0 +1,74 @@
+"""Memoization of node properties that load outputs, e.g. `frames` or `figures`."""
+
+import collections
+import functools
+import os
+import typing as t
+
+import zntrack
+
+_shared_cache: collections.OrderedDict[tuple, t.Any] = collections.OrderedDict()
+_shared_cache_size = 0
+
+
+def set_output_cache_size(maxsize: int) -> None:
+    """Share up to `maxsize` cached node properties between node instances.
+
+    The least recently used entries are evicted first.
+    By default, `maxsize=0`, properties are only cached per node instance.
+    """
+    global _shared_cache_size
+    _shared_cache_size = maxsize
+    while len(_shared_cache) > maxsize:
+        _shared_cache.popitem(last=False)
+
+
+def _get_outputs_stamp(node: zntrack.Node) -> tuple:
+    """Modification time and size of all files in the node working directory."""
+    if node.state.rev is not None or node.state.remote is not None:
+        # the outputs are fixed for a given revision
+        return ()
+    stamp = []
+    for root, _, files in os.walk(node.nwd):
+        for file in files:
+            path = os.path.join(root, file)
+            stat = os.stat(path)
+            stamp.append((path, stat.st_mtime_ns, stat.st_size))
+    return tuple(sorted(stamp))
+
+
+def cached_output(func: t.Callable[[t.Any], t.Any]) -> property:
+    """Property which is cached until the outputs of the node change.
+
+    The cache is keyed on the node name, revision and remote
+    and, for the working tree, the files in the node working directory.
+    The returned objects are shared, do not modify them in place.
+    """
+
+    @functools.wraps(func)
+    def wrapper(self: zntrack.Node):
+        key = (
+            type(self).__qualname__,
+            func.__name__,
+            self.name,
+            self.state.rev,
+            self.state.remote,
+            _get_outputs_stamp(self),
+        )
+        cache = self.__dict__.setdefault("_output_cache", {})
+        if func.__name__ in cache and cache[func.__name__][0] == key:
+            return cache[func.__name__][1]
+
+        if key in _shared_cache:
+            _shared_cache.move_to_end(key)
+            value = _shared_cache[key]
+        else:
+            value = func(self)
+            if _shared_cache_size > 0:
+                _shared_cache[key] = value
+                if len(_shared_cache) > _shared_cache_size:
+                    _shared_cache.popitem(last=False)
+        cache[func.__name__] = (key, value)
+        return value
+
+    return property(wrapper)
@@ -1,4 +1,13 @@
+import collections
+import hashlib
+import itertools
+import json
+import math
+import os
 import pathlib
+import time
+import typing as t
+import warnings
 
 import ase
 import h5py
@@ -8,7 +17,18 @@ import zntrack
 from ase.calculators.calculator import all_properties
 
 from mlipx.abc import NodeWithCalculator
-from mlipx.utils import freeze_copy_atoms
+from mlipx.batching import (
+    AtomBudgetScheduler,
+    ProcessPoolBatchCalculator,
+    batched,
+    get_batch_calculator,
+)
+from mlipx.cache import get_cache_info, get_model_identity
+from mlipx.checkpoint import truncate_trajectory
+from mlipx.columnar import COLUMNS, read_h5md_columns
+from mlipx.frames import H5MDFrames, iter_frames
+from mlipx.memoize import cached_output
+from mlipx.utils import atoms_with_results, hash_atoms
 
 
 class ApplyCalculator(zntrack.Node):
@@ -19,36 +39,319 @@ class ApplyCalculator(zntrack.Node):
     ----------
     data : list[ase.Atoms]
         List of atoms objects to calculate.
+        Lazy sequences of frames are loaded chunk by chunk.
     model : NodeWithCalculator, optional
         Node providing the calculator object to apply to the data.
+        If the model provides `get_batch_calculator`, the structures
+        are evaluated in batches, otherwise one after another.
+    properties : list[str], default=["energy"]
+        Properties to request from the calculator, e.g. ["energy", "forces"].
+        Calculators may return more properties than requested.
+    batch_size : int, default=1
+        Number of structures passed to the calculator at once.
+    max_atoms_per_batch : int, optional
+        Build batches with up to this many atoms instead of a fixed `batch_size`.
+        The frames are sorted by size within each chunk of `chunk_size` frames,
+        or within the share of each worker if `n_workers > 1`.
+        If a batch runs out of memory, the limit is halved and the batch retried.
+    chunk_size : int, default=1000
+        Number of frames kept in memory before they are written to `frames_path`.
+    n_workers : int, default=1
+        Number of worker processes. Each worker loads its own calculator
+        and the results are merged back in the original order.
+        Up to two batches per worker are evaluated at the same time.
+        With `max_atoms_per_batch`, each chunk is split between the workers,
+        so about `2 * chunk_size` frames are in flight independent of `n_workers`.
+    n_threads : int, optional
+        Number of threads per worker if `n_workers > 1`.
+        Defaults to the number of CPUs divided by `n_workers`.
+    deduplicate : bool, default=False
+        Evaluate identical structures only once and copy the results
+        to all duplicates. The order of the frames is unchanged.
+    deduplicate_tolerance : float, optional
+        Treat structures whose positions and cell agree after rounding
+        to multiples of this value in Å as duplicates.
+        By default, only exact duplicates are detected.
+    resume : bool, default=True
+        Continue an interrupted run from the last written chunk.
+        Frames are written to a partial file in the node working directory
+        and only moved to `frames_path` once all frames are computed.
+
+    Attributes
+    ----------
+    metrics : dict
+        Write throughput to `frames_path` in frames/s and MB/s
+        and the worker utilization, the fraction of the evaluation time
+        the calculators of all workers spent computing.
+        For a `CachedModel` also the number of cache hits and misses,
+        summed over all workers,
+        and with `max_atoms_per_batch` the histogram of used batch sizes.
+        With `deduplicate`, the fraction of frames that were duplicates.
     """
 
     data: list[ase.Atoms] = zntrack.deps()
     model: NodeWithCalculator | None = zntrack.deps()
+    properties: list[str] = zntrack.params(default_factory=lambda: ["energy"])
+    batch_size: int = zntrack.params(1)
+    max_atoms_per_batch: int | None = zntrack.params(None)
+    chunk_size: int = zntrack.params(1000)
+    n_workers: int = zntrack.params(1)
+    n_threads: int | None = zntrack.params(None)
+    deduplicate: bool = zntrack.params(False)
+    deduplicate_tolerance: float | None = zntrack.params(None)
+    resume: bool = zntrack.params(True)
 
     frames_path: pathlib.Path = zntrack.outs_path(zntrack.nwd / "frames.h5")
+    metrics: dict = zntrack.metrics()
+
+    def iter_frames(
+        self, start: int = 0, stats: dict | None = None
+    ) -> t.Iterator[ase.Atoms]:
+        """Yield the frames, starting at `start`, with the calculator results.
+
+        If `stats` is given, the accumulated time spent by the calculators is
+        stored under the key 'busy_time' and, for a `CachedModel`,
+        the cache statistics under 'cache_info'.
+        With `max_atoms_per_batch`, the batch size histogram is stored under
+        'histogram' and with `deduplicate` the number of unique frames
+        under 'n_unique'.
+        """
+        if self.model is None:
+            yield from iter_frames(self.data, start, self.chunk_size)
+            return
+
+        # Some calculators, e.g. MACE do not follow the ASE API correctly.
+        #  and we need to fix some keys in `all_properties`
+        all_properties.append("node_energy")
+
+        stats = {} if stats is None else stats
+        if self.deduplicate:
+            yield from self._iter_deduplicated(start, stats)
+            return
+        data = iter_frames(self.data, start, self.chunk_size)
+        with tqdm.tqdm(total=len(self.data), initial=start) as pbar:
+            for batch, results in self._iter_results(data, stats):
+                for atoms, atoms_results in zip(batch, results):
+                    yield atoms_with_results(atoms, atoms_results)
+                pbar.update(len(batch))
+
+    def _iter_deduplicated(self, start: int, stats: dict) -> t.Iterator[ase.Atoms]:
+        """Evaluate only the first occurrence of each structure.
+
+        A first pass over the frames assigns an id to each distinct structure.
+        The frames are then read chunk by chunk, once to evaluate the first
+        occurrences and once to yield all frames in order.
+        The results of a structure are kept until its last duplicate is yielded.
+        """
+        structure_ids: dict[str, int] = {}
+        ids = [
+            structure_ids.setdefault(
+                hash_atoms(atoms, self.deduplicate_tolerance), len(structure_ids)
+            )
+            for atoms in iter_frames(self.data, start, self.chunk_size)
+        ]
+        stats["n_unique"] = len(structure_ids)
+        del structure_ids
+        remaining = collections.Counter(ids)
+
+        def iter_unique() -> t.Iterator[ase.Atoms]:
+            # ids are assigned in order of the first occurrence
+            n_unique = 0
+            frames = iter_frames(self.data, start, self.chunk_size)
+            for atoms, structure_id in zip(frames, ids):
+                if structure_id == n_unique:
+                    n_unique += 1
+                    yield atoms
+
+        unique_results = (
+            atoms_results
+            for _, results in self._iter_results(iter_unique(), stats)
+            for atoms_results in results
+        )
+        shared_results = {}
+        frames = iter_frames(self.data, start, self.chunk_size)
+        with tqdm.tqdm(total=len(self.data), initial=start) as pbar:
+            for atoms, structure_id in zip(frames, ids):
+                if structure_id in shared_results:
+                    atoms_results = shared_results[structure_id]
+                else:
+                    atoms_results = next(unique_results)
+                remaining[structure_id] -= 1
+                if remaining[structure_id] > 0:
+                    shared_results[structure_id] = atoms_results
+                else:
+                    shared_results.pop(structure_id, None)
+                yield atoms_with_results(atoms, atoms_results)
+                pbar.update()
+        # finish the generator to collect the statistics
+        for _ in unique_results:
+            pass
+
+    def _iter_results(
+        self, data: t.Iterable[ase.Atoms], stats: dict
+    ) -> t.Iterator[tuple[list[ase.Atoms], list[dict]]]:
+        """Evaluate `data` and yield each batch with its results."""
+        properties = list(self.properties)
+        if self.max_atoms_per_batch is None:
+            batches = batched(data, self.batch_size)
+        else:
+            # the scheduler builds the batches within each chunk, which is split
+            # between the workers to bound the number of frames in flight
+            batches = batched(data, math.ceil(self.chunk_size / self.n_workers))
+
+        if self.n_workers > 1:
+            # the workers load their calculators once for the whole run
+            with ProcessPoolBatchCalculator(
+                self.model,
+                n_workers=self.n_workers,
+                n_threads=self.n_threads,
+                max_atoms=self.max_atoms_per_batch,
+            ) as pool:
+                yield from pool.imap(batches, properties=properties)
+            stats["busy_time"] = pool.busy_time
+            if self.max_atoms_per_batch is not None:
+                stats["histogram"] = pool.histogram
+            if pool.cache_info is not None:
+                stats["cache_info"] = pool.cache_info
+            return
+
+        calc = get_batch_calculator(self.model)
+        scheduler = None
+        if self.max_atoms_per_batch is not None:
+            scheduler = AtomBudgetScheduler(calc, self.max_atoms_per_batch)
+
+        stats["busy_time"] = 0.0
+        for batch in batches:
+            batch_start = time.perf_counter()
+            results = (scheduler or calc).calculate_batch(batch, properties=properties)
+            stats["busy_time"] += time.perf_counter() - batch_start
+            yield batch, results
+
+        if scheduler is not None:
+            stats["histogram"] = scheduler.histogram
+        if (cache_info := get_cache_info(calc)) is not None:
+            stats["cache_info"] = cache_info
+
+    def _get_fingerprint(self, frames: t.Iterable[ase.Atoms]):
+        """Hash identifying the settings which affect the results and the frames.
+
+        The returned hash object is updated with the frames written later on.
+        """
+        settings = (
+            get_model_identity(self.model),
+            list(self.properties),
+            self.batch_size,
+            self.deduplicate,
+            self.deduplicate_tolerance,
+        )
+        fingerprint = hashlib.sha256(repr(settings).encode())
+        for atoms in frames:
+            fingerprint.update(hash_atoms(atoms).encode())
+        return fingerprint
+
+    def _read_progress(self, partial_path: pathlib.Path, progress_path: pathlib.Path):
+        """Return the number of frames that can be reused from an interrupted run.
+
+        Also returns the fingerprint of these frames, which are read chunk by chunk.
+        """
+        if not (partial_path.exists() and progress_path.exists()):
+            return 0, self._get_fingerprint([])
+        progress = json.loads(progress_path.read_text())
+        n_frames = progress["n_frames"]
+        fingerprint = self._get_fingerprint(
+            itertools.islice(
+                iter_frames(self.data, chunk_size=self.chunk_size), n_frames
+            )
+        )
+        # remove frames written after the last progress update
+        if fingerprint.hexdigest() != progress["fingerprint"] or not (
+            truncate_trajectory(partial_path, n_frames)
+        ):
+            warnings.warn(
+                f"Can not resume from '{partial_path}', starting from the first frame."
+            )
+            return 0, self._get_fingerprint([])
+        return n_frames, fingerprint
 
     def run(self):
-        frames = []
-        if self.model is not None:
-            calc = self.model.get_calculator()
-
-            # Some calculators, e.g. MACE do not follow the ASE API correctly.
-            #  and we need to fix some keys in `all_properties`
-            all_properties.append("node_energy")
-
-            for atoms in tqdm.tqdm(self.data):
-                atoms.calc = calc
-                atoms.get_potential_energy()
-                frames.append(freeze_copy_atoms(atoms))
+        partial_path = self.nwd / "frames.partial.h5"
+        progress_path = self.nwd / "progress.json"
+
+        if self.resume:
+            start, fingerprint = self._read_progress(partial_path, progress_path)
         else:
-            frames = self.data
+            start, fingerprint = 0, self._get_fingerprint([])
+        if start == 0:
+            partial_path.unlink(missing_ok=True)
+        else:
+            print(f"Resuming '{self.name}' from frame {start}")
+        initial_bytes = partial_path.stat().st_size if start > 0 else 0
+
+        io = znh5md.IO(partial_path)
+        n_frames = start
+        write_time = 0.0
+        stats = {}
+        run_start = time.perf_counter()
+        for chunk in batched(self.iter_frames(start, stats), self.chunk_size):
+            write_start = time.perf_counter()
+            io.extend(chunk)
+            write_time += time.perf_counter() - write_start
+            n_frames += len(chunk)
+
+            fingerprint.update(b"".join(hash_atoms(x).encode() for x in chunk))
+            progress_path.write_text(
+                json.dumps(
+                    {"n_frames": n_frames, "fingerprint": fingerprint.hexdigest()}
+                )
+            )
+
+        compute_time = time.perf_counter() - run_start - write_time
+
+        n_bytes = 0
+        if partial_path.exists():
+            n_bytes = partial_path.stat().st_size - initial_bytes
+            os.replace(partial_path, self.frames_path)
+        progress_path.unlink(missing_ok=True)
+
+        n_written = n_frames - start
+        self.metrics = {
+            "n_frames": n_frames,
+            "write_frames_per_second": n_written / write_time if write_time else 0.0,
+            "write_mb_per_second": n_bytes / 1e6 / write_time if write_time else 0.0,
+        }
+        if "histogram" in stats:
+            self.metrics["batch_size_histogram"] = {
+                str(size): count for size, count in sorted(stats["histogram"].items())
+            }
+        if "n_unique" in stats and n_frames > start:
+            self.metrics["duplicate_ratio"] = 1 - stats["n_unique"] / (n_frames - start)
+        if "cache_info" in stats:
+            self.metrics["cache_hits"] = stats["cache_info"].hits
+            self.metrics["cache_misses"] = stats["cache_info"].misses
+        if "busy_time" in stats and compute_time > 0:
+            # time all calculators spent evaluating vs. the available worker time
+            utilization = stats["busy_time"] / (compute_time * self.n_workers)
+            self.metrics["n_workers"] = self.n_workers
+            self.metrics["worker_utilization"] = utilization
+            print(
+                f"Evaluated {n_frames - start} frames with {self.n_workers} workers:"
+                f" worker utilization {utilization:.1%}"
+            )
+
+    @cached_output
+    def frames(self) -> H5MDFrames:
+        return H5MDFrames(self.state.fs, self.frames_path)
 
-        io = znh5md.IO(self.frames_path)
-        io.extend(frames)
+    def get_columns(
+        self,
+        keys: t.Sequence[str] = ("numbers", "positions", "energy", "forces"),
+        start: int | None = None,
+        stop: int | None = None,
+    ) -> COLUMNS:
+        """Read properties of the frames as NumPy arrays without building atoms.
 
-    @property
-    def frames(self) -> list[ase.Atoms]:
+        See `mlipx.columnar.read_h5md_columns` for the layout of the arrays.
+        """
         with self.state.fs.open(self.frames_path, "rb") as f:
             with h5py.File(f) as file:
-                return list(znh5md.IO(file_handle=file))
+                return read_h5md_columns(file, keys, start, stop)
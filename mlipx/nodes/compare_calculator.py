@@ -1,15 +1,65 @@
 import contextlib
+import dataclasses
+import warnings
 
+import numpy as np
 import pandas as pd
 import tqdm
 import zntrack
 from ase.calculators.calculator import PropertyNotImplementedError
+from ase.data import chemical_symbols
 
 from mlipx.abc import FIGURES, FRAMES, ComparisonResults
+from mlipx.columnar import get_columns
 from mlipx.nodes.evaluate_calculator import EvaluateCalculatorResults, get_figure
 from mlipx.utils import rmse, shallow_copy_atoms
 
 
+def _zeros_per_element() -> np.ndarray:
+    return np.zeros(len(chemical_symbols))
+
+
+@dataclasses.dataclass
+class ForceErrorAccumulator:
+    """Running sums of force component errors, overall and per chemical element.
+
+    Only the sums are kept in memory, so the errors can be added chunk by chunk.
+    """
+
+    count: np.ndarray = dataclasses.field(default_factory=_zeros_per_element)
+    abs_sum: np.ndarray = dataclasses.field(default_factory=_zeros_per_element)
+    squared_sum: np.ndarray = dataclasses.field(default_factory=_zeros_per_element)
+
+    def update(self, numbers: np.ndarray, error: np.ndarray) -> None:
+        """Add the force errors of shape (n_atoms, 3) of atoms with `numbers`."""
+        size = len(chemical_symbols)
+        self.count += error.shape[1] * np.bincount(numbers, minlength=size)
+        self.abs_sum += np.bincount(
+            numbers, weights=np.abs(error).sum(axis=1), minlength=size
+        )
+        self.squared_sum += np.bincount(
+            numbers, weights=(error**2).sum(axis=1), minlength=size
+        )
+
+    def get_metrics(self) -> tuple[dict, dict]:
+        """Force component RMSE and MAE overall and for each element."""
+        if self.count.sum() == 0:
+            return {}, {}
+        total = {
+            "rmse": float(np.sqrt(self.squared_sum.sum() / self.count.sum())),
+            "mae": float(self.abs_sum.sum() / self.count.sum()),
+        }
+        per_element = {
+            chemical_symbols[number]: {
+                "rmse": float(np.sqrt(self.squared_sum[number] / self.count[number])),
+                "mae": float(self.abs_sum[number] / self.count[number]),
+                "n_components": int(self.count[number]),
+            }
+            for number in np.flatnonzero(self.count)
+        }
+        return total, per_element
+
+
 class CompareCalculatorResults(zntrack.Node):
     """
     CompareCalculatorResults is a node that compares the results of two calculators.
@@ -23,14 +73,52 @@ class CompareCalculatorResults(zntrack.Node):
     reference : EvaluateCalculatorResults
         The results of the second calculator.
         The results of the first calculator will be compared to these results.
+    chunk_size : int, default=10000
+        Number of frames whose forces are held in memory at once
+        to compute the force component errors.
+
+    Attributes
+    ----------
+    rmse : dict
+        RMSE of the per-frame quantities and of the force components.
+    mae : dict
+        MAE of the force components.
+        The force metrics are NaN, with a warning, if the forces are missing.
+    force_errors_per_element : dict
+        RMSE and MAE of the force components for each chemical element.
     """
 
     data: EvaluateCalculatorResults = zntrack.deps()
     reference: EvaluateCalculatorResults = zntrack.deps()
+    chunk_size: int = zntrack.params(10000)
 
     plots: pd.DataFrame = zntrack.plots(autosave=True)
     rmse: dict = zntrack.metrics()
+    mae: dict = zntrack.metrics()
     error: dict = zntrack.metrics()
+    force_errors_per_element: dict = zntrack.metrics()
+
+    def get_force_errors(self) -> ForceErrorAccumulator | None:
+        """Accumulate the force errors, reading `chunk_size` frames at a time.
+
+        Returns None if the data or the reference has no forces.
+        """
+        frames, ref_frames = self.data.frames, self.reference.frames
+        if len(frames) != len(ref_frames):
+            raise ValueError("data and reference have a different number of frames")
+        errors = ForceErrorAccumulator()
+        for start in tqdm.trange(0, len(frames), self.chunk_size):
+            stop = start + self.chunk_size
+            try:
+                columns = get_columns(frames, ["numbers", "forces"], start, stop)
+                ref_columns = get_columns(ref_frames, ["forces"], start, stop)
+            except (KeyError, RuntimeError, PropertyNotImplementedError) as err:
+                warnings.warn(f"Can not compare the forces: {err!r}")
+                return None
+            if len(columns["forces"]) != len(ref_columns["forces"]):
+                raise ValueError("Atoms objects have different lengths")
+            errors.update(columns["numbers"], columns["forces"] - ref_columns["forces"])
+        return errors
 
     def run(self):
         e_rmse = rmse(self.data.plots["energy"], self.reference.plots["energy"])
@@ -40,30 +128,34 @@ class CompareCalculatorResults(zntrack.Node):
             "fmax": rmse(self.data.plots["fmax"], self.reference.plots["fmax"]),
             "fnorm": rmse(self.data.plots["fnorm"], self.reference.plots["fnorm"]),
         }
-
-        all_plots = []
-
-        for row_idx in tqdm.trange(len(self.data.plots)):
-            plots = {}
-            plots["adjusted_energy_error"] = (
-                self.data.plots["energy"].iloc[row_idx] - e_rmse
-            ) - self.reference.plots["energy"].iloc[row_idx]
-            plots["adjusted_energy"] = self.data.plots["energy"].iloc[row_idx] - e_rmse
-            plots["adjusted_energy_error_per_atom"] = (
-                plots["adjusted_energy_error"]
-                / self.data.plots["n_atoms"].iloc[row_idx]
-            )
-
-            plots["fmax_error"] = (
-                self.data.plots["fmax"].iloc[row_idx]
-                - self.reference.plots["fmax"].iloc[row_idx]
-            )
-            plots["fnorm_error"] = (
-                self.data.plots["fnorm"].iloc[row_idx]
-                - self.reference.plots["fnorm"].iloc[row_idx]
-            )
-            all_plots.append(plots)
-        self.plots = pd.DataFrame(all_plots)
+        self.mae = {}
+        self.force_errors_per_element = {}
+        errors = self.get_force_errors()
+        if errors is None:
+            self.rmse["forces"] = self.mae["forces"] = float("nan")
+        else:
+            force_errors, self.force_errors_per_element = errors.get_metrics()
+            if force_errors:
+                self.rmse["forces"] = force_errors["rmse"]
+                self.mae["forces"] = force_errors["mae"]
+
+        # positional arrays, mixed dtypes are promoted without a copy
+        energy = self.data.plots["energy"].to_numpy()
+        ref_energy = self.reference.plots["energy"].to_numpy()
+        adjusted_energy = energy - e_rmse
+        adjusted_energy_error = adjusted_energy - ref_energy
+        self.plots = pd.DataFrame(
+            {
+                "adjusted_energy_error": adjusted_energy_error,
+                "adjusted_energy": adjusted_energy,
+                "adjusted_energy_error_per_atom": adjusted_energy_error
+                / self.data.plots["n_atoms"].to_numpy(),
+                "fmax_error": self.data.plots["fmax"].to_numpy()
+                - self.reference.plots["fmax"].to_numpy(),
+                "fnorm_error": self.data.plots["fnorm"].to_numpy()
+                - self.reference.plots["fnorm"].to_numpy(),
+            }
+        )
 
         # iterate over plots and save min/max
         self.error = {}
@@ -11,7 +11,7 @@ import zntrack
 from ase.data import atomic_numbers, covalent_radii
 
 from mlipx.abc import ComparisonResults, NodeWithCalculator
-from mlipx.utils import freeze_copy_atoms
+from mlipx.utils import atoms_with_results, calculate_properties
 
 
 class HomonuclearDiatomics(zntrack.Node):
@@ -33,6 +33,8 @@ class HomonuclearDiatomics(zntrack.Node):
     data : list[ase.Atoms]|None
         Optional list of ase.Atoms. Diatomics for each element in
         this list will be added to `elements`.
+    properties : list[str], default=["energy"]
+        Properties to compute for each bond length.
     model_outs:
         Path to store the outputs of the model.
         Some models, like DFT calculators, generate
@@ -56,6 +58,7 @@ class HomonuclearDiatomics(zntrack.Node):
     eq_distance: t.Union[t.Literal["covalent-radiuis"], float] = zntrack.params(
         "covalent-radiuis"
     )
+    properties: list[str] = zntrack.params(default_factory=lambda: ["energy"])
 
     frames: list[ase.Atoms] = zntrack.outs()  # TODO: change to h5md out
     results: pd.DataFrame = zntrack.plots()
@@ -97,9 +100,9 @@ class HomonuclearDiatomics(zntrack.Node):
             for distance in tbar:
                 tbar.set_description(f"{element}-{element} bond ({distance:.2f} Å)")
                 molecule = self.build_molecule(element, distance)
-                molecule.calc = calc
-                energies.append(molecule.get_potential_energy())
-                self.frames.append(freeze_copy_atoms(molecule))
+                results = calculate_properties(molecule, calc, self.properties)
+                energies.append(results["energy"])
+                self.frames.append(atoms_with_results(molecule, results))
             e_v[element] = pd.DataFrame(energies, index=distances, columns=[element])
         self.results = functools.reduce(
             lambda x, y: pd.merge(x, y, left_index=True, right_index=True, how="outer"),
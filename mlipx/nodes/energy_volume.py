@@ -7,6 +7,8 @@ import tqdm
 import zntrack
 
 from mlipx.abc import ComparisonResults, NodeWithCalculator
+from mlipx.memoize import cached_output
+from mlipx.utils import atoms_with_results, calculate_properties
 
 
 class EnergyVolumeCurve(zntrack.Node):
@@ -26,6 +28,8 @@ class EnergyVolumeCurve(zntrack.Node):
         Initial scaling factor from the original cell.
     stop : float, default=2.0
         Final scaling factor from the original cell.
+    properties : list[str], default=["energy", "forces"]
+        Properties to compute. Without "forces", the fmax curve is skipped.
 
     Attributes
     ----------
@@ -41,6 +45,7 @@ class EnergyVolumeCurve(zntrack.Node):
     n_points: int = zntrack.params(50)
     start: float = zntrack.params(0.75)
     stop: float = zntrack.params(2.0)
+    properties: list[str] = zntrack.params(default_factory=lambda: ["energy", "forces"])
 
     frames_path: str = zntrack.outs_path(zntrack.nwd / "frames.xyz")
     results: pd.DataFrame = zntrack.plots(y="energy", x="scale")
@@ -55,28 +60,32 @@ class EnergyVolumeCurve(zntrack.Node):
         for scale in tqdm.tqdm(scale_factor):
             atoms_copy = atoms.copy()
             atoms_copy.set_cell(atoms.get_cell() * scale, scale_atoms=True)
-            atoms_copy.calc = calc
-
-            results.append(
-                {
-                    "volume": atoms_copy.get_volume(),
-                    "energy": atoms_copy.get_potential_energy(),
-                    "fmax": np.linalg.norm(atoms_copy.get_forces(), axis=-1).max(),
-                    "scale": scale,
-                }
+            calc_results = calculate_properties(atoms_copy, calc, self.properties)
+
+            row = {
+                "volume": atoms_copy.get_volume(),
+                "energy": calc_results["energy"],
+                "scale": scale,
+            }
+            if "forces" in self.properties:
+                row["fmax"] = np.linalg.norm(calc_results["forces"], axis=-1).max()
+            results.append(row)
+
+            ase.io.write(
+                self.frames_path,
+                atoms_with_results(atoms_copy, calc_results),
+                append=True,
             )
 
-            ase.io.write(self.frames_path, atoms_copy, append=True)
-
         self.results = pd.DataFrame(results)
 
-    @property
+    @cached_output
     def frames(self) -> list[ase.Atoms]:
         """List of structures evaluated during the energy-volume curve."""
         with self.state.fs.open(self.frames_path, "r") as f:
             return list(ase.io.iread(f, format="extxyz"))
 
-    @property
+    @cached_output
     def figures(self) -> dict[str, go.Figure]:
         """Plot the energy-volume curve."""
         fig = px.scatter(self.results, x="scale", y="energy", color="scale")
@@ -85,6 +94,9 @@ class EnergyVolumeCurve(zntrack.Node):
         fig.update_xaxes(title_text="cell vector scale")
         fig.update_yaxes(title_text="Energy / eV")
 
+        if "fmax" not in self.results.columns:
+            return {"energy-volume-curve": fig}
+
         ffig = px.scatter(self.results, x="scale", y="fmax", color="scale")
         ffig.update_layout(title="Energy-Volume Curve (fmax)")
         ffig.update_traces(customdata=np.stack([np.arange(self.n_points)], axis=1))
@@ -10,6 +10,7 @@ import zntrack
 from ase.calculators.calculator import PropertyNotImplementedError
 
 from mlipx.abc import ComparisonResults
+from mlipx.columnar import COLUMNS, get_columns
 from mlipx.utils import shallow_copy_atoms
 
 
@@ -49,6 +50,33 @@ def get_figure(
     return fig
 
 
+def get_frame_metrics(columns: COLUMNS) -> pd.DataFrame:
+    """Compute fmax, fnorm and energy of all frames from their columnar arrays.
+
+    Parameters
+    ----------
+    columns : dict[str, np.ndarray]
+        'energy', 'forces' and 'offsets' as returned by
+        `mlipx.columnar.get_columns`.
+    """
+    offsets = columns["offsets"]
+    forces = columns["forces"]
+    n_atoms = np.diff(offsets)
+    energy = columns["energy"]
+    # segment reductions over the atoms of each frame
+    fmax = np.maximum.reduceat(np.linalg.norm(forces, axis=1), offsets[:-1])
+    fnorm = np.sqrt(np.add.reduceat(np.sum(forces**2, axis=1), offsets[:-1]))
+    return pd.DataFrame(
+        {
+            "fmax": fmax,
+            "fnorm": fnorm,
+            "energy": energy,
+            "n_atoms": n_atoms,
+            "energy_per_atom": energy / n_atoms,
+        }
+    )
+
+
 class EvaluateCalculatorResults(zntrack.Node):
     """
     Evaluate the results of a calculator.
@@ -57,40 +85,27 @@ class EvaluateCalculatorResults(zntrack.Node):
     ----------
     data : list[ase.Atoms]
         List of atoms objects.
+    chunk_size : int, default=10000
+        Number of frames whose forces are held in memory at once.
 
     """
 
     data: list[ase.Atoms] = zntrack.deps()
+    chunk_size: int = zntrack.params(10000)
     plots: pd.DataFrame = zntrack.plots(
         y=["fmax", "fnorm", "energy"], independent=True, autosave=True
     )
 
     def run(self):
-        self.plots = pd.DataFrame()
-        frame_data = []
-        for idx in tqdm.tqdm(range(len(self.data))):
-            atoms = self.data[idx]
-
-            forces = atoms.get_forces()
-            fmax = np.max(np.linalg.norm(forces, axis=1))
-            fnorm = np.linalg.norm(forces)
-            energy = atoms.get_potential_energy()
-            # eform = atoms.info.get(ASEKeys.formation_energy.value, -1)
-            n_atoms = len(atoms)
-
-            # have energy and formation energy in the plot
-
-            plots = {
-                "fmax": fmax,
-                "fnorm": fnorm,
-                "energy": energy,
-                # "eform": eform,
-                "n_atoms": n_atoms,
-                "energy_per_atom": energy / n_atoms,
-                # "eform_per_atom": eform / n_atoms,
-            }
-            frame_data.append(plots)
-        self.plots = pd.DataFrame(frame_data)
+        chunks = [
+            get_frame_metrics(
+                get_columns(
+                    self.data, ["energy", "forces"], start, start + self.chunk_size
+                )
+            )
+            for start in tqdm.trange(0, len(self.data), self.chunk_size)
+        ]
+        self.plots = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
 
     @property
     def frames(self):
@@ -3,10 +3,10 @@ import typing as t
 import ase
 import pandas as pd
 import zntrack
-from tqdm import tqdm, trange
+from tqdm import tqdm
 
 from mlipx.abc import ASEKeys, NodeWithCalculator
-from mlipx.utils import rmse
+from mlipx.utils import calculate_properties, rmse
 
 
 class CalculateFormationEnergy(zntrack.Node):
@@ -17,10 +17,16 @@ class CalculateFormationEnergy(zntrack.Node):
     ----------
     data : list[ase.Atoms]
         ASE atoms object with appropriate tags in info
+    model : NodeWithCalculator, optional
+        Model to compute the isolated atom energies with. If None,
+        the isolated energies are read from the `info` of the atoms.
+    properties : list[str], default=["energy"]
+        Properties to compute for the isolated atoms.
     """
 
     data: list[ase.Atoms] = zntrack.deps()
     model: t.Optional[NodeWithCalculator] = zntrack.deps(None)
+    properties: list[str] = zntrack.params(default_factory=lambda: ["energy"])
 
     formation_energy: list = zntrack.outs(independent=True)
     isolated_energies: dict = zntrack.outs(independent=True)
@@ -32,6 +38,7 @@ class CalculateFormationEnergy(zntrack.Node):
     def get_isolated_energies(self) -> dict[str, float]:
         # get all unique elements
         isolated_energies = {}
+        calc = None if self.model is None else self.model.get_calculator()
         for atoms in tqdm(self.data, desc="Getting isolated energies"):
             for element in set(atoms.get_chemical_symbols()):
                 if self.model is None:
@@ -52,8 +59,8 @@ class CalculateFormationEnergy(zntrack.Node):
                             cell=[100, 100, 100],
                             pbc=True,
                         )
-                        box.calc = self.model.get_calculator()
-                        isolated_energies[element] = box.get_potential_energy()
+                        results = calculate_properties(box, calc, self.properties)
+                        isolated_energies[element] = results["energy"]
 
         return isolated_energies
 
@@ -76,9 +83,10 @@ class CalculateFormationEnergy(zntrack.Node):
 
     @property
     def frames(self):
-        for atom, energy in zip(self.data, self.formation_energy):
+        frames = list(self.data)
+        for atom, energy in zip(frames, self.formation_energy):
             atom.info[ASEKeys.formation_energy.value] = energy
-        return self.data
+        return frames
 
 
 class CompareFormationEnergy(zntrack.Node):
@@ -97,21 +105,17 @@ class CompareFormationEnergy(zntrack.Node):
             "eform_per_atom": eform_rmse / len(self.data.plots),
         }
 
-        all_plots = []
-
-        for row_idx in trange(len(self.data.plots)):
-            plots = {}
-            plots["adjusted_eform_error"] = (
-                self.data.plots["eform"].iloc[row_idx] - eform_rmse
-            ) - self.reference.plots["eform"].iloc[row_idx]
-            plots["adjusted_eform"] = (
-                self.data.plots["eform"].iloc[row_idx] - eform_rmse
-            )
-            plots["adjusted_eform_error_per_atom"] = (
-                plots["adjusted_eform_error"] / self.data.plots["n_atoms"].iloc[row_idx]
-            )
-            all_plots.append(plots)
-        self.plots = pd.DataFrame(all_plots)
+        # positional arrays, mixed dtypes are promoted without a copy
+        adjusted_eform = self.data.plots["eform"].to_numpy() - eform_rmse
+        adjusted_eform_error = adjusted_eform - self.reference.plots["eform"].to_numpy()
+        self.plots = pd.DataFrame(
+            {
+                "adjusted_eform_error": adjusted_eform_error,
+                "adjusted_eform": adjusted_eform,
+                "adjusted_eform_error_per_atom": adjusted_eform_error
+                / self.data.plots["n_atoms"].to_numpy(),
+            }
+        )
 
         # iterate over plots and save min/max
         self.error = {}
@@ -9,15 +9,31 @@ import tqdm
 import zntrack
 
 from mlipx.abc import ComparisonResults, NodeWithCalculator
+from mlipx.utils import atoms_with_results, calculate_properties
 
 
 class InvarianceNode(zntrack.Node):
-    """Base class for testing invariances."""
+    """Base class for testing invariances.
+
+    Parameters
+    ----------
+    model : NodeWithCalculator
+        Node providing the calculator object for the energy calculations.
+    data : list[ase.Atoms]
+        List of structures to evaluate.
+    data_id : int, default=-1
+        Index of the structure to evaluate.
+    n_points : int, default=50
+        Number of transformations to apply.
+    properties : list[str], default=["energy"]
+        Properties to compute for each transformed structure.
+    """
 
     model: NodeWithCalculator = zntrack.deps()
     data: list[ase.Atoms] = zntrack.deps()
     data_id: int = zntrack.params(-1)
     n_points: int = zntrack.params(50)
+    properties: list[str] = zntrack.params(default_factory=lambda: ["energy"])
 
     metrics: dict = zntrack.metrics()
     plots: pd.DataFrame = zntrack.plots()
@@ -28,14 +44,16 @@ class InvarianceNode(zntrack.Node):
         """Common logic for invariance testing."""
         atoms = self.data[self.data_id]
         calc = self.model.get_calculator()
-        atoms.calc = calc
 
         rng = np.random.default_rng()
         energies = []
         for _ in tqdm.tqdm(range(self.n_points)):
             self.apply_transformation(atoms, rng)
-            energies.append(atoms.get_potential_energy())
-            ase.io.write(self.frames_path, atoms, append=True)
+            results = calculate_properties(atoms, calc, self.properties)
+            energies.append(results["energy"])
+            ase.io.write(
+                self.frames_path, atoms_with_results(atoms, results), append=True
+            )
 
         self.plots = pd.DataFrame(energies, columns=["energy"])
 
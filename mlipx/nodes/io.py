@@ -1,16 +1,189 @@
+import collections
+import contextlib
+import functools
+import hashlib
+import io
+import itertools
+import math
+import multiprocessing
+import os
 import pathlib
+import time
 import typing as t
+from concurrent.futures import ProcessPoolExecutor
 
 import ase.io
 import h5py
+import numpy as np
 import znh5md
 import zntrack
+from fsspec import AbstractFileSystem
+
+from mlipx.columnar import COLUMNS, get_columns
+from mlipx.frames import (
+    MIXED,
+    FrameSequence,
+    H5MDFrames,
+    iter_consecutive,
+    set_dtypes,
+    update_dtypes,
+)
+
+
+def build_extxyz_index(f: t.BinaryIO) -> np.ndarray:
+    """Scan an extxyz file for the byte offsets of all frames.
+
+    Parameters
+    ----------
+    f : BinaryIO
+        File opened in binary mode.
+
+    Returns
+    -------
+    np.ndarray
+        Byte offset of each frame, followed by the end of the last frame.
+    """
+    offsets = []
+    position = f.tell()
+    for line in iter(f.readline, b""):
+        if line.strip():
+            n_atoms = int(line)
+            offsets.append(position)
+            # skip the comment line and the atoms
+            position += len(line) + sum(
+                len(x) for x in itertools.islice(iter(f.readline, b""), n_atoms + 1)
+            )
+        else:
+            position += len(line)
+    offsets.append(position)
+    return np.array(offsets, dtype=np.int64)
+
+
+def _parse_extxyz(block: bytes) -> list[ase.Atoms]:
+    return list(ase.io.iread(io.StringIO(block.decode()), format="extxyz", index=":"))
+
+
+def _iter_extxyz_blocks(
+    f: t.BinaryIO, offsets: np.ndarray, indices: list[int], max_frames: int
+) -> t.Iterator[bytes]:
+    """Yield blocks of up to `max_frames` consecutive frames."""
+    for group in iter_consecutive(indices):
+        for first in range(0, len(group), max_frames):
+            chunk = group[first : first + max_frames]
+            f.seek(offsets[chunk[0]])
+            yield f.read(offsets[chunk[-1] + 1] - offsets[chunk[0]])
+
+
+@functools.lru_cache(maxsize=32)
+def _hash_file(path: str, size: int, mtime_ns: int) -> str:
+    """SHA-256 of a file, cached for its size and modification time."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(2**20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def iter_extxyz_frames(
+    f: t.BinaryIO,
+    offsets: np.ndarray,
+    indices: t.Sequence[int],
+    n_workers: int = 1,
+    chunk_size: int = 1000,
+) -> t.Iterator[ase.Atoms]:
+    """Parse only the selected frames from an extxyz file using the byte offsets.
+
+    Consecutive frames are read as blocks of up to `chunk_size` frames.
+    With `n_workers > 1`, the blocks are parsed in a process pool with
+    at most two blocks per worker in flight. The order of the frames is preserved.
+    """
+    indices = list(indices)
+    if n_workers <= 1 or len(indices) < 2:
+        for block in _iter_extxyz_blocks(f, offsets, indices, chunk_size):
+            yield from _parse_extxyz(block)
+        return
+
+    # a few chunks per worker to balance frames of different size
+    max_frames = min(chunk_size, max(1, math.ceil(len(indices) / (4 * n_workers))))
+    pending: collections.deque = collections.deque()
+    with ProcessPoolExecutor(
+        max_workers=n_workers, mp_context=multiprocessing.get_context("spawn")
+    ) as executor:
+        for block in _iter_extxyz_blocks(f, offsets, indices, max_frames):
+            pending.append(executor.submit(_parse_extxyz, block))
+            if len(pending) >= 2 * n_workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def read_extxyz_frames(
+    f: t.BinaryIO,
+    offsets: np.ndarray,
+    indices: t.Sequence[int],
+    n_workers: int = 1,
+) -> list[ase.Atoms]:
+    """Read the selected frames from an extxyz file, see `iter_extxyz_frames`."""
+    return list(iter_extxyz_frames(f, offsets, indices, n_workers))
+
+
+class ExtxyzFrames(FrameSequence):
+    """Frames of an extxyz file, parsed on access using the byte offsets.
+
+    Parameters
+    ----------
+    fs : AbstractFileSystem
+        File system to open `path` with, e.g. `node.state.fs`.
+    path : str
+        Path to the extxyz file.
+    offsets : np.ndarray
+        Byte offsets as returned by `build_extxyz_index`.
+    indices : range
+        Frames of the file that are part of the sequence.
+    n_workers : int, default=1
+        Number of processes used to parse reads of more than `chunk_size` frames.
+    """
+
+    def __init__(
+        self,
+        fs: AbstractFileSystem,
+        path: str,
+        offsets: np.ndarray,
+        indices: range,
+        n_workers: int = 1,
+    ):
+        self.fs = fs
+        self.path = path
+        self.offsets = offsets
+        self.indices = indices
+        self.n_workers = n_workers
+
+    def __len__(self) -> int:
+        return len(self.indices)
+
+    def read(self, indices: list[int]) -> list[ase.Atoms]:
+        # starting a process pool only pays off for large reads
+        n_workers = self.n_workers if len(indices) > self.chunk_size else 1
+        with self.fs.open(self.path, "rb") as f:
+            return read_extxyz_frames(
+                f, self.offsets, [self.indices[idx] for idx in indices], n_workers
+            )
 
 
 class LoadDataFile(zntrack.Node):
     """Load a trajectory file.
 
     Entry point of trajectory data for the use in other nodes.
+    Text formats, e.g. extxyz, are parsed once and the frames are stored
+    in a binary H5MD copy, which is used as long as the content of the source
+    file is unchanged. The SHA-256 of the source is stored with the copy and
+    only recomputed, once per process, if the size or modification time of the
+    source file changed, e.g. after a checkout.
+    Integer and boolean `info` and `arrays` values are restored with their type.
+    If a key can not be restored, e.g. its type differs between frames, or a
+    frame has constraints, which H5MD does not store, the copy is not used.
+    For extxyz files, the byte offsets of all frames are indexed as well,
+    so only the selected frames have to be parsed without the binary copy.
 
     Parameters
     ----------
@@ -22,37 +195,205 @@ class LoadDataFile(zntrack.Node):
         Index of the last frame to load.
     step : int, default=1
         Step size between frames.
+    n_workers : int, default=1
+        Number of processes used to parse extxyz files.
+    chunk_size : int, default=1000
+        Number of frames parsed and written to the binary copy at a time.
 
     Attributes
     ----------
     frames : list[ase.Atoms]
         Loaded frames.
+    metrics : dict
+        Number of frames and the parse throughput in frames/s and MB/s
+        for extxyz files.
     """
 
     path: str | pathlib.Path = zntrack.deps_path()
-    # TODO these are not used
     start: int = zntrack.params(0)
     stop: t.Optional[int] = zntrack.params(None)
     step: int = zntrack.params(1)
+    n_workers: int = zntrack.params(1)
+    chunk_size: int = zntrack.params(1000)
 
-    def run(self):
-        pass
+    index_path: pathlib.Path = zntrack.outs_path(zntrack.nwd / "frames_index.npy")
+    frames_path: pathlib.Path = zntrack.outs_path(zntrack.nwd / "frames.h5")
+    metrics: dict = zntrack.metrics()
 
     @property
-    def frames(self) -> list[ase.Atoms]:
-        if pathlib.Path(self.path).suffix in [".h5", ".h5md"]:
-            with self.state.fs.open(self.path, "rb") as f:
-                with h5py.File(f) as file:
-                    return znh5md.IO(file_handle=file)[
-                        self.start : self.stop : self.step
-                    ]
-        else:
-            format = pathlib.Path(self.path).suffix.lstrip(".")
-            if format == "xyz":
-                format = "extxyz"  # force ase to use the extxyz reader
+    def format(self) -> str:
+        format = pathlib.Path(self.path).suffix.lstrip(".")
+        if format == "xyz":
+            format = "extxyz"  # force ase to use the extxyz reader
+        return format
+
+    @property
+    def is_h5md(self) -> bool:
+        return pathlib.Path(self.path).suffix in [".h5", ".h5md"]
+
+    def run(self):
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        offsets = np.zeros(0, dtype=np.int64)
+        self.metrics = {}
+        if self.format == "extxyz":
+            with open(self.path, "rb") as f:
+                offsets = build_extxyz_index(f)
+                indices = self._get_indices(offsets)
+                frames = iter_extxyz_frames(
+                    f, offsets, indices, self.n_workers, self.chunk_size
+                )
+                n_frames, parse_time = self._write_binary_copy(frames)
+            # the throughput helps to choose `n_workers`
+            n_bytes = sum(offsets[idx + 1] - offsets[idx] for idx in indices)
+            self.metrics = {
+                "n_frames": n_frames,
+                "parse_frames_per_second": n_frames / parse_time if parse_time else 0.0,
+                "parse_mb_per_second": (
+                    int(n_bytes) / 1e6 / parse_time if parse_time else 0.0
+                ),
+            }
+        elif not self.is_h5md:
             with self.state.fs.open(self.path, "r") as f:
-                return list(
-                    ase.io.iread(
-                        f, format=format, index=slice(self.start, self.stop, self.step)
-                    )
+                self._write_binary_copy(self._iread_source(f))
+        else:
+            self._write_binary_copy(None)
+        np.save(self.index_path, offsets)
+
+    def _get_indices(self, offsets: np.ndarray) -> range:
+        return range(len(offsets) - 1)[self.start : self.stop : self.step]
+
+    def _get_source_stamp(self) -> list[int]:
+        stat = os.stat(self.path)
+        return [stat.st_size, stat.st_mtime_ns]
+
+    def _get_source_hash(self) -> str:
+        return _hash_file(os.fspath(self.path), *self._get_source_stamp())
+
+    def _is_source_unchanged(self, attrs: h5py.AttributeManager) -> bool:
+        """Whether the source file matches the one the copy was written from.
+
+        Outside the working tree, e.g. for another revision, DVC keeps
+        the outputs in sync with the source file.
+        """
+        if self.state.rev is not None or self.state.remote is not None:
+            return True
+        if "source_sha256" not in attrs:
+            return False
+        if list(attrs["source_stamp"]) == self._get_source_stamp():
+            return True
+        return attrs["source_sha256"] == self._get_source_hash()
+
+    def _write_binary_copy(
+        self, frames: t.Iterable[ase.Atoms] | None
+    ) -> tuple[int, float]:
+        """Store the parsed frames, keyed by the hash of the source file.
+
+        The frames are written in chunks of `chunk_size`. Returns the number
+        of frames and the time spent waiting for `frames`, i.e. parsing them.
+        """
+        self.frames_path.unlink(missing_ok=True)
+        n_frames, parse_time = 0, 0.0
+        dtypes: dict[str, str] = {}
+        has_constraints = False
+        if frames is not None:
+            writer = znh5md.IO(self.frames_path)
+            iterator = iter(frames)
+            while True:
+                parse_start = time.perf_counter()
+                chunk = list(itertools.islice(iterator, self.chunk_size))
+                parse_time += time.perf_counter() - parse_start
+                if not chunk:
+                    break
+                for atoms in chunk:
+                    update_dtypes(dtypes, atoms)
+                    has_constraints = has_constraints or bool(atoms.constraints)
+                writer.extend(chunk)
+                n_frames += len(chunk)
+        with h5py.File(self.frames_path, "a") as file:
+            if frames is not None:
+                file.attrs["source_stamp"] = self._get_source_stamp()
+                file.attrs["source_sha256"] = self._get_source_hash()
+                file.attrs["lossless"] = (
+                    MIXED not in dtypes.values() and not has_constraints
+                )
+                set_dtypes(file, dtypes)
+        return n_frames, parse_time
+
+    @contextlib.contextmanager
+    def _open_binary_copy(self) -> t.Iterator[h5py.File | None]:
+        """Open the binary copy of the frames, if it exists."""
+        try:
+            f = self.state.fs.open(self.frames_path, "rb")
+        except FileNotFoundError:
+            yield None
+            return
+        with f, h5py.File(f) as file:
+            yield file
+
+    def _iread_source(self, f: t.TextIO) -> t.Iterator[ase.Atoms]:
+        return ase.io.iread(
+            f, format=self.format, index=slice(self.start, self.stop, self.step)
+        )
+
+    def _read_source(self, offsets: np.ndarray | None) -> list[ase.Atoms]:
+        if offsets is not None:
+            with self.state.fs.open(self.path, "rb") as f:
+                return read_extxyz_frames(
+                    f, offsets, self._get_indices(offsets), self.n_workers
                 )
+        with self.state.fs.open(self.path, "r") as f:
+            return list(self._iread_source(f))
+
+    def get_index(self) -> np.ndarray | None:
+        """Byte offsets of the frames in an extxyz file, if available."""
+        try:
+            with self.state.fs.open(self.index_path, "rb") as f:
+                offsets = np.load(f)
+        except FileNotFoundError:
+            return None
+        return offsets if len(offsets) > 0 else None
+
+    def get_columns(
+        self, keys: t.Sequence[str] = ("numbers", "positions", "energy", "forces")
+    ) -> COLUMNS:
+        """Read properties of the frames as NumPy arrays.
+
+        H5MD files and the binary copy of text formats are read without
+        building atoms, otherwise the arrays are converted from `frames`.
+        See `mlipx.columnar.read_h5md_columns` for the layout of the arrays.
+        """
+        return get_columns(self.frames, keys)
+
+    @property
+    def frames(self) -> t.Sequence[ase.Atoms]:
+        """The selected frames.
+
+        Frames of H5MD files, the binary copy and indexed extxyz files
+        are only loaded when accessed.
+        """
+        if self.is_h5md:
+            indices = H5MDFrames(self.state.fs, self.path).indices
+            return H5MDFrames(
+                self.state.fs, self.path, indices[self.start : self.stop : self.step]
+            )
+        with self._open_binary_copy() as file:
+            is_unchanged = file is not None and self._is_source_unchanged(file.attrs)
+            if is_unchanged and "particles" not in file:
+                return []
+            is_lossless = is_unchanged and file.attrs.get("lossless", False)
+        if is_lossless:
+            return H5MDFrames(self.state.fs, self.frames_path)
+        # the byte offsets are valid for the unchanged source, even if the copy is not
+        if (
+            is_unchanged
+            and self.format == "extxyz"
+            and (offsets := self.get_index()) is not None
+        ):
+            return ExtxyzFrames(
+                self.state.fs,
+                self.path,
+                offsets,
+                self._get_indices(offsets),
+                self.n_workers,
+            )
+        return self._read_source(offsets=None)
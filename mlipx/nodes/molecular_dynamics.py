@@ -1,7 +1,14 @@
+import contextlib
+import copy
 import dataclasses
+import os
 import pathlib
+import shutil
+import time
+import typing as t
+import warnings
 
-import ase.io
+import ase
 import ase.units
 import numpy as np
 import pandas as pd
@@ -12,12 +19,217 @@ import zntrack
 from ase.md import Langevin
 
 from mlipx.abc import (
+    BatchCalculator,
     ComparisonResults,
     DynamicsModifier,
     DynamicsObserver,
+    DynamicsStep,
     NodeWithCalculator,
     NodeWithMolecularDynamics,
 )
+from mlipx.batching import (
+    ProcessPoolBatchCalculator,
+    calculate_frames,
+    get_batch_calculator,
+)
+from mlipx.checkpoint import (
+    get_atoms_state,
+    get_dynamics_state,
+    get_fingerprint,
+    read_checkpoint,
+    set_atoms_state,
+    set_dynamics_state,
+    truncate_trajectory,
+    write_checkpoint,
+)
+from mlipx.columnar import get_columns
+from mlipx.frames import BufferedH5MDWriter, ChainedFrames, H5MDFrames
+from mlipx.memoize import cached_output
+from mlipx.utils import atoms_with_results
+
+
+class ObservableBuffer:
+    """Record scalar observables of each step into preallocated arrays.
+
+    Full buffers are stored as chunks, so the cost per step does not grow
+    with the number of recorded steps.
+
+    Parameters
+    ----------
+    columns : list[str]
+        Names of the recorded observables.
+    chunk_size : int, default=1000
+        Number of steps stored in each preallocated array.
+    """
+
+    def __init__(self, columns: list[str], chunk_size: int = 1000):
+        self.columns = list(columns)
+        self.chunk_size = chunk_size
+        self._buffer = np.empty((chunk_size, len(self.columns)))
+        self._size = 0
+        self._chunks: list[np.ndarray] = []
+
+    def __len__(self) -> int:
+        return sum(len(chunk) for chunk in self._chunks) + self._size
+
+    def append(self, values: dict[str, float]) -> None:
+        self._buffer[self._size] = [values[key] for key in self.columns]
+        self._size += 1
+        if self._size == self.chunk_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._size > 0:
+            self._chunks.append(self._buffer[: self._size].copy())
+            self._size = 0
+
+    def to_dataframe(self) -> pd.DataFrame:
+        self.flush()
+        if not self._chunks:
+            return pd.DataFrame(columns=self.columns, dtype=float)
+        return pd.DataFrame(np.concatenate(self._chunks), columns=self.columns)
+
+
+class BatchedLangevin:
+    """Langevin dynamics of independent replicas, advanced in lockstep.
+
+    Implements the same propagator as `ase.md.Langevin` for all replicas at
+    once, with the positions, velocities and random forces of all atoms
+    concatenated into single arrays. The forces of all replicas are evaluated
+    with a single `calculate_batch` call per step.
+    Each replica has its own random number generator, so a replica follows
+    the same trajectory as `ase.md.Langevin` with
+    `rng=np.random.default_rng(seed)`, up to floating point round-off.
+
+    Parameters
+    ----------
+    frames : list[ase.Atoms]
+        Initial configurations of the replicas, which are updated in place.
+    calc : BatchCalculator
+        Calculator to evaluate the energies and forces of all replicas.
+    timestep : float
+        Time step in ASE time units.
+    temperature_K : float
+        Temperature of the thermostat in K.
+    friction : float
+        Friction coefficient in inverse ASE time units.
+    seeds : list[int]
+        Seed of the random number generator of each replica.
+    fixcm : bool, default=True
+        Keep the center of mass of each replica fixed, see `ase.md.Langevin`.
+
+    Attributes
+    ----------
+    active : list[int]
+        Indices of the replicas that are still propagated.
+    """
+
+    def __init__(
+        self,
+        frames: list[ase.Atoms],
+        calc: BatchCalculator,
+        timestep: float,
+        temperature_K: float,
+        friction: float,
+        seeds: list[int],
+        fixcm: bool = True,
+    ):
+        if len(seeds) != len(frames):
+            raise ValueError(f"Expected {len(frames)} seeds, got {len(seeds)}")
+        self.frames = frames
+        self.calc = calc
+        self.dt = timestep
+        self.fr = friction
+        self.temp = ase.units.kB * temperature_K
+        self.fix_com = fixcm
+        self.rngs = [np.random.default_rng(seed) for seed in seeds]
+        self.active = list(range(len(frames)))
+        self.nsteps = 0
+        for atoms in frames:
+            if not atoms.has("momenta"):
+                atoms.set_momenta(np.zeros((len(atoms), 3)))
+
+    def set_temperature(self, temperature=None, temperature_K=None) -> None:
+        if temperature_K is not None:
+            temperature = ase.units.kB * temperature_K
+        self.temp = temperature
+
+    def set_friction(self, friction: float) -> None:
+        self.fr = friction
+
+    def stop(self, replicas: list[int]) -> None:
+        """Stop propagating the given replicas."""
+        self.active = [idx for idx in self.active if idx not in replicas]
+
+    def calculate(self) -> None:
+        """Evaluate all active replicas and attach the results to the atoms."""
+        frames = [self.frames[idx] for idx in self.active]
+        calculate_frames(self.calc, frames, ["energy", "forces"])
+
+    def irun(self, steps: int) -> t.Iterator[None]:
+        """Yield after the initial evaluation and after each step.
+
+        Stops early once all replicas have been stopped.
+        """
+        self.calculate()
+        yield
+        for _ in range(steps):
+            if not self.active:
+                return
+            self.step()
+            yield
+
+    def step(self) -> None:
+        frames = [self.frames[idx] for idx in self.active]
+        n_atoms = np.array([len(atoms) for atoms in frames])
+        splits = np.cumsum(n_atoms)[:-1]
+        masses = np.concatenate([atoms.get_masses() for atoms in frames])[:, None]
+        forces = np.concatenate([atoms.get_forces(md=True) for atoms in frames])
+        velocities = np.concatenate([atoms.get_velocities() for atoms in frames])
+        # draw in the same order as `ase.md.Langevin` for each replica
+        xi, eta = [], []
+        for idx in self.active:
+            shape = (len(self.frames[idx]), 3)
+            xi.append(self.rngs[idx].standard_normal(size=shape))
+            eta.append(self.rngs[idx].standard_normal(size=shape))
+        xi, eta = np.concatenate(xi), np.concatenate(eta)
+
+        dt, fr = self.dt, self.fr
+        sigma = np.sqrt(2 * self.temp * fr / masses)
+        c1 = dt / 2.0 - dt * dt * fr / 8.0
+        c2 = dt * fr / 2 - dt * dt * fr * fr / 8.0
+        c3 = np.sqrt(dt) * sigma / 2.0 - dt**1.5 * fr * sigma / 8.0
+        c5 = dt**1.5 * sigma / (2 * np.sqrt(3))
+        c4 = fr / 2.0 * c5
+
+        rnd_pos = c5 * eta
+        rnd_vel = c3 * xi - c4 * eta
+        if self.fix_com:
+            n = np.repeat(n_atoms, n_atoms)[:, None]
+            starts = np.concatenate([[0], splits])
+
+            def replica_sum(values: np.ndarray) -> np.ndarray:
+                return np.repeat(np.add.reduceat(values, starts), n_atoms, axis=0)
+
+            factor = np.sqrt(n / (n - 1.0))
+            rnd_pos = (rnd_pos - replica_sum(rnd_pos) / n) * factor
+            rnd_vel = (rnd_vel - replica_sum(rnd_vel * masses) / (masses * n)) * factor
+
+        velocities += c1 * forces / masses - c2 * velocities + rnd_vel
+        positions = np.concatenate([atoms.get_positions() for atoms in frames])
+        new_positions = np.split(positions + dt * velocities + rnd_pos, splits)
+        for atoms, atoms_positions in zip(frames, new_positions):
+            # applies constraints
+            atoms.set_positions(atoms_positions)
+        new_positions = np.concatenate([atoms.get_positions() for atoms in frames])
+        velocities = (new_positions - positions - rnd_pos) / dt
+
+        self.calculate()
+        forces = np.concatenate([atoms.get_forces(md=True) for atoms in frames])
+        velocities += c1 * forces / masses - c2 * velocities + rnd_vel
+        for atoms, momenta in zip(frames, np.split(velocities * masses, splits)):
+            atoms.set_momenta(momenta)
+        self.nsteps += 1
 
 
 @dataclasses.dataclass
@@ -32,11 +244,15 @@ class LangevinConfig:
         Temperature of the thermostat.
     friction : float
         Friction coefficient of the thermostat.
+    seed : int, optional
+        Seed of the random number generator. By default,
+        the global NumPy random number generator is used.
     """
 
     timestep: float
     temperature: float
     friction: float
+    seed: int | None = None
 
     def get_molecular_dynamics(self, atoms) -> Langevin:
         return Langevin(
@@ -44,6 +260,19 @@ class LangevinConfig:
             timestep=self.timestep * ase.units.fs,
             temperature_K=self.temperature,
             friction=self.friction,
+            rng=None if self.seed is None else np.random.default_rng(self.seed),
+        )
+
+    def get_batched_molecular_dynamics(
+        self, frames: list[ase.Atoms], calc: BatchCalculator, seeds: list[int]
+    ) -> BatchedLangevin:
+        return BatchedLangevin(
+            frames,
+            calc,
+            timestep=self.timestep * ase.units.fs,
+            temperature_K=self.temperature,
+            friction=self.friction,
+            seeds=seeds,
         )
 
 
@@ -62,6 +291,27 @@ class MolecularDynamics(zntrack.Node):
         Index of the initial configuration to use.
     steps : int, default=100
         Number of steps to run the simulation.
+    write_interval : int, default=1
+        Store every `write_interval`-th step in the trajectory.
+    flush_interval : int, default=100
+        Number of stored frames kept in memory before they are written.
+    checkpoint_interval : int, default=100
+        Number of steps between checkpoints.
+    resume : bool, default=True
+        Continue an interrupted run from the last checkpoint.
+        The checkpoint holds the positions, momenta, thermostat state including
+        the random number generator, observers, modifiers and observables.
+
+    Attributes
+    ----------
+    frames : list[ase.Atoms]
+        Trajectory with energies, forces and velocities.
+        The frames are loaded on access.
+    frames_path : pathlib.Path
+        The trajectory in H5MD format, `frames.h5`. Earlier versions wrote
+        `frames.xyz`, outputs of existing projects have to be reproduced.
+    plots : pd.DataFrame
+        Energy, fmax, fnorm, temperature and wall time of each step.
     """
 
     model: NodeWithCalculator = zntrack.deps()
@@ -69,59 +319,136 @@ class MolecularDynamics(zntrack.Node):
     data: list[ase.Atoms] = zntrack.deps()
     data_id: int = zntrack.params(-1)
     steps: int = zntrack.params(100)
+    write_interval: int = zntrack.params(1)
+    flush_interval: int = zntrack.params(100)
+    checkpoint_interval: int = zntrack.params(100)
+    resume: bool = zntrack.params(True)
     observers: list[DynamicsObserver] = zntrack.deps(None)
     modifiers: list[DynamicsModifier] = zntrack.deps(None)
 
     observer_metrics: dict = zntrack.metrics()
     plots: pd.DataFrame = zntrack.plots(y=["energy", "fmax"], autosave=True)
 
-    frames_path: pathlib.Path = zntrack.outs_path(zntrack.nwd / "frames.xyz")
+    frames_path: pathlib.Path = zntrack.outs_path(zntrack.nwd / "frames.h5")
+
+    @property
+    def checkpoint_path(self) -> pathlib.Path:
+        return self.nwd / "checkpoint.pkl"
+
+    @property
+    def partial_path(self) -> pathlib.Path:
+        return self.nwd / "frames.partial.h5"
+
+    def _read_checkpoint(self, fingerprint: str) -> dict | None:
+        checkpoint = read_checkpoint(self.checkpoint_path, fingerprint)
+        if checkpoint is None or truncate_trajectory(
+            self.partial_path, checkpoint["n_frames"]
+        ):
+            return checkpoint
+        warnings.warn(f"Can not resume from '{self.partial_path}'.")
+        return None
+
+    def _resume(self, fingerprint, atoms, dyn) -> tuple[int, ObservableBuffer]:
+        """Restore the last checkpoint and return its step and observables."""
+        checkpoint = self._read_checkpoint(fingerprint) if self.resume else None
+        if checkpoint is None:
+            self.partial_path.unlink(missing_ok=True)
+            return 0, ObservableBuffer(
+                ["energy", "fmax", "fnorm", "temperature", "step_time"]
+            )
+        print(f"Resuming '{self.name}' from step {checkpoint['step']}")
+        set_atoms_state(atoms, checkpoint["atoms"])
+        set_dynamics_state(dyn, checkpoint["dynamics"])
+        self.observers = checkpoint["observers"]
+        self.modifiers = checkpoint["modifiers"]
+        return checkpoint["step"], checkpoint["observables"]
+
+    def _checkpoint(self, step, fingerprint, atoms, dyn, writer, observables) -> None:
+        """Write a checkpoint every `checkpoint_interval` steps."""
+        if not self.resume or step == 0 or step % self.checkpoint_interval != 0:
+            return
+        writer.flush()
+        write_checkpoint(
+            self.checkpoint_path,
+            {
+                "fingerprint": fingerprint,
+                "step": step,
+                "n_frames": step // self.write_interval + 1,
+                "atoms": get_atoms_state(atoms),
+                "dynamics": get_dynamics_state(dyn),
+                "observers": self.observers,
+                "modifiers": self.modifiers,
+                "observables": observables,
+            },
+        )
 
     def run(self):
-        if self.observers is None:
-            self.observers = []
-        if self.modifiers is None:
-            self.modifiers = []
+        self.observers = self.observers or []
+        self.modifiers = self.modifiers or []
         atoms = self.data[self.data_id]
+        fingerprint = get_fingerprint(
+            [atoms],
+            self.model,
+            self.thermostat,
+            self.steps,
+            self.write_interval,
+            self.observers,
+            self.modifiers,
+        )
         atoms.calc = self.model.get_calculator()
         dyn = self.thermostat.get_molecular_dynamics(atoms)
         for obs in self.observers:
             obs.initialize(atoms)
 
         self.observer_metrics = {}
-        self.plots = pd.DataFrame(columns=["energy", "fmax", "fnorm"])
-
-        for idx, _ in enumerate(
-            tqdm.tqdm(dyn.irun(steps=self.steps), total=self.steps)
-        ):
-            ase.io.write(self.frames_path, atoms, append=True)
-            plots = {
-                "energy": atoms.get_potential_energy(),
-                "fmax": np.max(np.linalg.norm(atoms.get_forces(), axis=1)),
-                "fnorm": np.linalg.norm(atoms.get_forces()),
-            }
-            self.plots.loc[len(self.plots)] = plots
+        start, observables = self._resume(fingerprint, atoms, dyn)
+        steps = enumerate(dyn.irun(steps=self.steps - start), start=start)
+        if start > 0:
+            # the state of the checkpoint has already been recorded
+            next(steps)
+        writer = BufferedH5MDWriter(self.partial_path, self.flush_interval)
+        step_start = time.perf_counter()
+        for idx, _ in tqdm.tqdm(steps, total=self.steps, initial=start):
+            step_time = time.perf_counter() - step_start
+            step = DynamicsStep(idx, atoms)
+            if idx % self.write_interval == 0:
+                results = {"energy": step.energy, "forces": step.forces}
+                writer.append(atoms_with_results(atoms, results))
+            observables.append(
+                {
+                    "energy": step.energy,
+                    "fmax": step.fmax,
+                    "fnorm": step.fnorm,
+                    "temperature": step.temperature,
+                    "step_time": step_time,
+                }
+            )
 
             for obs in self.observers:
-                if obs.check(atoms):
+                if idx % obs.interval == 0 and obs.check_step(step):
                     self.observer_metrics[obs.name] = idx
 
             if len(self.observer_metrics) > 0:
                 break
 
             for mod in self.modifiers:
-                mod.modify(dyn, idx)
+                mod.modify_step(dyn, step)
+            self._checkpoint(idx, fingerprint, atoms, dyn, writer, observables)
+            step_start = time.perf_counter()
+        writer.flush()
+        os.replace(self.partial_path, self.frames_path)
+        self.checkpoint_path.unlink(missing_ok=True)
+        self.plots = observables.to_dataframe()
 
         for obs in self.observers:
             # document all attached observers
             self.observer_metrics[obs.name] = self.observer_metrics.get(obs.name, -1)
 
-    @property
-    def frames(self) -> list[ase.Atoms]:
-        with self.state.fs.open(self.frames_path, "r") as f:
-            return list(ase.io.iread(f, format="extxyz"))
+    @cached_output
+    def frames(self) -> H5MDFrames:
+        return H5MDFrames(self.state.fs, self.frames_path)
 
-    @property
+    @cached_output
     def figures(self) -> dict[str, go.Figure]:
         plots = {}
         for key in self.plots.columns:
@@ -143,10 +470,10 @@ class MolecularDynamics(zntrack.Node):
         offset = 0
         fig = go.Figure()
         for _, node in enumerate(nodes):
-            energies = [atoms.get_potential_energy() for atoms in node.frames]
+            energies = get_columns(node.frames, ["energy"])["energy"]
             fig.add_trace(
                 go.Scatter(
-                    x=list(range(len(energies))),
+                    x=np.arange(len(energies)) * node.write_interval,
                     y=energies,
                     mode="lines+markers",
                     name=node.name.replace(f"_{node.__class__.__name__}", ""),
@@ -183,11 +510,11 @@ class MolecularDynamics(zntrack.Node):
         offset = 0
         fig_adjusted = go.Figure()
         for _, node in enumerate(nodes):
-            energies = np.array([atoms.get_potential_energy() for atoms in node.frames])
-            energies -= energies[0]
+            energies = get_columns(node.frames, ["energy"])["energy"]
+            energies = energies - energies[0]
             fig_adjusted.add_trace(
                 go.Scatter(
-                    x=list(range(len(energies))),
+                    x=np.arange(len(energies)) * node.write_interval,
                     y=energies,
                     mode="lines+markers",
                     name=node.name.replace(f"_{node.__class__.__name__}", ""),
@@ -223,3 +550,260 @@ class MolecularDynamics(zntrack.Node):
             frames=frames,
             figures={"energy_vs_steps": fig, "energy_vs_steps_adjusted": fig_adjusted},
         )
+
+
+class MolecularDynamicsEnsemble(zntrack.Node):
+    """Run an ensemble of molecular dynamics simulations in lockstep.
+
+    All replicas share a single model and are propagated together with
+    a `BatchedLangevin` integrator, which evaluates the forces of all replicas
+    in a single batch per step. Each replica starts from `data[data_ids[i]]`
+    with the random seed `seeds[i]`.
+
+    Parameters
+    ----------
+    model : NodeWithCalculator
+        Node providing the calculator object for the simulation.
+        If the model provides `get_batch_calculator`, the replicas
+        are evaluated in batches, otherwise one after another.
+    thermostat : LangevinConfig
+        Thermostat of all replicas.
+    data : list[ase.Atoms]
+        Initial configurations for the simulation.
+    data_ids : list[int], default=[-1]
+        Index of the initial configuration of each replica.
+        A single index is used for all replicas.
+    seeds : list[int], optional
+        Random seed of each replica. Defaults to the replica index.
+    steps : int, default=100
+        Number of steps to run the simulation.
+    write_interval : int, default=1
+        Store every `write_interval`-th step in the trajectories.
+    flush_interval : int, default=100
+        Number of stored frames per replica kept in memory before they are written.
+    n_workers : int, default=1
+        Number of worker processes evaluating the replicas.
+        Each worker loads its own calculator.
+    n_threads : int, optional
+        Number of threads per worker if `n_workers > 1`.
+        Defaults to the number of CPUs divided by `n_workers`.
+    observers : list[DynamicsObserver], optional
+        Observers are checked for each replica separately.
+        A replica is stopped as soon as one of its observers is triggered.
+    modifiers : list[DynamicsModifier], optional
+        Modifiers of the thermostat, which is shared by all replicas.
+        They are called once per step with the step index only, so modifiers
+        which override `modify_step` to use the state of a replica are rejected.
+
+    Attributes
+    ----------
+    trajectories : list[list[ase.Atoms]]
+        Trajectory of each replica with energies, forces and velocities.
+        The frames are loaded on access.
+    frames : list[ase.Atoms]
+        Trajectories of all replicas, one after another.
+        The frames are loaded on access.
+    plots : pd.DataFrame
+        Energy, fmax, fnorm, temperature and wall time of each replica and step.
+    metrics : dict
+        Number of replicas and the aggregated throughput in replica steps/s.
+    """
+
+    model: NodeWithCalculator = zntrack.deps()
+    thermostat: LangevinConfig = zntrack.deps()
+    data: list[ase.Atoms] = zntrack.deps()
+    data_ids: list[int] = zntrack.params(default_factory=lambda: [-1])
+    seeds: list[int] | None = zntrack.params(None)
+    steps: int = zntrack.params(100)
+    write_interval: int = zntrack.params(1)
+    flush_interval: int = zntrack.params(100)
+    n_workers: int = zntrack.params(1)
+    n_threads: int | None = zntrack.params(None)
+    observers: list[DynamicsObserver] = zntrack.deps(None)
+    modifiers: list[DynamicsModifier] = zntrack.deps(None)
+
+    observer_metrics: dict = zntrack.metrics()
+    metrics: dict = zntrack.metrics()
+    plots: pd.DataFrame = zntrack.plots(x="step", y=["energy", "fmax"], autosave=True)
+
+    trajectories_path: pathlib.Path = zntrack.outs_path(zntrack.nwd / "trajectories")
+
+    def get_replicas(self) -> list[tuple[int, int]]:
+        """The data id and seed of each replica."""
+        data_ids = list(self.data_ids)
+        seeds = list(self.seeds) if self.seeds is not None else None
+        n_replicas = max(len(data_ids), len(seeds or []))
+        if len(data_ids) == 1:
+            data_ids = data_ids * n_replicas
+        if seeds is None:
+            seeds = list(range(n_replicas))
+        if len(data_ids) != len(seeds):
+            raise ValueError(
+                f"Got {len(data_ids)} data ids for {len(seeds)} seeds,"
+                " provide either one data id or one per seed."
+            )
+        return list(zip(data_ids, seeds))
+
+    def _get_trajectory_path(self, replica: int) -> pathlib.Path:
+        return self.trajectories_path / f"{replica}.h5"
+
+    def _check_modifiers(self) -> None:
+        """Reject modifiers which use the state of a single replica."""
+        for mod in self.modifiers or []:
+            if type(mod).modify_step is not DynamicsModifier.modify_step:
+                raise ValueError(
+                    f"'{mod.name}' depends on the state of a replica"
+                    " and can not modify the thermostat shared by all replicas."
+                )
+
+    def run(self):
+        self._check_modifiers()
+        replicas = self.get_replicas()
+        frames = [self.data[data_id].copy() for data_id, _ in replicas]
+        # observers can have a state, e.g. set in `initialize`
+        observers = [copy.deepcopy(self.observers or []) for _ in replicas]
+        for atoms, replica_observers in zip(frames, observers):
+            for obs in replica_observers:
+                obs.initialize(atoms)
+        self.observer_metrics = {}
+        observables = ObservableBuffer(
+            ["replica", "step", "energy", "fmax", "fnorm", "temperature", "step_time"]
+        )
+
+        shutil.rmtree(self.trajectories_path, ignore_errors=True)
+        self.trajectories_path.mkdir(parents=True)
+        with contextlib.ExitStack() as stack:
+            if self.n_workers > 1:
+                calc = stack.enter_context(
+                    ProcessPoolBatchCalculator(
+                        self.model, n_workers=self.n_workers, n_threads=self.n_threads
+                    )
+                )
+            else:
+                calc = get_batch_calculator(self.model)
+            dyn = self.thermostat.get_batched_molecular_dynamics(
+                frames, calc, [seed for _, seed in replicas]
+            )
+            writers = [
+                stack.enter_context(
+                    BufferedH5MDWriter(
+                        self._get_trajectory_path(replica), self.flush_interval
+                    )
+                )
+                for replica in range(len(replicas))
+            ]
+
+            n_replica_steps = 0
+            run_start = step_start = time.perf_counter()
+            for idx, _ in enumerate(
+                tqdm.tqdm(dyn.irun(steps=self.steps), total=self.steps)
+            ):
+                step_time = time.perf_counter() - step_start
+                n_replica_steps += len(dyn.active)
+                stopped = []
+                for replica in dyn.active:
+                    step = DynamicsStep(idx, frames[replica])
+                    if idx % self.write_interval == 0:
+                        results = {"energy": step.energy, "forces": step.forces}
+                        writers[replica].append(atoms_with_results(step.atoms, results))
+                    observables.append(
+                        {
+                            "replica": replica,
+                            "step": idx,
+                            "energy": step.energy,
+                            "fmax": step.fmax,
+                            "fnorm": step.fnorm,
+                            "temperature": step.temperature,
+                            "step_time": step_time,
+                        }
+                    )
+                    if self._check_observers(replica, observers[replica], step):
+                        stopped.append(replica)
+
+                dyn.stop(stopped)
+                if dyn.active:
+                    for mod in self.modifiers or []:
+                        mod.modify(dyn, idx)
+                step_start = time.perf_counter()
+            run_time = time.perf_counter() - run_start
+
+        plots = observables.to_dataframe()
+        self.plots = plots.astype({"replica": int, "step": int})
+        self.metrics = {
+            "n_replicas": len(replicas),
+            "replica_steps_per_second": n_replica_steps / run_time,
+        }
+
+    def _check_observers(
+        self, replica: int, observers: list[DynamicsObserver], step: DynamicsStep
+    ) -> bool:
+        """Record the observers of a replica and whether one was triggered."""
+        metrics = self.observer_metrics.setdefault(f"replica_{replica}", {})
+        for obs in observers:
+            # document all attached observers
+            metrics.setdefault(obs.name, -1)
+            if step.step % obs.interval == 0 and obs.check_step(step):
+                metrics[obs.name] = step.step
+        return any(value >= 0 for value in metrics.values())
+
+    @cached_output
+    def trajectories(self) -> list[H5MDFrames]:
+        return [
+            H5MDFrames(self.state.fs, self._get_trajectory_path(replica))
+            for replica in range(len(self.get_replicas()))
+        ]
+
+    @cached_output
+    def frames(self) -> ChainedFrames:
+        return ChainedFrames(self.trajectories)
+
+    @cached_output
+    def figures(self) -> dict[str, go.Figure]:
+        plots = {}
+        for key in self.plots.columns.drop(["replica", "step"]):
+            fig = px.line(self.plots, x="step", y=key, color="replica", title=key)
+            plots[key] = fig
+        return plots
+
+    @staticmethod
+    def compare(*nodes: "MolecularDynamicsEnsemble") -> ComparisonResults:
+        frames = sum([node.frames for node in nodes], [])
+        offset = 0
+        fig = go.Figure()
+        for node in nodes:
+            name = node.name.replace(f"_{node.__class__.__name__}", "")
+            for replica, trajectory in enumerate(node.trajectories):
+                energies = get_columns(trajectory, ["energy"])["energy"]
+                fig.add_trace(
+                    go.Scatter(
+                        x=np.arange(len(energies)) * node.write_interval,
+                        y=energies,
+                        mode="lines+markers",
+                        name=f"{name} ({replica})",
+                        customdata=np.stack(
+                            [np.arange(len(energies)) + offset], axis=1
+                        ),
+                    )
+                )
+                offset += len(energies)
+
+        fig.update_layout(
+            title="Energy vs. step",
+            xaxis_title="Step",
+            yaxis_title="Energy / eV",
+            plot_bgcolor="rgba(0, 0, 0, 0)",
+            paper_bgcolor="rgba(0, 0, 0, 0)",
+        )
+        fig.update_xaxes(
+            showgrid=True,
+            gridwidth=1,
+            gridcolor="rgba(120, 120, 120, 0.3)",
+            zeroline=False,
+        )
+        fig.update_yaxes(
+            showgrid=True,
+            gridwidth=1,
+            gridcolor="rgba(120, 120, 120, 0.3)",
+            zeroline=False,
+        )
+        return ComparisonResults(frames=frames, figures={"energy_vs_steps": fig})
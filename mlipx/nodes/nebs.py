@@ -1,4 +1,6 @@
+import os
 import pathlib
+import warnings
 from copy import copy
 
 import ase.io
@@ -11,6 +13,17 @@ import zntrack
 from ase.mep import NEB
 
 from mlipx.abc import ComparisonResults, NodeWithCalculator, Optimizer
+from mlipx.checkpoint import (
+    get_atoms_state,
+    get_dynamics_state,
+    get_fingerprint,
+    read_checkpoint,
+    set_atoms_state,
+    set_dynamics_state,
+    truncate_trajectory,
+    write_checkpoint,
+)
+from mlipx.memoize import cached_output
 
 
 class NEBinterpolate(zntrack.Node):
@@ -69,7 +82,7 @@ class NEBinterpolate(zntrack.Node):
         neb.interpolate(mic=self.mic, apply_constraint=self.add_constraints)
         ase.io.write(self.frames_path, frames)
 
-    @property
+    @cached_output
     def frames(self) -> list[ase.Atoms]:
         with self.state.fs.open(self.frames_path, "r") as f:
             return list(ase.io.iread(f, format="extxyz"))
@@ -93,6 +106,12 @@ class NEBs(zntrack.Node):
         Maximum force allowed.
     n_steps : int
         Maximum number of steps allowed.
+    checkpoint_interval : int, default=100
+        Number of steps between checkpoints.
+    resume : bool, default=True
+        Continue an interrupted NEB optimization from the last checkpoint.
+        The checkpoint holds the positions of all images
+        and the optimizer memory.
     frames_path : pathlib.Path
         Path to save the final frames.
     trajectory_path : pathlib.Path
@@ -111,30 +130,95 @@ class NEBs(zntrack.Node):
     optimizer: Optimizer = zntrack.params(Optimizer.FIRE.value)
     fmax: float = zntrack.params(0.09)
     n_steps: int = zntrack.params(500)
+    checkpoint_interval: int = zntrack.params(100)
+    resume: bool = zntrack.params(True)
     frames_path: pathlib.Path = zntrack.outs_path(zntrack.nwd / "frames.xyz")
     trajectory_path: pathlib.Path = zntrack.outs_path(
         zntrack.nwd / "neb_trajectory.traj"
     )
     results: pd.DataFrame = zntrack.plots(y="potential_energy", x="data_id")
 
+    @property
+    def checkpoint_path(self) -> pathlib.Path:
+        return self.nwd / "checkpoint.pkl"
+
+    @property
+    def partial_path(self) -> pathlib.Path:
+        return self.nwd / "neb_trajectory.partial.traj"
+
+    def _read_checkpoint(self, fingerprint: str, n_images: int) -> dict | None:
+        checkpoint = read_checkpoint(self.checkpoint_path, fingerprint)
+        if checkpoint is None:
+            return None
+        # the trajectory holds all images of the initial and each completed step
+        n_frames = (checkpoint["dynamics"]["nsteps"] + 1) * n_images
+        if truncate_trajectory(self.partial_path, n_frames):
+            return checkpoint
+        warnings.warn(f"Can not resume from '{self.partial_path}'.")
+        return None
+
+    def _write_checkpoint(self, fingerprint: str, frames: list[ase.Atoms], dyn):
+        if dyn.nsteps > 0:
+            write_checkpoint(
+                self.checkpoint_path,
+                {
+                    "fingerprint": fingerprint,
+                    "images": [get_atoms_state(image) for image in frames],
+                    "dynamics": get_dynamics_state(dyn),
+                },
+            )
+
     def run(self):
         frames = []
         # neb_trajectory = []
         calc = self.model.get_calculator()
         optimizer = getattr(ase.optimize, self.optimizer)
+        fingerprint = get_fingerprint(
+            list(self.data),
+            self.model,
+            self.relax,
+            self.optimizer,
+            self.fmax,
+            self.n_steps,
+        )
         for atoms in self.data:
             atoms_copy = atoms.copy()
             atoms_copy.calc = copy(calc)
             atoms_copy.get_potential_energy()
             frames += [atoms_copy]
             ase.io.write(self.frames_path, atoms_copy, format="extxyz", append=True)
-        if self.relax is True:
+
+        checkpoint = None
+        if self.resume:
+            checkpoint = self._read_checkpoint(fingerprint, len(frames))
+        if checkpoint is not None:
+            # the end points have been relaxed before the checkpoint
+            for image, state in zip(frames, checkpoint["images"]):
+                set_atoms_state(image, state)
+        elif self.relax is True:
             for i in [0, -1]:
                 dyn = optimizer(frames[0])
                 dyn.run(fmax=self.fmax)
         neb = NEB(frames, allow_shared_calculator=False)
-        dyn = optimizer(neb, trajectory=self.trajectory_path.as_posix())
-        dyn.run(fmax=self.fmax, steps=self.n_steps)
+        dyn = optimizer(
+            neb,
+            trajectory=self.partial_path.as_posix(),
+            append_trajectory=checkpoint is not None,
+        )
+        if checkpoint is not None:
+            set_dynamics_state(dyn, checkpoint["dynamics"])
+            print(f"Resuming '{self.name}' from step {dyn.nsteps}")
+        if self.resume:
+            dyn.attach(
+                self._write_checkpoint,
+                self.checkpoint_interval,
+                fingerprint,
+                frames,
+                dyn,
+            )
+        dyn.run(fmax=self.fmax, steps=self.n_steps - dyn.nsteps)
+        os.replace(self.partial_path, self.trajectory_path)
+        self.checkpoint_path.unlink(missing_ok=True)
 
         row_dicts = []
         for i, frame in enumerate(frames):
@@ -148,24 +232,24 @@ class NEBs(zntrack.Node):
             )
         self.results = pd.DataFrame(row_dicts)
 
-    @property
+    @cached_output
     def trajectory_frames(self) -> list[ase.Atoms]:
         with self.state.fs.open(self.trajectory_path, "rb") as f:
             return list(ase.io.iread(f, format="traj"))
 
-    @property
+    @cached_output
     def frames(self) -> list[ase.Atoms]:
         with self.state.fs.open(self.frames_path, "r") as f:
             return list(ase.io.iread(f, format="extxyz"))
 
-    @property
+    @cached_output
     def figures(self) -> dict[str, go.Figure]:
         fig = px.scatter(self.results, x="data_id", y="potential_energy")
         fig.update_layout(title="NEB_path")
         fig.update_traces(customdata=np.stack([np.arange(len(self.results))], axis=1))
         return {"NEB_path": fig}
 
-    @property
+    @cached_output
     def traj_plots(self) -> dict[str, go.Figure]:
         trajectory_frames = self.trajectory_frames
         total_iterations = len(trajectory_frames) // len(self.frames)
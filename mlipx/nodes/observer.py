@@ -4,7 +4,7 @@ import warnings
 import ase
 import numpy as np
 
-from mlipx.abc import DynamicsObserver
+from mlipx.abc import DynamicsObserver, DynamicsStep
 
 
 @dataclasses.dataclass
@@ -15,6 +15,8 @@ class MaximumForceObserver(DynamicsObserver):
     ----------
     f_max : float
         Maximum allowed force norm on a single atom
+    interval : int, default=1
+        Only check every `interval`-th step.
 
 
     Example
@@ -42,7 +44,12 @@ class MaximumForceObserver(DynamicsObserver):
             Atoms object to evaluate
         """
 
-        max_force = np.linalg.norm(atoms.get_forces(), axis=1).max()
+        return self._check_fmax(np.linalg.norm(atoms.get_forces(), axis=1).max())
+
+    def check_step(self, step: DynamicsStep) -> bool:
+        return self._check_fmax(step.fmax)
+
+    def _check_fmax(self, max_force: float) -> bool:
         if max_force > self.f_max:
             warnings.warn(f"Maximum force {max_force} exceeds {self.f_max}")
             return True
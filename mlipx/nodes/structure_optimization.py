@@ -1,15 +1,250 @@
+import contextlib
+import hashlib
+import os
 import pathlib
+import shutil
+import time
+import typing as t
 import warnings
 
+import ase.filters
 import ase.io
 import ase.optimize as opt
+import h5py
 import numpy as np
 import pandas as pd
+import plotly.express as px
 import plotly.graph_objects as go
+import tqdm
+import znh5md
 import zntrack
+from ase.calculators.calculator import Calculator, all_changes
+from ase.optimize.precon import PreconFIRE, PreconLBFGS, make_precon
 
-from mlipx.abc import ComparisonResults, NodeWithCalculator, Optimizer
+from mlipx.abc import (
+    BatchCalculator,
+    CellFilter,
+    ComparisonResults,
+    DynamicsStep,
+    NodeWithCalculator,
+    Optimizer,
+)
+from mlipx.batching import AtomBudgetScheduler, calculate_frames, get_batch_calculator
+from mlipx.checkpoint import (
+    get_atoms_state,
+    get_dynamics_state,
+    get_fingerprint,
+    read_checkpoint,
+    set_atoms_state,
+    set_dynamics_state,
+    truncate_trajectory,
+    write_checkpoint,
+)
+from mlipx.columnar import get_columns
+from mlipx.frames import BufferedH5MDWriter, H5MDFrames
+from mlipx.memoize import cached_output
+from mlipx.nodes.molecular_dynamics import ObservableBuffer
 from mlipx.spec import compare_specs
+from mlipx.utils import atoms_with_results, calculate_properties
+
+PRECON_OPTIMIZERS = {"PreconLBFGS": PreconLBFGS, "PreconFIRE": PreconFIRE}
+
+
+def get_optimizer_class(optimizer: str) -> type[opt.optimize.Optimizer]:
+    """ASE optimizer class for a name of the `Optimizer` enum."""
+    if optimizer in PRECON_OPTIMIZERS:
+        return PRECON_OPTIMIZERS[optimizer]
+    return getattr(opt, optimizer)
+
+
+def get_inverse_hessian(dyn: opt.optimize.Optimizer) -> np.ndarray | None:
+    """Dense estimate of the inverse Hessian learned by a quasi-Newton optimizer.
+
+    For the L-BFGS optimizers, the BFGS updates of the stored history are
+    applied to the initial inverse Hessian, which is the preconditioner
+    for `PreconLBFGS`. Returns None for optimizers without a Hessian, e.g. FIRE.
+    """
+    if isinstance(dyn, opt.BFGS):
+        return np.linalg.inv(dyn.H if dyn.state is not None else dyn.H0)
+    if isinstance(dyn, opt.LBFGS):
+        initial = dyn.state.H0
+        inverse_hessian = (
+            initial.toarray() if hasattr(initial, "toarray") else np.array(initial)
+        )
+        history = zip(dyn.state.s, dyn.state.y, dyn.state.rho)
+    elif isinstance(dyn, PreconLBFGS):
+        if dyn.precon is not None:
+            dyn.precon.make_precon(dyn._actual_atoms)
+            inverse_hessian = np.linalg.inv(dyn.precon.asarray())
+        elif dyn.Hinv is not None:
+            inverse_hessian = np.array(dyn.Hinv)
+        else:
+            inverse_hessian = np.eye(dyn.optimizable.ndofs()) * dyn.H0
+        history = zip(dyn.s, dyn.y, dyn.rho)
+    else:
+        return None
+    for s, y, rho in history:
+        hy = inverse_hessian @ y
+        inverse_hessian += (rho + rho**2 * (y @ hy)) * np.outer(s, s) - rho * (
+            np.outer(hy, s) + np.outer(s, hy)
+        )
+    return inverse_hessian
+
+
+class CountingCalculator(Calculator):
+    """Wrap an ASE calculator and count the force calls.
+
+    Energy and forces are always computed together,
+    so each calculation is one force call.
+    """
+
+    def __init__(self, calc: Calculator, **kwargs):
+        Calculator.__init__(self, **kwargs)
+        self.calc = calc
+        self.implemented_properties = list(calc.implemented_properties)
+        self.n_calls = 0
+
+    def calculate(
+        self,
+        atoms: ase.Atoms | None = None,
+        properties: list[str] | None = None,
+        system_changes=all_changes,
+    ):
+        properties = sorted({"energy", "forces", *(properties or [])})
+        Calculator.calculate(self, atoms, properties, system_changes)
+        self.n_calls += 1
+        self.results = calculate_properties(self.atoms, self.calc, properties)
+
+
+class BatchedOptimizer:
+    """Relax independent structures together.
+
+    Each structure keeps its own ASE optimizer, but the forces of all
+    structures that are not converged yet are evaluated with a single
+    `calculate_batch` call per step. Structures are dropped from the
+    active set once they are converged or reached the maximum number of steps.
+
+    Parameters
+    ----------
+    frames : list[ase.Atoms]
+        Structures to relax, which are updated in place.
+    calc : BatchCalculator
+        Calculator to evaluate the energies and forces.
+    optimizer : type[ase.optimize.optimize.Optimizer]
+        ASE optimizer class, e.g. `ase.optimize.FIRE`.
+    fmax : float
+        Maximum force to reach before a structure is converged.
+    steps : int
+        Maximum number of steps for each structure.
+
+    Attributes
+    ----------
+    active : list[int]
+        Indices of the structures that are still relaxed.
+    converged : list[bool]
+        Whether each structure reached `fmax`.
+    n_force_calls : int
+        Total number of evaluated structures.
+    """
+
+    def __init__(
+        self,
+        frames: list[ase.Atoms],
+        calc: BatchCalculator,
+        optimizer: type[opt.optimize.Optimizer],
+        fmax: float,
+        steps: int,
+    ):
+        if issubclass(optimizer, tuple(PRECON_OPTIMIZERS.values())):
+            raise ValueError(
+                "Preconditioned optimizers evaluate line searches"
+                " and can not be batched."
+            )
+        self.frames = frames
+        self.calc = calc
+        self.steps = steps
+        self.optimizers = [optimizer(atoms, logfile=None) for atoms in frames]
+        for dyn in self.optimizers:
+            dyn.fmax = fmax
+        self.active = list(range(len(frames)))
+        self.converged = [False] * len(frames)
+        self.n_force_calls = 0
+
+    def irun(self) -> t.Iterator[list[int]]:
+        """Evaluate the active structures and yield their indices before each step.
+
+        The results of each evaluated structure are attached to its atoms.
+        """
+        while self.active:
+            calculate_frames(
+                self.calc,
+                [self.frames[idx] for idx in self.active],
+                ["energy", "forces"],
+            )
+            self.n_force_calls += len(self.active)
+            yield list(self.active)
+
+            active = []
+            for idx in self.active:
+                dyn = self.optimizers[idx]
+                # the optimizers read the forces from the attached results
+                self.converged[idx] = bool(
+                    dyn.gradient_converged(dyn.optimizable.get_gradient())
+                )
+                if not self.converged[idx] and dyn.nsteps < self.steps:
+                    dyn.step()
+                    dyn.nsteps += 1
+                    active.append(idx)
+            self.active = active
+
+
+def record_batched_optimization(
+    dyn: BatchedOptimizer,
+    structures: list[int],
+    trajectory_paths: list[pathlib.Path],
+    observables: ObservableBuffer,
+    flush_interval: int = 100,
+    **columns: float,
+) -> None:
+    """Run `dyn` and record the trajectory, energy and fmax of each structure.
+
+    Parameters
+    ----------
+    dyn : BatchedOptimizer
+        Optimizer to run.
+    structures : list[int]
+        Id of each structure in `dyn`, stored in the 'structure' column.
+    trajectory_paths : list[pathlib.Path]
+        H5MD file for the trajectory of each structure.
+    observables : ObservableBuffer
+        Buffer with the columns 'structure', 'step', 'energy', 'fmax'
+        and the keys of `columns`.
+    flush_interval : int, default=100
+        Number of frames per trajectory kept in memory before they are written.
+    **columns : float
+        Constant values added to each row, e.g. the stage of a cascade.
+    """
+    with contextlib.ExitStack() as stack:
+        writers = [
+            stack.enter_context(BufferedH5MDWriter(path, flush_interval))
+            for path in trajectory_paths
+        ]
+        with tqdm.tqdm(total=len(structures), desc="converged") as pbar:
+            for active in dyn.irun():
+                for idx in active:
+                    step = DynamicsStep(dyn.optimizers[idx].nsteps, dyn.frames[idx])
+                    results = {"energy": step.energy, "forces": step.forces}
+                    writers[idx].append(atoms_with_results(step.atoms, results))
+                    observables.append(
+                        {
+                            **columns,
+                            "structure": structures[idx],
+                            "step": step.step,
+                            "energy": step.energy,
+                            "fmax": step.fmax,
+                        }
+                    )
+                pbar.update(len(structures) - len(active) - pbar.n)
 
 
 class StructureOptimization(zntrack.Node):
@@ -24,15 +259,40 @@ class StructureOptimization(zntrack.Node):
     data_id: int, default=-1
         The index of the ase.Atoms in `data` to optimize.
     optimizer : Optimizer
-        Optimizer to use.
+        Optimizer to use. `PreconLBFGS` and `PreconFIRE` need considerably
+        fewer force calls for large condensed phase structures.
     model : NodeWithCalculator
         Model to use.
     fmax : float
         Maximum force to reach before stopping.
     steps : int
         Maximum number of steps for each optimization.
+    precon : str, optional
+        Preconditioner of `PreconLBFGS` and `PreconFIRE`, e.g. 'Exp', 'C1', 'FF'
+        or 'ID'. Defaults to the choice of the optimizer, which is 'Exp' for
+        `PreconLBFGS` with at least 100 atoms and none for `PreconFIRE`.
+    cell_filter : CellFilter, optional
+        Relax the cell together with the positions, e.g. 'FrechetCellFilter'.
+    warm_start : StructureOptimization, optional
+        Earlier relaxation of a similar structure with the same number of atoms
+        and `save_inverse_hessian=True`. Its inverse Hessian is the initial
+        inverse Hessian of `BFGS`, `LBFGS` and `PreconLBFGS`. For `PreconLBFGS`,
+        it replaces the preconditioner.
+    save_inverse_hessian : bool, default=False
+        Store the final inverse Hessian estimate of the quasi-Newton optimizers
+        for a `warm_start`. The size of the stored matrix grows with the
+        square of the number of atoms.
+    checkpoint_interval : int, default=100
+        Number of steps between checkpoints.
+    resume : bool, default=True
+        Continue an interrupted optimization from the last checkpoint.
+        The checkpoint holds the positions and the optimizer memory,
+        e.g. the L-BFGS history.
     plots : pd.DataFrame
         Resulting energy and fmax for each step.
+    metrics : dict
+        Number of steps, number of force calls including line searches
+        and whether the optimization converged.
     trajectory_path : str
         Output directory for the optimization trajectories.
 
@@ -44,15 +304,126 @@ class StructureOptimization(zntrack.Node):
     model: NodeWithCalculator = zntrack.deps()
     fmax: float = zntrack.params(0.05)
     steps: int = zntrack.params(100_000_000)
+    precon: str | None = zntrack.params(None)
+    cell_filter: CellFilter | None = zntrack.params(None)
+    warm_start: t.Optional["StructureOptimization"] = zntrack.deps(None)
+    save_inverse_hessian: bool = zntrack.params(False)
+    checkpoint_interval: int = zntrack.params(100)
+    resume: bool = zntrack.params(True)
     plots: pd.DataFrame = zntrack.plots(y=["energy", "fmax"], x="step")
+    metrics: dict = zntrack.metrics()
 
     frames_path: pathlib.Path = zntrack.outs_path(zntrack.nwd / "frames.traj")
+    inverse_hessian_path: pathlib.Path = zntrack.outs_path(
+        zntrack.nwd / "inverse_hessian.npy"
+    )
+
+    @property
+    def checkpoint_path(self) -> pathlib.Path:
+        return self.nwd / "checkpoint.pkl"
+
+    @property
+    def partial_path(self) -> pathlib.Path:
+        return self.nwd / "frames.partial.traj"
+
+    def _read_checkpoint(self, fingerprint: str) -> dict | None:
+        checkpoint = read_checkpoint(self.checkpoint_path, fingerprint)
+        if checkpoint is None or truncate_trajectory(
+            self.partial_path, len(checkpoint["energies"])
+        ):
+            return checkpoint
+        warnings.warn(f"Can not resume from '{self.partial_path}'.")
+        return None
+
+    def _write_checkpoint(
+        self,
+        fingerprint: str,
+        atoms: ase.Atoms,
+        dyn,
+        calc: CountingCalculator,
+        plots: dict,
+    ):
+        if dyn.nsteps > 0:
+            write_checkpoint(
+                self.checkpoint_path,
+                {
+                    "fingerprint": fingerprint,
+                    "atoms": get_atoms_state(atoms),
+                    "dynamics": get_dynamics_state(dyn),
+                    "n_force_calls": calc.n_calls,
+                    **plots,
+                },
+            )
+
+    @property
+    def inverse_hessian(self) -> np.ndarray | None:
+        """Final inverse Hessian estimate, if `save_inverse_hessian` was set."""
+        with self.state.fs.open(self.inverse_hessian_path, "rb") as f:
+            inverse_hessian = np.load(f)
+        return inverse_hessian if inverse_hessian.size > 0 else None
+
+    def _get_optimizer(self, atoms: ase.Atoms, append_trajectory: bool):
+        """Create the optimizer, including the cell filter and preconditioner."""
+        optimizer = get_optimizer_class(self.optimizer)
+        kwargs = {}
+        if self.precon is not None:
+            if self.optimizer not in PRECON_OPTIMIZERS:
+                raise ValueError(f"'{self.optimizer}' does not use a preconditioner.")
+            kwargs["precon"] = make_precon(self.precon)
+        if self.save_inverse_hessian and optimizer in (opt.FIRE, PreconFIRE):
+            raise ValueError(f"'{self.optimizer}' does not estimate a Hessian.")
+        if self.cell_filter is not None:
+            atoms = getattr(ase.filters, self.cell_filter)(atoms)
+        return optimizer(
+            atoms,
+            trajectory=self.partial_path.as_posix(),
+            append_trajectory=append_trajectory,
+            **kwargs,
+        )
+
+    def _warm_start(self, dyn, inverse_hessian: np.ndarray) -> None:
+        ndofs = dyn.optimizable.ndofs()
+        if inverse_hessian.shape != (ndofs, ndofs):
+            raise ValueError(
+                f"The inverse Hessian of '{self.warm_start.name}' has the shape"
+                f" {inverse_hessian.shape}, expected {(ndofs, ndofs)}. The warm"
+                " start needs the same number of atoms and the same cell filter."
+            )
+        if isinstance(dyn, opt.BFGS):
+            dyn.H0 = np.linalg.inv(inverse_hessian)
+        elif isinstance(dyn, opt.LBFGS):
+            dyn.state.H0 = inverse_hessian
+        elif isinstance(dyn, PreconLBFGS):
+            # the preconditioner takes precedence over `Hinv`
+            dyn.precon = None
+            dyn.Hinv = inverse_hessian
+        else:
+            raise ValueError(f"Can not warm start '{self.optimizer}'.")
 
     def run(self):
-        optimizer = getattr(opt, self.optimizer)
-        calc = self.model.get_calculator()
+        calc = CountingCalculator(self.model.get_calculator())
 
         atoms = self.data[self.data_id]
+        inverse_hessian = None
+        if self.warm_start is not None:
+            inverse_hessian = self.warm_start.inverse_hessian
+            if inverse_hessian is None:
+                raise ValueError(
+                    f"'{self.warm_start.name}' did not save an inverse Hessian,"
+                    " set `save_inverse_hessian=True`."
+                )
+        fingerprint = get_fingerprint(
+            [atoms],
+            self.model,
+            self.optimizer,
+            self.fmax,
+            self.steps,
+            self.precon,
+            self.cell_filter,
+            None
+            if inverse_hessian is None
+            else hashlib.sha256(inverse_hessian.tobytes()).hexdigest(),
+        )
         self.frames_path.parent.mkdir(exist_ok=True)
 
         energies = []
@@ -62,23 +433,55 @@ class StructureOptimization(zntrack.Node):
             energies.append(atoms.get_potential_energy())
             fmax.append(np.linalg.norm(atoms.get_forces(), axis=-1).max())
 
+        checkpoint = self._read_checkpoint(fingerprint) if self.resume else None
+        if checkpoint is None:
+            self.partial_path.unlink(missing_ok=True)
+
         atoms.calc = calc
-        dyn = optimizer(
-            atoms,
-            trajectory=self.frames_path.as_posix(),
-        )
+        # cell filters store the initial cell, so they are created before resuming
+        dyn = self._get_optimizer(atoms, append_trajectory=checkpoint is not None)
+        if inverse_hessian is not None:
+            self._warm_start(dyn, inverse_hessian)
+        if checkpoint is not None:
+            set_atoms_state(atoms, checkpoint["atoms"])
+            energies, fmax = checkpoint["energies"], checkpoint["fmax"]
+            set_dynamics_state(dyn, checkpoint["dynamics"])
+            # the checkpointed positions were evaluated, but are evaluated again
+            calc.n_calls = checkpoint["n_force_calls"] - 1
+            print(f"Resuming '{self.name}' from step {dyn.nsteps}")
         dyn.attach(metrics_callback)
-        dyn.run(fmax=self.fmax, steps=self.steps)
+        if self.resume:
+            dyn.attach(
+                self._write_checkpoint,
+                self.checkpoint_interval,
+                fingerprint,
+                atoms,
+                dyn,
+                calc,
+                {"energies": energies, "fmax": fmax},
+            )
+        converged = dyn.run(fmax=self.fmax, steps=self.steps - dyn.nsteps)
+        os.replace(self.partial_path, self.frames_path)
+        self.checkpoint_path.unlink(missing_ok=True)
 
+        np.save(
+            self.inverse_hessian_path,
+            get_inverse_hessian(dyn) if self.save_inverse_hessian else np.zeros((0, 0)),
+        )
         self.plots = pd.DataFrame({"energy": energies, "fmax": fmax})
         self.plots.index.name = "step"
+        self.metrics = {
+            "n_steps": dyn.nsteps,
+            "n_force_calls": calc.n_calls,
+            "converged": bool(converged),
+        }
 
-    @property
+    @cached_output
     def frames(self) -> list[ase.Atoms]:
         with self.state.fs.open(self.frames_path, "rb") as f:
             return list(ase.io.iread(f, format="traj"))
 
-    @property
+    @cached_output
     def figures(self) -> dict[str, go.Figure]:
         figure = go.Figure()
 
@@ -211,3 +614,396 @@ class StructureOptimization(zntrack.Node):
             frames=frames,
             figures={"energy_vs_steps": fig, "adjusted_energy_vs_steps": fig_adjusted},
         )
+
+
+class BatchedStructureOptimization(zntrack.Node):
+    """Relax many structures with a single model.
+
+    The structures are relaxed together with a `BatchedOptimizer`,
+    which evaluates the forces of all unconverged structures in one batch
+    per step. Each structure follows the same path as in `StructureOptimization`.
+
+    Parameters
+    ----------
+    data : list[ase.Atoms]
+        Atoms to relax.
+    data_ids : list[int], optional
+        Indices of the ase.Atoms in `data` to optimize. Defaults to all.
+    optimizer : Optimizer
+        Optimizer to use.
+    model : NodeWithCalculator
+        Model to use. If the model provides `get_batch_calculator`,
+        the structures are evaluated in batches, otherwise one after another.
+    fmax : float
+        Maximum force to reach before stopping.
+    steps : int
+        Maximum number of steps for each optimization.
+    max_atoms_per_batch : int, optional
+        Split the evaluation of each step into batches with up to this many atoms.
+        If a batch runs out of memory, the limit is halved and the batch retried.
+    flush_interval : int, default=100
+        Number of frames per trajectory kept in memory before they are written.
+
+    Attributes
+    ----------
+    frames : list[ase.Atoms]
+        Final structure of each optimization with energy and forces.
+    trajectories : list[list[ase.Atoms]]
+        Trajectory of each optimization. The frames are loaded on access.
+    plots : pd.DataFrame
+        Energy and fmax of each structure and step.
+    metrics : dict
+        Number of structures, converged structures and evaluated structures.
+    """
+
+    data: list[ase.Atoms] = zntrack.deps()
+    data_ids: list[int] | None = zntrack.params(None)
+    optimizer: Optimizer = zntrack.params(Optimizer.LBFGS.value)
+    model: NodeWithCalculator = zntrack.deps()
+    fmax: float = zntrack.params(0.05)
+    steps: int = zntrack.params(100_000_000)
+    max_atoms_per_batch: int | None = zntrack.params(None)
+    flush_interval: int = zntrack.params(100)
+
+    plots: pd.DataFrame = zntrack.plots(y=["energy", "fmax"], x="step")
+    metrics: dict = zntrack.metrics()
+
+    frames_path: pathlib.Path = zntrack.outs_path(zntrack.nwd / "frames.h5")
+    trajectories_path: pathlib.Path = zntrack.outs_path(zntrack.nwd / "trajectories")
+
+    def get_data_ids(self) -> list[int]:
+        if self.data_ids is None:
+            return list(range(len(self.data)))
+        return list(self.data_ids)
+
+    def _get_trajectory_path(self, structure: int) -> pathlib.Path:
+        return self.trajectories_path / f"{structure}.h5"
+
+    def run(self):
+        frames = [self.data[idx].copy() for idx in self.get_data_ids()]
+        calc = get_batch_calculator(self.model)
+        if self.max_atoms_per_batch is not None:
+            calc = AtomBudgetScheduler(calc, self.max_atoms_per_batch)
+        dyn = BatchedOptimizer(
+            frames, calc, get_optimizer_class(self.optimizer), self.fmax, self.steps
+        )
+        observables = ObservableBuffer(["structure", "step", "energy", "fmax"])
+
+        shutil.rmtree(self.trajectories_path, ignore_errors=True)
+        self.trajectories_path.mkdir(parents=True)
+        run_start = time.perf_counter()
+        record_batched_optimization(
+            dyn,
+            list(range(len(frames))),
+            [self._get_trajectory_path(idx) for idx in range(len(frames))],
+            observables,
+            self.flush_interval,
+        )
+        run_time = time.perf_counter() - run_start
+
+        self.frames_path.unlink(missing_ok=True)
+        znh5md.IO(self.frames_path).extend(
+            [atoms_with_results(atoms, atoms.calc.results) for atoms in frames]
+        )
+        plots = observables.to_dataframe()
+        self.plots = plots.astype({"structure": int, "step": int})
+        self.metrics = {
+            "n_structures": len(frames),
+            "n_converged": sum(dyn.converged),
+            "n_force_calls": dyn.n_force_calls,
+            "force_calls_per_second": dyn.n_force_calls / run_time,
+        }
+
+    @cached_output
+    def frames(self) -> H5MDFrames:
+        return H5MDFrames(self.state.fs, self.frames_path)
+
+    @cached_output
+    def trajectories(self) -> list[H5MDFrames]:
+        return [
+            H5MDFrames(self.state.fs, self._get_trajectory_path(idx))
+            for idx in range(len(self.get_data_ids()))
+        ]
+
+    @cached_output
+    def figures(self) -> dict[str, go.Figure]:
+        return {
+            f"{key}_vs_steps": px.line(
+                self.plots, x="step", y=key, color="structure", title=key
+            )
+            for key in ["energy", "fmax"]
+        }
+
+    @staticmethod
+    def compare(*nodes: "BatchedStructureOptimization") -> ComparisonResults:
+        frames = sum([list(node.frames) for node in nodes], [])
+        offset = 0
+        fig = go.Figure()
+        for node in nodes:
+            energies = get_columns(node.frames, ["energy"])["energy"]
+            fig.add_trace(
+                go.Scatter(
+                    x=list(range(len(energies))),
+                    y=energies,
+                    mode="markers",
+                    name=node.name.replace(f"_{node.__class__.__name__}", ""),
+                    customdata=np.stack([np.arange(len(energies)) + offset], axis=1),
+                )
+            )
+            offset += len(energies)
+
+        fig.update_layout(
+            title="Relaxed energy vs. structure",
+            xaxis_title="Structure",
+            yaxis_title="Energy / eV",
+            plot_bgcolor="rgba(0, 0, 0, 0)",
+            paper_bgcolor="rgba(0, 0, 0, 0)",
+        )
+        fig.update_xaxes(
+            showgrid=True,
+            gridwidth=1,
+            gridcolor="rgba(120, 120, 120, 0.3)",
+            zeroline=False,
+        )
+        fig.update_yaxes(
+            showgrid=True,
+            gridwidth=1,
+            gridcolor="rgba(120, 120, 120, 0.3)",
+            zeroline=False,
+        )
+        return ComparisonResults(frames=frames, figures={"relaxed_energy": fig})
+
+
+class CascadeStructureOptimization(zntrack.Node):
+    """Relax structures with a sequence of increasingly accurate models.
+
+    Each stage continues from the structures relaxed in the previous stage,
+    e.g. a fast model pre-relaxes to a loose `fmax` and an expensive model
+    refines the result. All structures of a stage are relaxed together
+    with a `BatchedOptimizer`.
+
+    By default, `metrics` report the force calls of each stage. The comparison
+    with a single-stage run of the last model needs that run as well and is
+    only added with `reference=True`, which doubles the cost of the last model
+    in the worst case.
+
+    Parameters
+    ----------
+    data : list[ase.Atoms]
+        Atoms to relax.
+    data_ids : list[int], optional
+        Indices of the ase.Atoms in `data` to optimize. Defaults to all.
+    models : list[NodeWithCalculator]
+        Model of each stage, usually ordered from the cheapest
+        to the most expensive one.
+    optimizer : Optimizer
+        Optimizer to use in all stages.
+    fmax : list[float], default=[0.2, 0.05]
+        Maximum force to reach in each stage.
+    steps : list[int], default=[1000, 1000]
+        Maximum number of steps for each optimization in each stage.
+    energy_window : float, optional
+        Between stages, only keep structures with an energy per atom
+        within this window in eV/atom above the lowest energy per atom.
+        Structures with a NaN energy are dropped as well. If no structure
+        is left, the following stages are empty and `frames` is empty.
+    max_atoms_per_batch : int, optional
+        Split the evaluation of each step into batches with up to this many atoms.
+    flush_interval : int, default=100
+        Number of frames per trajectory kept in memory before they are written.
+    reference : bool, default=False
+        Also relax all structures with the last model alone, to add the
+        force calls of the last model that the cascade saved to `metrics`.
+
+    Attributes
+    ----------
+    frames : list[ase.Atoms]
+        Structures that passed all stages, relaxed with the last model.
+        The index of each structure in `data_ids` is stored in
+        `atoms.info["structure"]`.
+    plots : pd.DataFrame
+        Energy and fmax of each stage, structure and step.
+    metrics : dict
+        Number of structures, converged structures, filtered structures and
+        force calls of each stage and the force calls of all stages as
+        `n_force_calls`. With `reference`, the force calls of
+        the last model saved by each stage are added as `force_calls_saved`:
+        for the earlier stages, the calls saved by their energy window filter,
+        for the last stage, the calls saved since its structures were
+        pre-relaxed. The totals are stored as `force_calls_saved`,
+        `force_calls_saved_by_filter` and `force_calls_saved_by_pre_relaxation`
+        next to `reference_force_calls` of the last model alone.
+    """
+
+    data: list[ase.Atoms] = zntrack.deps()
+    data_ids: list[int] | None = zntrack.params(None)
+    models: list[NodeWithCalculator] = zntrack.deps()
+    optimizer: Optimizer = zntrack.params(Optimizer.LBFGS.value)
+    fmax: list[float] = zntrack.params(default_factory=lambda: [0.2, 0.05])
+    steps: list[int] = zntrack.params(default_factory=lambda: [1000, 1000])
+    energy_window: float | None = zntrack.params(None)
+    max_atoms_per_batch: int | None = zntrack.params(None)
+    flush_interval: int = zntrack.params(100)
+    reference: bool = zntrack.params(False)
+
+    plots: pd.DataFrame = zntrack.plots(y=["energy", "fmax"], x="step")
+    metrics: dict = zntrack.metrics()
+
+    frames_path: pathlib.Path = zntrack.outs_path(zntrack.nwd / "frames.h5")
+    trajectories_path: pathlib.Path = zntrack.outs_path(zntrack.nwd / "trajectories")
+
+    def get_data_ids(self) -> list[int]:
+        if self.data_ids is None:
+            return list(range(len(self.data)))
+        return list(self.data_ids)
+
+    def get_trajectory(self, stage: int, structure: int) -> H5MDFrames:
+        """Trajectory of a structure in the given stage."""
+        return H5MDFrames(self.state.fs, self._get_trajectory_path(stage, structure))
+
+    def _get_trajectory_path(self, stage: int, structure: int) -> pathlib.Path:
+        return self.trajectories_path / str(stage) / f"{structure}.h5"
+
+    def _get_optimizer(self, model: NodeWithCalculator, frames, fmax, steps):
+        calc = get_batch_calculator(model)
+        if self.max_atoms_per_batch is not None:
+            calc = AtomBudgetScheduler(calc, self.max_atoms_per_batch)
+        return BatchedOptimizer(
+            frames, calc, get_optimizer_class(self.optimizer), fmax, steps
+        )
+
+    def _filter(self, frames: list[ase.Atoms], structures: list[int]) -> list[int]:
+        """Structures within the energy window, using the last evaluated energies."""
+        if self.energy_window is None or not structures:
+            return structures
+        energies = np.array(
+            [
+                frames[idx].get_potential_energy() / len(frames[idx])
+                for idx in structures
+            ]
+        )
+        if np.isnan(energies).all():
+            return []
+        # NaN energies compare as False and are dropped
+        keep = energies <= np.nanmin(energies) + self.energy_window
+        return [idx for idx, is_kept in zip(structures, keep) if is_kept]
+
+    def run(self):
+        if not len(self.models) == len(self.fmax) == len(self.steps):
+            raise ValueError(
+                f"Got {len(self.models)} models, {len(self.fmax)} fmax values and"
+                f" {len(self.steps)} steps values, expected one per stage."
+            )
+        frames = [self.data[idx].copy() for idx in self.get_data_ids()]
+        observables = ObservableBuffer(["stage", "structure", "step", "energy", "fmax"])
+        shutil.rmtree(self.trajectories_path, ignore_errors=True)
+
+        structures = list(range(len(frames)))
+        # structures dropped by the filter after each stage
+        filtered: list[list[int]] = []
+        self.metrics = {}
+        for stage, (model, fmax, steps) in enumerate(
+            zip(self.models, self.fmax, self.steps)
+        ):
+            if stage > 0:
+                kept = self._filter(frames, structures)
+                filtered.append([idx for idx in structures if idx not in kept])
+                self.metrics[f"stage_{stage - 1}"]["n_filtered"] = len(filtered[-1])
+                structures = kept
+            if not structures:
+                warnings.warn(f"No structures left to relax in stage {stage}.")
+            dyn = self._get_optimizer(
+                model, [frames[idx] for idx in structures], fmax, steps
+            )
+            (self.trajectories_path / str(stage)).mkdir(parents=True)
+            record_batched_optimization(
+                dyn,
+                structures,
+                [self._get_trajectory_path(stage, idx) for idx in structures],
+                observables,
+                self.flush_interval,
+                stage=stage,
+            )
+            self.metrics[f"stage_{stage}"] = {
+                "n_structures": len(structures),
+                "n_converged": sum(dyn.converged),
+                "n_force_calls": dyn.n_force_calls,
+            }
+
+        self.metrics["n_force_calls"] = sum(
+            self.metrics[f"stage_{stage}"]["n_force_calls"]
+            for stage in range(len(self.models))
+        )
+        if self.reference:
+            stage_savings, savings = self._get_savings(dyn, structures, filtered)
+            for stage, saved in enumerate(stage_savings):
+                self.metrics[f"stage_{stage}"]["force_calls_saved"] = saved
+            self.metrics.update(savings)
+
+        self.frames_path.unlink(missing_ok=True)
+        final_frames = []
+        for idx in structures:
+            atoms = atoms_with_results(frames[idx], frames[idx].calc.results)
+            atoms.info["structure"] = idx
+            final_frames.append(atoms)
+        if final_frames:
+            znh5md.IO(self.frames_path).extend(final_frames)
+        else:
+            # an empty file if no structure passed all stages
+            h5py.File(self.frames_path, "w").close()
+        plots = observables.to_dataframe()
+        self.plots = plots.astype({"stage": int, "structure": int, "step": int})
+
+    def _get_savings(
+        self,
+        dyn: BatchedOptimizer,
+        structures: list[int],
+        filtered: list[list[int]],
+    ) -> tuple[list[int], dict[str, int]]:
+        """Relax all structures with the last model alone and count the force calls.
+
+        `dyn` is the optimizer of the last stage of the cascade and `filtered`
+        holds the structures dropped after each earlier stage.
+        Returns the force calls saved by each stage and the totals.
+        """
+        frames = [self.data[idx].copy() for idx in self.get_data_ids()]
+        reference = self._get_optimizer(
+            self.models[-1], frames, self.fmax[-1], self.steps[-1]
+        )
+        for _ in tqdm.tqdm(reference.irun(), desc="reference"):
+            pass
+        # each structure is evaluated once more than the number of steps
+        calls = [reference_dyn.nsteps + 1 for reference_dyn in reference.optimizers]
+        cascade_calls = [cascade_dyn.nsteps + 1 for cascade_dyn in dyn.optimizers]
+        stage_savings = [sum(calls[idx] for idx in ids) for ids in filtered]
+        stage_savings.append(
+            sum(calls[idx] - n_calls for idx, n_calls in zip(structures, cascade_calls))
+        )
+        return stage_savings, {
+            "reference_force_calls": reference.n_force_calls,
+            "force_calls_saved": reference.n_force_calls - dyn.n_force_calls,
+            "force_calls_saved_by_filter": sum(stage_savings[:-1]),
+            "force_calls_saved_by_pre_relaxation": stage_savings[-1],
+        }
+
+    @cached_output
+    def frames(self) -> H5MDFrames:
+        return H5MDFrames(self.state.fs, self.frames_path)
+
+    @cached_output
+    def figures(self) -> dict[str, go.Figure]:
+        return {
+            f"{key}_vs_steps": px.line(
+                self.plots,
+                x="step",
+                y=key,
+                color="structure",
+                facet_col="stage",
+                title=key,
+            )
+            for key in ["energy", "fmax"]
+        }
+
+    @staticmethod
+    def compare(*nodes: "CascadeStructureOptimization") -> ComparisonResults:
+        return BatchedStructureOptimization.compare(*nodes)
@@ -1,5 +1,9 @@
+import copy
+import hashlib
+
 import ase
 import numpy as np
+from ase.calculators.calculator import Calculator, PropertyNotImplementedError
 from ase.calculators.singlepoint import SinglePointCalculator
 
 
@@ -11,6 +15,39 @@ def freeze_copy_atoms(atoms: ase.Atoms) -> ase.Atoms:
     return atoms_copy
 
 
+def atoms_with_results(atoms: ase.Atoms, results: dict) -> ase.Atoms:
+    """Copy `atoms` and attach `results` via a SinglePointCalculator."""
+    atoms_copy = atoms.copy()
+    atoms_copy.calc = SinglePointCalculator(atoms_copy)
+    atoms_copy.calc.results = results
+    return atoms_copy
+
+
+def calculate_properties(
+    atoms: ase.Atoms, calc: Calculator, properties: list[str]
+) -> dict:
+    """Compute all `properties` for `atoms` with a single calculator call.
+
+    Returns a copy of all results provided by the calculator, which can
+    include more than the requested properties.
+    """
+    for name in properties:
+        if name not in calc.implemented_properties:
+            raise PropertyNotImplementedError(f"{name} property not implemented")
+
+    system_changes = calc.check_state(atoms)
+    if system_changes:
+        calc.atoms = None
+        calc.results = {}
+    if any(name not in calc.results for name in properties):
+        if calc.use_cache:
+            calc.atoms = atoms.copy()
+        calc.calculate(atoms, list(properties), system_changes)
+
+    # calculators might update their results arrays inplace
+    return copy.deepcopy(calc.results)
+
+
 def shallow_copy_atoms(atoms: ase.Atoms) -> ase.Atoms:
     """Create a shallow copy of an ASE atoms object."""
     atoms_copy = ase.Atoms(
@@ -22,5 +59,22 @@ def shallow_copy_atoms(atoms: ase.Atoms) -> ase.Atoms:
     return atoms_copy
 
 
+def hash_atoms(atoms: ase.Atoms, tolerance: float | None = None) -> str:
+    """Stable hash of the numbers, positions, cell and pbc of `atoms`.
+
+    If `tolerance` is given, positions and cell are rounded to multiples
+    of `tolerance` before hashing, so nearly identical structures
+    usually share the same hash.
+    """
+    positions, cell = atoms.positions, atoms.cell.array
+    if tolerance is not None:
+        positions = np.round(positions / tolerance).astype(np.int64)
+        cell = np.round(cell / tolerance).astype(np.int64)
+    digest = hashlib.sha256()
+    for array in (atoms.numbers, positions, cell, atoms.pbc):
+        digest.update(np.ascontiguousarray(array).tobytes())
+    return digest.hexdigest()
+
+
 def rmse(y_true, y_pred):
     return np.sqrt(np.mean((y_true - y_pred) ** 2))
@@ -1,10 +1,13 @@
 import os
 import pathlib
 import shutil
+import types
 
 import dvc.cli
 import git
 import pytest
+from ase.calculators.calculator import all_changes
+from ase.calculators.emt import EMT
 
 
 @pytest.fixture
@@ -27,3 +30,23 @@ def proj_path(tmp_path, request) -> pathlib.Path:
     dvc.cli.main(["init"])
 
     return tmp_path
+
+
+@pytest.fixture
+def recording_model(tmp_path, monkeypatch) -> types.SimpleNamespace:
+    """EMT model whose calculators record the properties of each calculation.
+
+    The requested properties are appended to `recording_model.requested`.
+    Also changes into `tmp_path` to run nodes outside a project.
+    """
+    monkeypatch.chdir(tmp_path)
+    requested = []
+
+    class RecordingEMT(EMT):
+        def calculate(self, atoms=None, properties=None, system_changes=all_changes):
+            requested.append(sorted(properties))
+            super().calculate(atoms, properties, system_changes)
+
+    return types.SimpleNamespace(
+        get_calculator=lambda **kwargs: RecordingEMT(), requested=requested
+    )
@@ -0,0 +1,212 @@
+import dataclasses
+
+import numpy as np
+import pytest
+import znh5md
+from ase.build import bulk
+from ase.calculators.emt import EMT
+
+import mlipx
+from mlipx.frames import FrameSequence
+from mlipx.utils import atoms_with_results, calculate_properties
+
+pytestmark = pytest.mark.filterwarnings("ignore:Using the NWD outside a project")
+
+
+class CrashingEMT(EMT):
+    """EMT which counts its calculations and fails after `fail_after` of them."""
+
+    fail_after: int | None = None
+    n_calculations = 0
+
+    def calculate(self, *args, **kwargs):
+        if CrashingEMT.fail_after is not None:
+            if CrashingEMT.n_calculations >= CrashingEMT.fail_after:
+                raise RuntimeError("interrupted")
+        CrashingEMT.n_calculations += 1
+        super().calculate(*args, **kwargs)
+
+
+@dataclasses.dataclass
+class CrashingModel:
+    def get_calculator(self, **kwargs) -> CrashingEMT:
+        return CrashingEMT()
+
+
+@pytest.fixture
+def frames():
+    frames = []
+    for seed in range(7):
+        atoms = bulk("Cu", "fcc", a=3.6, cubic=True)
+        atoms.rattle(0.05, seed=seed)
+        frames.append(atoms)
+    return frames
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    CrashingEMT.fail_after = None
+    CrashingEMT.n_calculations = 0
+
+
+def get_node(frames, name, **kwargs) -> mlipx.ApplyCalculator:
+    node = mlipx.ApplyCalculator(
+        data=frames,
+        model=CrashingModel(),
+        properties=["energy", "forces"],
+        chunk_size=2,
+        name=name,
+        **kwargs,
+    )
+    node.nwd.mkdir(parents=True, exist_ok=True)
+    return node
+
+
+def assert_same_results(frames, reference):
+    assert len(frames) == len(reference)
+    for atoms, ref in zip(frames, reference):
+        np.testing.assert_allclose(atoms.positions, ref.positions)
+        assert atoms.get_potential_energy() == pytest.approx(ref.get_potential_energy())
+        np.testing.assert_allclose(atoms.get_forces(), ref.get_forces(), atol=1e-12)
+
+
+class RecordingFrames(FrameSequence):
+    """Lazy frames which record the indices of each read."""
+
+    def __init__(self, frames):
+        self.frames = frames
+        self.reads = []
+
+    def __len__(self) -> int:
+        return len(self.frames)
+
+    def read(self, indices):
+        self.reads.append(indices)
+        return [self.frames[idx].copy() for idx in indices]
+
+
+def test_chunked_streaming(frames, monkeypatch):
+    written = []
+    extend = znh5md.IO.extend
+
+    def recording_extend(self, chunk):
+        written.append(len(chunk))
+        return extend(self, chunk)
+
+    monkeypatch.setattr(znh5md.IO, "extend", recording_extend)
+    data = RecordingFrames(frames)
+    node = get_node(data, "chunked")
+    node.run()
+
+    # 7 frames in chunks of 2, the last chunk is incomplete
+    assert data.reads == [[0, 1], [2, 3], [4, 5], [6]]
+    assert written == [2, 2, 2, 1]
+    assert node.metrics["n_frames"] == len(frames)
+    assert node.metrics["write_frames_per_second"] > 0
+    assert node.metrics["write_mb_per_second"] > 0
+    assert_same_results(list(node.frames), get_reference(frames))
+
+
+def test_resume(frames):
+    reference = get_node(frames, "reference")
+    reference.run()
+
+    node = get_node(frames, "resumed")
+    CrashingEMT.n_calculations = 0
+    CrashingEMT.fail_after = 5
+    with pytest.raises(RuntimeError):
+        node.run()
+    # a frame written after the last progress update is discarded
+    extra = frames[4].copy()
+    extra = atoms_with_results(extra, calculate_properties(extra, EMT(), ["energy"]))
+    znh5md.IO(node.nwd / "frames.partial.h5").extend([extra])
+
+    CrashingEMT.fail_after = None
+    CrashingEMT.n_calculations = 0
+    node.run()
+
+    assert CrashingEMT.n_calculations == 3
+    assert node.metrics["n_frames"] == len(frames)
+    assert_same_results(list(node.frames), list(reference.frames))
+
+
+def test_worker_cache_counters(frames, tmp_path):
+    emt = mlipx.GenericASECalculator(module="ase.calculators.emt", class_name="EMT")
+    model = mlipx.CachedModel(model=emt, path=(tmp_path / "cache").as_posix())
+    metrics = []
+    for name in ["first", "second"]:
+        node = get_node(frames, name, n_workers=2)
+        node.model = model
+        node.run()
+        metrics.append(node.metrics)
+
+    assert (metrics[0]["cache_hits"], metrics[0]["cache_misses"]) == (0, len(frames))
+    assert (metrics[1]["cache_hits"], metrics[1]["cache_misses"]) == (len(frames), 0)
+    assert 0 < metrics[1]["worker_utilization"] <= 1
+
+
+def test_workers_split_chunks(frames):
+    node = get_node(frames, "split", n_workers=2, max_atoms_per_batch=16)
+    node.model = mlipx.GenericASECalculator(
+        module="ase.calculators.emt", class_name="EMT"
+    )
+    node.chunk_size = 4
+    node.run()
+
+    # each chunk of 4 frames is split into two batches, the last chunk has 3
+    assert node.metrics["batch_size_histogram"] == {"1": 1, "2": 3}
+    assert_same_results(list(node.frames), get_reference(frames))
+
+
+@pytest.fixture
+def duplicated_frames(frames):
+    return [frames[idx].copy() for idx in [0, 1, 0, 2, 1, 0, 3]]
+
+
+def get_reference(frames):
+    return [
+        atoms_with_results(atoms, calculate_properties(atoms, EMT(), ["forces"]))
+        for atoms in frames
+    ]
+
+
+def test_deduplicate(duplicated_frames):
+    node = get_node(duplicated_frames, "dedup", deduplicate=True, batch_size=3)
+    node.run()
+
+    assert CrashingEMT.n_calculations == 4
+    assert node.metrics["duplicate_ratio"] == pytest.approx(3 / 7)
+    assert_same_results(list(node.frames), get_reference(duplicated_frames))
+
+
+def test_deduplicate_resume(duplicated_frames):
+    node = get_node(duplicated_frames, "dedup", deduplicate=True, batch_size=3)
+    # the last unique frame fails after the first six frames were written
+    CrashingEMT.fail_after = 3
+    with pytest.raises(RuntimeError):
+        node.run()
+
+    CrashingEMT.fail_after = None
+    CrashingEMT.n_calculations = 0
+    node.run()
+
+    assert CrashingEMT.n_calculations == 1
+    assert_same_results(list(node.frames), get_reference(duplicated_frames))
+
+
+def test_resume_with_other_settings(duplicated_frames):
+    node = get_node(duplicated_frames, "dedup", batch_size=3)
+    CrashingEMT.fail_after = 5
+    with pytest.raises(RuntimeError):
+        node.run()
+
+    # results computed with and without deduplication are not mixed
+    CrashingEMT.fail_after = None
+    CrashingEMT.n_calculations = 0
+    node.deduplicate = True
+    with pytest.warns(UserWarning, match="Can not resume"):
+        node.run()
+
+    assert CrashingEMT.n_calculations == 4
+    assert_same_results(list(node.frames), get_reference(duplicated_frames))
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+from ase.build import bulk
+from ase.calculators.emt import EMT
+
+from mlipx.batching import ASEBatchCalculator, AtomBudgetScheduler, batched
+
+
+@pytest.fixture
+def frames():
+    frames = []
+    for seed in range(5):
+        atoms = bulk("Cu", "fcc", a=3.6, cubic=True)
+        atoms.rattle(0.05, seed=seed)
+        frames.append(atoms)
+    return frames
+
+
+def test_batched():
+    assert list(batched(range(5), 2)) == [[0, 1], [2, 3], [4]]
+    with pytest.raises(ValueError):
+        list(batched(range(5), 0))
+
+
+def test_ase_batch_calculator(frames):
+    calc = ASEBatchCalculator(EMT())
+    results = calc.calculate_batch(frames, properties=["energy", "forces"])
+
+    assert len(results) == len(frames)
+    for atoms, atoms_results in zip(frames, results):
+        atoms.calc = EMT()
+        assert atoms_results["energy"] == pytest.approx(atoms.get_potential_energy())
+        np.testing.assert_allclose(atoms_results["forces"], atoms.get_forces())
+
+
+class LimitedBatchCalculator:
+    """Run out of memory for batches with more than `max_atoms` atoms."""
+
+    def __init__(self, max_atoms):
+        self.max_atoms = max_atoms
+        self.calc = ASEBatchCalculator(EMT())
+
+    def calculate_batch(self, frames, properties=None):
+        if sum(len(atoms) for atoms in frames) > self.max_atoms:
+            raise MemoryError
+        return self.calc.calculate_batch(frames, properties)
+
+
+def test_atom_budget_scheduler(frames):
+    frames = [atoms.repeat((idx % 3 + 1, 1, 1)) for idx, atoms in enumerate(frames)]
+    scheduler = AtomBudgetScheduler(LimitedBatchCalculator(max_atoms=12), max_atoms=64)
+    results = scheduler.calculate_batch(frames)
+
+    assert scheduler.max_atoms == 8
+    assert sum(size * count for size, count in scheduler.histogram.items()) == 5
+    for atoms, atoms_results in zip(frames, results):
+        atoms.calc = EMT()
+        assert atoms_results["energy"] == pytest.approx(atoms.get_potential_energy())
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+from ase.build import bulk
+
+import mlipx
+from mlipx.cache import ResultStore
+
+
+@pytest.fixture
+def model(tmp_path):
+    emt = mlipx.GenericASECalculator(module="ase.calculators.emt", class_name="EMT")
+    return mlipx.CachedModel(model=emt, path=(tmp_path / "cache").as_posix())
+
+
+def test_cached_model(model):
+    atoms = bulk("Cu", "fcc", a=3.6, cubic=True)
+    atoms.rattle(0.05, seed=1)
+
+    calc = model.get_calculator()
+    atoms.calc = calc
+    energy = atoms.get_potential_energy()
+    assert calc.cache_info().misses == 1
+
+    # a new calculator, e.g. in a different node, reuses the stored results
+    other = atoms.copy()
+    other.calc = model.get_calculator()
+    assert other.get_potential_energy() == pytest.approx(energy)
+    assert other.calc.cache_info() == (1, 0, 1)
+
+    other.positions[0] += 0.1
+    assert other.get_potential_energy() != pytest.approx(energy)
+    assert other.calc.cache_info() == (1, 1, 2)
+
+    # calculator settings are part of the cache key
+    atoms.calc = model.get_calculator(asap_cutoff=True)
+    assert atoms.get_potential_energy() != pytest.approx(energy)
+    assert atoms.calc.cache_info() == (0, 1, 3)
+
+
+def test_result_store_eviction(tmp_path):
+    store = ResultStore(tmp_path, max_size_mb=0.01)
+    for idx in range(10):
+        store.set(f"{idx}", {"energy": float(idx), "forces": np.zeros((100, 3))})
+    assert 0 < len(store) < 10
+    assert store.get("9")["energy"] == 9.0
+    assert store.get("0") is None
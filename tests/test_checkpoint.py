@@ -0,0 +1,228 @@
+import dataclasses
+
+import numpy as np
+import pandas as pd
+import pytest
+import znh5md
+from ase.build import add_adsorbate, bulk, fcc100
+from ase.calculators.emt import EMT
+from ase.constraints import FixAtoms
+from ase.mep import NEB
+
+import mlipx
+from mlipx.checkpoint import (
+    get_atoms_state,
+    get_dynamics_state,
+    set_atoms_state,
+    set_dynamics_state,
+    truncate_trajectory,
+)
+from mlipx.nodes.structure_optimization import get_optimizer_class
+
+
+@pytest.mark.parametrize("optimizer", ["FIRE", "BFGS", "LBFGS", "PreconLBFGS"])
+def test_resume_optimizer(optimizer):
+    atoms = bulk("Cu", cubic=True) * (2, 1, 1)
+    atoms.rattle(0.1, seed=0)
+    atoms.calc = EMT()
+    reference = atoms.copy()
+    reference.calc = EMT()
+    get_optimizer_class(optimizer)(reference, logfile=None).run(fmax=0, steps=10)
+
+    dyn = get_optimizer_class(optimizer)(atoms, logfile=None)
+    dyn.run(fmax=0, steps=4)
+    atoms_state, dyn_state = get_atoms_state(atoms), get_dynamics_state(dyn)
+
+    resumed = bulk("Cu", cubic=True) * (2, 1, 1)
+    resumed.calc = EMT()
+    set_atoms_state(resumed, atoms_state)
+    dyn = get_optimizer_class(optimizer)(resumed, logfile=None)
+    set_dynamics_state(dyn, dyn_state)
+    dyn.run(fmax=0, steps=10 - dyn.nsteps)
+
+    assert dyn.nsteps == 10
+    np.testing.assert_allclose(resumed.positions, reference.positions, atol=1e-10)
+
+
+def test_truncate_h5md(tmp_path):
+    frames = [bulk("Cu", cubic=True) for _ in range(5)]
+    for idx, atoms in enumerate(frames):
+        atoms.rattle(0.1, seed=idx)
+    path = tmp_path / "frames.h5"
+    znh5md.IO(path).extend(frames)
+
+    assert truncate_trajectory(path, 3)
+    truncated = znh5md.IO(path)[:]
+    assert len(truncated) == 3
+    np.testing.assert_array_equal(truncated[-1].positions, frames[2].positions)
+    assert not truncate_trajectory(path, 4)
+    assert not truncate_trajectory(tmp_path / "missing.h5", 1)
+
+
+def test_truncate_h5md_sparse_info(tmp_path):
+    frames = [bulk("Cu", cubic=True) for _ in range(5)]
+    for idx, atoms in enumerate(frames):
+        atoms.rattle(0.1, seed=idx)
+    # keys of only some frames are stored as shorter datasets
+    frames[1].info["label"] = 1.0
+    frames[3].info["rare"] = 2.0
+    path = tmp_path / "frames.h5"
+    znh5md.IO(path).extend(frames)
+
+    assert truncate_trajectory(path, 3)
+    truncated = znh5md.IO(path)[:]
+    assert len(truncated) == 3
+    assert truncated[1].info["label"] == 1.0
+    assert "rare" not in truncated[2].info
+    np.testing.assert_array_equal(truncated[-1].positions, frames[2].positions)
+
+
+class CrashingEMT(EMT):
+    """EMT which counts its calculations and fails after `fail_after` of them."""
+
+    fail_after: int | None = None
+    n_calculations = 0
+
+    def calculate(self, *args, **kwargs):
+        if CrashingEMT.fail_after is not None:
+            if CrashingEMT.n_calculations >= CrashingEMT.fail_after:
+                raise RuntimeError("interrupted")
+        CrashingEMT.n_calculations += 1
+        super().calculate(*args, **kwargs)
+
+
+@dataclasses.dataclass
+class CrashingModel:
+    def get_calculator(self, **kwargs) -> CrashingEMT:
+        return CrashingEMT()
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    CrashingEMT.fail_after = None
+    CrashingEMT.n_calculations = 0
+
+
+def run_interrupted(get_node, fail_after: int) -> tuple:
+    """Run a node uninterrupted and a node killed after `fail_after` calculations.
+
+    `get_node(name)` has to create the node with a fresh copy of its inputs.
+
+    Returns both nodes and the number of calculations of each run.
+    """
+    reference = get_node("reference")
+    reference.run()
+    n_reference = CrashingEMT.n_calculations
+
+    CrashingEMT.n_calculations = 0
+    CrashingEMT.fail_after = fail_after
+    with pytest.raises(RuntimeError):
+        get_node("resumed").run()
+    CrashingEMT.fail_after = None
+    CrashingEMT.n_calculations = 0
+    # like a new process, which loads the inputs again
+    node = get_node("resumed")
+    node.run()
+    return reference, node, n_reference, CrashingEMT.n_calculations
+
+
+def assert_same_frames(frames, reference):
+    assert len(frames) == len(reference)
+    for atoms, ref in zip(frames, reference):
+        np.testing.assert_allclose(atoms.positions, ref.positions, atol=1e-10)
+        assert atoms.get_potential_energy() == pytest.approx(ref.get_potential_energy())
+
+
+@pytest.mark.usefixtures("workdir")
+@pytest.mark.filterwarnings("ignore:Using the NWD outside a project")
+@pytest.mark.filterwarnings("ignore::FutureWarning")
+def test_resume_molecular_dynamics():
+    atoms = bulk("Cu", cubic=True) * (2, 1, 1)
+    atoms.rattle(0.05, seed=0)
+
+    def get_node(name):
+        node = mlipx.MolecularDynamics(
+            model=CrashingModel(),
+            thermostat=mlipx.LangevinConfig(
+                timestep=2.0, temperature=300, friction=0.01, seed=42
+            ),
+            data=[atoms.copy()],
+            steps=20,
+            write_interval=2,
+            flush_interval=3,
+            checkpoint_interval=5,
+            name=name,
+        )
+        node.nwd.mkdir(parents=True, exist_ok=True)
+        return node
+
+    reference, node, n_reference, n_resumed = run_interrupted(get_node, 13)
+
+    # resumed from the checkpoint at step 10
+    assert (n_reference, n_resumed) == (21, 11)
+    assert_same_frames(list(node.frames), list(reference.frames))
+    assert len(node.frames) == 11
+    columns = ["energy", "fmax", "fnorm", "temperature"]
+    np.testing.assert_allclose(node.plots[columns], reference.plots[columns])
+    assert node.observer_metrics == reference.observer_metrics
+
+
+@pytest.mark.usefixtures("workdir")
+@pytest.mark.filterwarnings("ignore:Using the NWD outside a project")
+def test_resume_structure_optimization():
+    atoms = bulk("Cu", cubic=True) * (2, 1, 1)
+    atoms.rattle(0.1, seed=0)
+
+    def get_node(name):
+        node = mlipx.StructureOptimization(
+            model=CrashingModel(),
+            data=[atoms.copy()],
+            optimizer="LBFGS",
+            fmax=0.001,
+            checkpoint_interval=5,
+            name=name,
+        )
+        node.nwd.mkdir(parents=True, exist_ok=True)
+        return node
+
+    reference, node, n_reference, n_resumed = run_interrupted(get_node, 13)
+
+    # resumed from the checkpoint at step 10, steps 0 to 9 are not evaluated again
+    assert n_resumed == n_reference - 10
+    assert node.metrics == reference.metrics
+    assert_same_frames(node.frames, reference.frames)
+    np.testing.assert_allclose(node.plots, reference.plots)
+
+
+@pytest.mark.usefixtures("workdir")
+@pytest.mark.filterwarnings("ignore:Using the NWD outside a project")
+def test_resume_nebs():
+    initial = fcc100("Cu", size=(2, 2, 2), vacuum=4.0)
+    add_adsorbate(initial, "Cu", 1.7, "hollow")
+    initial.set_constraint(FixAtoms(mask=initial.get_tags() > 1))
+    final = initial.copy()
+    final.positions[-1, 0] += initial.cell[0, 0] / 2
+    images = [initial] + [initial.copy() for _ in range(3)] + [final]
+    NEB(images).interpolate()
+
+    def get_node(name):
+        node = mlipx.NEBs(
+            model=CrashingModel(),
+            data=[image.copy() for image in images],
+            relax=False,
+            fmax=0.001,
+            n_steps=15,
+            checkpoint_interval=5,
+            name=name,
+        )
+        node.nwd.mkdir(parents=True, exist_ok=True)
+        return node
+
+    # each step evaluates the three moving images
+    reference, node, n_reference, n_resumed = run_interrupted(get_node, 5 + 3 * 12)
+
+    # the images of the checkpoint at step 10 are evaluated again
+    assert n_resumed == n_reference - 3 * 10 + 3
+    assert_same_frames(node.trajectory_frames, reference.trajectory_frames)
+    pd.testing.assert_frame_equal(node.results, reference.results)
@@ -0,0 +1,37 @@
+import h5py
+import numpy as np
+import pytest
+import znh5md
+from ase.build import bulk, molecule
+from ase.calculators.emt import EMT
+
+from mlipx.columnar import frames_to_columns, read_h5md_columns
+from mlipx.utils import atoms_with_results, calculate_properties
+
+
+@pytest.fixture
+def frames():
+    frames = []
+    for idx, atoms in enumerate([molecule("H2O"), bulk("Cu", cubic=True)] * 3):
+        atoms.rattle(0.05, seed=idx)
+        results = calculate_properties(atoms, EMT(), ["energy", "forces"])
+        frames.append(atoms_with_results(atoms, results))
+    return frames
+
+
+@pytest.mark.parametrize("start, stop", [(None, None), (1, 4)])
+def test_read_h5md_columns(tmp_path, frames, start, stop):
+    path = tmp_path / "frames.h5"
+    znh5md.IO(path).extend(frames)
+    keys = ["numbers", "positions", "energy", "forces", "cell", "pbc"]
+    with h5py.File(path) as file:
+        columns = read_h5md_columns(file, keys, start, stop)
+    expected = frames_to_columns(frames[start:stop], keys)
+
+    assert columns.keys() == expected.keys()
+    np.testing.assert_array_equal(columns["offsets"], expected["offsets"])
+    np.testing.assert_array_equal(columns["numbers"], expected["numbers"])
+    np.testing.assert_array_equal(columns["pbc"], expected["pbc"])
+    for key in ["positions", "energy", "forces", "cell"]:
+        assert columns[key].shape == expected[key].shape
+        np.testing.assert_allclose(columns[key], expected[key])
@@ -0,0 +1,96 @@
+import types
+
+import numpy as np
+import pandas as pd
+import pytest
+from ase.build import molecule
+from ase.calculators.emt import EMT
+
+from mlipx.nodes.compare_calculator import (
+    CompareCalculatorResults,
+    ForceErrorAccumulator,
+)
+from mlipx.utils import atoms_with_results, calculate_properties
+
+
+def test_force_error_accumulator():
+    rng = np.random.default_rng(42)
+    numbers = rng.choice([1, 8, 29], size=100)
+    error = rng.normal(size=(100, 3))
+
+    errors = ForceErrorAccumulator()
+    for start in range(0, 100, 30):
+        errors.update(numbers[start : start + 30], error[start : start + 30])
+    total, per_element = errors.get_metrics()
+
+    assert total["rmse"] == pytest.approx(np.sqrt(np.mean(error**2)))
+    assert total["mae"] == pytest.approx(np.mean(np.abs(error)))
+    assert set(per_element) == {"H", "O", "Cu"}
+    mask = numbers == 8
+    assert per_element["O"]["rmse"] == pytest.approx(np.sqrt(np.mean(error[mask] ** 2)))
+    assert per_element["O"]["mae"] == pytest.approx(np.mean(np.abs(error[mask])))
+    assert per_element["O"]["n_components"] == 3 * mask.sum()
+
+
+def test_missing_forces():
+    frames = [molecule("H2O")]
+    node = CompareCalculatorResults(
+        data=types.SimpleNamespace(frames=frames),
+        reference=types.SimpleNamespace(frames=frames),
+    )
+    with pytest.warns(UserWarning, match="Can not compare the forces"):
+        assert node.get_force_errors() is None
+
+
+def get_results(frames, rng, dtype):
+    """Frames with EMT results and random plots, with a shuffled index."""
+    frames = [
+        atoms_with_results(atoms, calculate_properties(atoms, EMT(), ["forces"]))
+        for atoms in frames
+    ]
+    size = len(frames)
+    plots = pd.DataFrame(
+        {
+            key: rng.normal(size=size).astype(dtype)
+            for key in ["energy", "fmax", "fnorm"]
+        },
+        index=rng.permutation(size),
+    )
+    plots["n_atoms"] = [len(atoms) for atoms in frames]
+    return types.SimpleNamespace(frames=frames, plots=plots)
+
+
+@pytest.mark.filterwarnings("ignore:Using the NWD outside a project")
+def test_compare_matches_per_frame(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    rng = np.random.default_rng(0)
+    frames = [molecule("H2O"), molecule("CH4"), molecule("NH3")] * 3
+    for idx, atoms in enumerate(frames):
+        atoms.rattle(0.05, seed=idx)
+    data = get_results(frames, rng, np.float64)
+    reference = get_results(frames, rng, np.float32)
+    node = CompareCalculatorResults(data=data, reference=reference)
+    node.run()
+
+    # values of the former row by row implementation
+    e_rmse = node.rmse["energy"]
+    rows = []
+    for idx in range(len(frames)):
+        row = {}
+        row["adjusted_energy_error"] = (
+            data.plots["energy"].iloc[idx] - e_rmse
+        ) - reference.plots["energy"].iloc[idx]
+        row["adjusted_energy"] = data.plots["energy"].iloc[idx] - e_rmse
+        row["adjusted_energy_error_per_atom"] = (
+            row["adjusted_energy_error"] / data.plots["n_atoms"].iloc[idx]
+        )
+        for key in ["fmax", "fnorm"]:
+            row[f"{key}_error"] = (
+                data.plots[key].iloc[idx] - reference.plots[key].iloc[idx]
+            )
+        rows.append(row)
+    pd.testing.assert_frame_equal(node.plots, pd.DataFrame(rows), check_exact=True)
+    assert node.error["adjusted_energy_max"] == max(
+        row["adjusted_energy_error"] for row in rows
+    )
+    assert node.rmse["forces"] == node.mae["forces"] == 0
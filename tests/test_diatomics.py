@@ -0,0 +1,18 @@
+import pytest
+
+import mlipx
+
+pytestmark = pytest.mark.filterwarnings("ignore:Using the NWD outside a project")
+
+
+@pytest.mark.parametrize("properties", [["energy"], ["energy", "forces"]])
+def test_diatomics_properties(recording_model, properties):
+    node = mlipx.HomonuclearDiatomics(
+        model=recording_model, elements=["Cu"], n_points=3, properties=properties
+    )
+    node.nwd.mkdir(parents=True, exist_ok=True)
+    node.run()
+
+    assert recording_model.requested == [sorted(properties)] * 3
+    assert list(node.results.columns) == ["Cu"]
+    assert len(node.frames) == 3
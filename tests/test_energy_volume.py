@@ -0,0 +1,28 @@
+import pytest
+from ase.build import bulk
+
+import mlipx
+
+pytestmark = pytest.mark.filterwarnings("ignore:Using the NWD outside a project")
+
+
+@pytest.mark.parametrize(
+    ("properties", "figures"),
+    [
+        (["energy", "forces"], {"energy-volume-curve", "fmax-volume-curve"}),
+        (["energy"], {"energy-volume-curve"}),
+    ],
+)
+def test_energy_volume_properties(recording_model, properties, figures):
+    node = mlipx.EnergyVolumeCurve(
+        model=recording_model,
+        data=[bulk("Cu", cubic=True)],
+        n_points=3,
+        properties=properties,
+    )
+    node.nwd.mkdir(parents=True, exist_ok=True)
+    node.run()
+
+    assert recording_model.requested == [sorted(properties)] * 3
+    assert ("fmax" in node.results.columns) == ("forces" in properties)
+    assert set(node.figures) == figures
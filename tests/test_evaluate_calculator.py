@@ -0,0 +1,30 @@
+import numpy as np
+import pandas as pd
+from ase.build import bulk, molecule
+from ase.calculators.emt import EMT
+
+from mlipx.columnar import frames_to_columns
+from mlipx.nodes.evaluate_calculator import get_frame_metrics
+
+
+def test_get_frame_metrics():
+    frames = [molecule("H2O"), bulk("Cu", cubic=True), molecule("CH4")] * 2
+    for idx, atoms in enumerate(frames):
+        atoms.rattle(0.05, seed=idx)
+        atoms.calc = EMT()
+
+    metrics = get_frame_metrics(frames_to_columns(frames, ["energy", "forces"]))
+
+    expected = pd.DataFrame(
+        [
+            {
+                "fmax": np.max(np.linalg.norm(atoms.get_forces(), axis=1)),
+                "fnorm": np.linalg.norm(atoms.get_forces()),
+                "energy": atoms.get_potential_energy(),
+                "n_atoms": len(atoms),
+                "energy_per_atom": atoms.get_potential_energy() / len(atoms),
+            }
+            for atoms in frames
+        ]
+    )
+    pd.testing.assert_frame_equal(metrics, expected, rtol=1e-14)
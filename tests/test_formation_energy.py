@@ -0,0 +1,74 @@
+import types
+
+import numpy as np
+import pandas as pd
+import pytest
+from ase.build import bulk, molecule
+from ase.calculators.emt import EMT
+
+import mlipx
+from mlipx.utils import atoms_with_results, calculate_properties
+
+pytestmark = pytest.mark.filterwarnings("ignore:Using the NWD outside a project")
+
+
+@pytest.fixture
+def frames():
+    frames = [bulk("Cu", cubic=True), molecule("H2O")]
+    return [
+        atoms_with_results(atoms, calculate_properties(atoms, EMT(), ["energy"]))
+        for atoms in frames
+    ]
+
+
+def test_formation_energy_properties(recording_model, frames):
+    node = mlipx.CalculateFormationEnergy(
+        data=frames, model=recording_model, properties=["energy", "forces"]
+    )
+    node.nwd.mkdir(parents=True, exist_ok=True)
+    node.run()
+
+    # one calculation per element
+    assert recording_model.requested == [["energy", "forces"]] * 3
+    assert set(node.isolated_energies) == {"Cu", "H", "O"}
+    isolated = node.isolated_energies
+    assert node.formation_energy == pytest.approx(
+        [
+            frames[0].get_potential_energy() - 4 * isolated["Cu"],
+            frames[1].get_potential_energy() - isolated["O"] - 2 * isolated["H"],
+        ]
+    )
+
+
+def test_compare_formation_energy_matches_per_frame(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    rng = np.random.default_rng(0)
+    data, reference = (
+        types.SimpleNamespace(
+            plots=pd.DataFrame(
+                {"eform": rng.normal(size=5).astype(dtype), "n_atoms": [1, 2, 3, 4, 5]},
+                index=rng.permutation(5),
+            )
+        )
+        for dtype in [np.float64, np.float32]
+    )
+    node = mlipx.CompareFormationEnergy(data=data, reference=reference)
+    node.run()
+
+    # values of the former row by row implementation
+    eform_rmse = node.rmse["eform"]
+    rows = []
+    for idx in range(5):
+        row = {}
+        row["adjusted_eform_error"] = (
+            data.plots["eform"].iloc[idx] - eform_rmse
+        ) - reference.plots["eform"].iloc[idx]
+        row["adjusted_eform"] = data.plots["eform"].iloc[idx] - eform_rmse
+        row["adjusted_eform_error_per_atom"] = (
+            row["adjusted_eform_error"] / data.plots["n_atoms"].iloc[idx]
+        )
+        rows.append(row)
+    pd.testing.assert_frame_equal(node.plots, pd.DataFrame(rows), check_exact=True)
+    assert node.error["adjusted_eform_min"] == min(
+        row["adjusted_eform_error"] for row in rows
+    )
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+import znh5md
+from ase.build import bulk, molecule
+from fsspec.implementations.local import LocalFileSystem
+
+from mlipx.columnar import frames_to_columns
+from mlipx.frames import BufferedH5MDWriter, ChainedFrames, H5MDFrames
+
+
+@pytest.fixture
+def frames():
+    frames = [molecule("H2O"), bulk("Cu", cubic=True), molecule("CH4")] * 4
+    for idx, atoms in enumerate(frames):
+        atoms.rattle(0.01, seed=idx)
+    return frames
+
+
+def test_h5md_frames(tmp_path, frames):
+    path = tmp_path / "frames.h5"
+    znh5md.IO(path).extend(frames)
+    sequence = H5MDFrames(LocalFileSystem(), path.as_posix(), range(12)[1:])
+    sequence.chunk_size = 5
+
+    assert len(sequence) == 11
+    np.testing.assert_allclose(sequence[-1].positions, frames[-1].positions)
+    for index in [slice(None), slice(2, 9, 3), slice(None, None, -2)]:
+        selected = sequence[index]
+        assert len(selected) == len(frames[1:][index])
+        for atoms, ref in zip(selected, frames[1:][index]):
+            np.testing.assert_allclose(atoms.positions, ref.positions)
+    assert len(list(sequence)) == 11
+    assert len([] + sequence) == 11
+    with pytest.raises(IndexError):
+        sequence[11]
+
+    columns = sequence.get_columns(["numbers", "positions"], 2, 6)
+    expected = frames_to_columns(frames[3:7], ["numbers", "positions"])
+    np.testing.assert_array_equal(columns["offsets"], expected["offsets"])
+    np.testing.assert_allclose(columns["positions"], expected["positions"])
+
+
+def test_buffered_h5md_writer(tmp_path, frames):
+    path = tmp_path / "frames.h5"
+    with BufferedH5MDWriter(path, flush_interval=5) as writer:
+        for atoms in frames:
+            writer.append(atoms)
+        assert len(writer.buffer) == 2
+
+    sequence = H5MDFrames(LocalFileSystem(), path.as_posix())
+    assert len(sequence) == len(frames)
+    np.testing.assert_allclose(sequence[7].positions, frames[7].positions)
+
+
+def test_chained_frames(tmp_path, frames):
+    sequences = []
+    for idx, chunk in enumerate([frames[:5], frames[5:]]):
+        path = tmp_path / f"{idx}.h5"
+        znh5md.IO(path).extend(chunk)
+        sequences.append(H5MDFrames(LocalFileSystem(), path.as_posix()))
+    chained = ChainedFrames([sequences[0], [], sequences[1]])
+
+    assert len(chained) == 12
+    for index in [slice(None), slice(3, 8), slice(None, None, -3)]:
+        selected = chained[index]
+        assert len(selected) == len(frames[index])
+        for atoms, ref in zip(selected, frames[index]):
+            np.testing.assert_allclose(atoms.positions, ref.positions)
+    np.testing.assert_allclose(chained[-1].positions, frames[-1].positions)
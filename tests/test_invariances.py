@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+from ase.build import molecule
+
+import mlipx
+
+pytestmark = pytest.mark.filterwarnings("ignore:Using the NWD outside a project")
+
+
+def test_rotational_invariance_properties(recording_model):
+    node = mlipx.RotationalInvariance(
+        model=recording_model,
+        data=[molecule("H2O")],
+        n_points=3,
+        properties=["energy", "forces"],
+    )
+    node.nwd.mkdir(parents=True, exist_ok=True)
+    node.run()
+
+    assert recording_model.requested == [["energy", "forces"]] * 3
+    assert node.metrics["std"] == pytest.approx(0, abs=1e-8)
+    frames = node.frames
+    assert len(frames) == 3
+    # the forces rotate with the molecule, their magnitude is unchanged
+    norms = [np.linalg.norm(atoms.get_forces(), axis=1) for atoms in frames]
+    np.testing.assert_allclose(norms[1:], [norms[0]] * 2, atol=1e-8)
@@ -0,0 +1,130 @@
+import os
+
+import ase.io
+import numpy as np
+import pytest
+from ase.build import bulk, fcc111, molecule
+from ase.calculators.emt import EMT
+from ase.constraints import FixAtoms
+
+from mlipx.frames import H5MDFrames
+from mlipx.nodes.io import (
+    ExtxyzFrames,
+    LoadDataFile,
+    build_extxyz_index,
+    read_extxyz_frames,
+)
+
+
+@pytest.fixture
+def extxyz_file(tmp_path):
+    frames = [molecule("H2O"), bulk("Cu", cubic=True), molecule("CH4")] * 4
+    for idx, atoms in enumerate(frames):
+        atoms.info["idx"] = idx
+        atoms.rattle(0.01, seed=idx)
+    path = tmp_path / "frames.xyz"
+    ase.io.write(path, frames, format="extxyz")
+    return path
+
+
+@pytest.mark.parametrize(
+    ("index", "n_workers"),
+    [
+        (slice(None), 1),
+        (slice(2, 9, 3), 1),
+        (slice(-1, None), 1),
+        (slice(None, None, -2), 1),
+        (slice(1, None), 2),
+    ],
+)
+def test_read_extxyz_frames(extxyz_file, index, n_workers):
+    expected = list(ase.io.iread(extxyz_file, format="extxyz", index=index))
+    with open(extxyz_file, "rb") as f:
+        offsets = build_extxyz_index(f)
+        indices = range(len(offsets) - 1)[index]
+        frames = read_extxyz_frames(f, offsets, indices, n_workers)
+
+    assert len(offsets) == 13
+    assert len(frames) == len(expected)
+    for atoms, ref in zip(frames, expected):
+        assert atoms.info["idx"] == ref.info["idx"]
+        np.testing.assert_array_equal(atoms.positions, ref.positions)
+
+
+@pytest.mark.filterwarnings("ignore:Using the NWD outside a project")
+@pytest.mark.parametrize("n_workers", [1, 2])
+def test_load_data_file_chunks(extxyz_file, tmp_path, monkeypatch, n_workers):
+    monkeypatch.chdir(tmp_path)
+    node = LoadDataFile(
+        path=extxyz_file.as_posix(), step=2, chunk_size=4, n_workers=n_workers
+    )
+    node.nwd.mkdir(parents=True, exist_ok=True)
+    node.run()
+
+    expected = ase.io.read(extxyz_file, format="extxyz", index="::2")
+    frames = list(node.frames)
+    assert node.metrics["n_frames"] == len(expected) == 6
+    assert [atoms.info["idx"] for atoms in frames] == [
+        atoms.info["idx"] for atoms in expected
+    ]
+    assert all(type(atoms.info["idx"]) is int for atoms in frames)
+
+
+@pytest.mark.filterwarnings("ignore:Using the NWD outside a project")
+def test_load_data_file_binary_copy(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    frames = [molecule("H2O") for _ in range(3)]
+    for idx, atoms in enumerate(frames):
+        atoms.info["idx"] = idx
+        atoms.info["flag"] = bool(idx % 2)
+        atoms.arrays["tag"] = np.arange(len(atoms)) + idx
+    ase.io.write("frames.xyz", frames, format="extxyz")
+    node = LoadDataFile(path="frames.xyz")
+    node.nwd.mkdir(parents=True, exist_ok=True)
+    node.run()
+
+    assert isinstance(node.frames, H5MDFrames)
+    for atoms, ref in zip(node.frames, frames):
+        assert atoms.info["idx"] == ref.info["idx"]
+        assert type(atoms.info["flag"]) is bool
+        assert atoms.arrays["tag"].dtype.kind == "i"
+        np.testing.assert_array_equal(atoms.arrays["tag"], ref.arrays["tag"])
+
+    # e.g. a checkout changes the modification time, but not the content
+    os.utime("frames.xyz", ns=(0, 0))
+    assert isinstance(node.frames, H5MDFrames)
+
+    # a changed source file is read instead of the binary copy
+    frames[0].info["idx"] = 0.5
+    ase.io.write("frames.xyz", frames, format="extxyz")
+    assert not isinstance(node.frames, H5MDFrames)
+    assert node.frames[0].info["idx"] == 0.5
+
+    # keys that can not be restored from the binary copy
+    node.run()
+    assert isinstance(node.frames, ExtxyzFrames)
+    idx = [np.asarray(atoms.info["idx"]) for atoms in node.frames]
+    assert [value.dtype.kind for value in idx] == ["f", "i", "i"]
+    assert idx == [0.5, 1, 2]
+
+
+@pytest.mark.filterwarnings("ignore:Using the NWD outside a project")
+def test_load_data_file_constraints(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    slab = fcc111("Cu", size=(2, 2, 3), vacuum=5.0)
+    slab.info.clear()
+    slab.set_constraint(FixAtoms(mask=slab.get_tags() == 3))
+    slab.rattle(0.05, seed=0)
+    ase.io.write("slab.xyz", [slab, bulk("Cu", cubic=True)], format="extxyz")
+    node = LoadDataFile(path="slab.xyz")
+    node.nwd.mkdir(parents=True, exist_ok=True)
+    node.run()
+
+    # H5MD does not store constraints, the source file is read instead
+    assert isinstance(node.frames, ExtxyzFrames)
+    atoms = node.frames[0]
+    assert len(atoms.constraints) == 1
+    atoms.calc = EMT()
+    slab.calc = EMT()
+    np.testing.assert_allclose(atoms.get_forces(), slab.get_forces(), atol=1e-6)
+    assert np.abs(atoms.get_forces()[slab.constraints[0].index]).max() == 0
@@ -0,0 +1,50 @@
+import types
+
+import pytest
+
+import mlipx.memoize
+from mlipx.memoize import cached_output, set_output_cache_size
+
+
+class Node:
+    def __init__(self, nwd, rev=None):
+        self.name = "Node"
+        self.nwd = nwd
+        self.state = types.SimpleNamespace(rev=rev, remote=None)
+        self.n_loads = 0
+
+    @cached_output
+    def frames(self):
+        self.n_loads += 1
+        return (self.nwd / "frames.txt").read_text()
+
+
+@pytest.fixture
+def shared_cache():
+    yield
+    set_output_cache_size(0)
+
+
+def test_cached_output(tmp_path):
+    (tmp_path / "frames.txt").write_text("a")
+    node = Node(tmp_path)
+    assert node.frames == "a"
+    assert node.frames == "a"
+    assert node.n_loads == 1
+
+    (tmp_path / "frames.txt").write_text("bc")
+    assert node.frames == "bc"
+    assert node.n_loads == 2
+
+
+def test_shared_output_cache(tmp_path, shared_cache):
+    (tmp_path / "frames.txt").write_text("a")
+    set_output_cache_size(1)
+    assert Node(tmp_path, rev="HEAD").frames == "a"
+
+    node = Node(tmp_path, rev="HEAD")
+    assert node.frames == "a"
+    assert node.n_loads == 0
+
+    Node(tmp_path, rev="main").frames
+    assert len(mlipx.memoize._shared_cache) == 1
@@ -0,0 +1,117 @@
+import dataclasses
+
+import numpy as np
+import pytest
+import znh5md
+from ase import units
+from ase.build import bulk
+from ase.calculators.emt import EMT
+from ase.md import Langevin
+
+import mlipx
+from mlipx.abc import DynamicsStep
+from mlipx.batching import ASEBatchCalculator
+from mlipx.nodes.molecular_dynamics import LangevinConfig, ObservableBuffer
+from mlipx.nodes.observer import MaximumForceObserver
+
+
+def test_observable_buffer():
+    buffer = ObservableBuffer(["energy", "fmax"], chunk_size=4)
+    for step in range(10):
+        buffer.append({"energy": -step, "fmax": step / 10})
+
+    assert len(buffer) == 10
+    df = buffer.to_dataframe()
+    assert list(df.columns) == ["energy", "fmax"]
+    np.testing.assert_array_equal(df["energy"], -np.arange(10))
+    assert ObservableBuffer(["energy"]).to_dataframe().empty
+
+
+def test_dynamics_step_observer():
+    atoms = bulk("Cu", cubic=True)
+    atoms.rattle(0.1, seed=0)
+    atoms.calc = EMT()
+    step = DynamicsStep(0, atoms)
+    fmax = np.linalg.norm(atoms.get_forces(), axis=1).max()
+
+    assert step.fmax == fmax
+    assert step.fnorm == np.linalg.norm(atoms.get_forces())
+    observer = MaximumForceObserver(f_max=fmax / 2, interval=10)
+    assert observer.interval == 10
+    with pytest.warns(UserWarning):
+        assert observer.check_step(step)
+    assert not MaximumForceObserver(f_max=2 * fmax).check_step(step)
+
+
+@pytest.mark.filterwarnings("ignore::FutureWarning")
+def test_batched_langevin_matches_ase():
+    frames = [bulk("Cu", cubic=True), bulk("Au", cubic=True) * (2, 1, 1)]
+    for idx, atoms in enumerate(frames):
+        atoms.rattle(0.05, seed=idx)
+    dyn = LangevinConfig(timestep=1.0, temperature=300, friction=0.01)
+    batched = dyn.get_batched_molecular_dynamics(
+        [atoms.copy() for atoms in frames], ASEBatchCalculator(EMT()), seeds=[3, 4]
+    )
+    for _ in batched.irun(steps=5):
+        pass
+
+    for atoms, ref, seed in zip(batched.frames, frames, [3, 4]):
+        ref.calc = EMT()
+        langevin = Langevin(
+            ref,
+            timestep=1.0 * units.fs,
+            temperature_K=300,
+            friction=0.01,
+            rng=np.random.default_rng(seed),
+        )
+        langevin.run(steps=5)
+        np.testing.assert_allclose(atoms.positions, ref.positions, atol=1e-10)
+        np.testing.assert_allclose(atoms.get_momenta(), ref.get_momenta(), atol=1e-10)
+        assert atoms.get_potential_energy() == pytest.approx(ref.get_potential_energy())
+
+
+@dataclasses.dataclass
+class EMTModel:
+    def get_calculator(self, **kwargs) -> EMT:
+        return EMT()
+
+
+@pytest.mark.filterwarnings("ignore:Using the NWD outside a project")
+@pytest.mark.filterwarnings("ignore::FutureWarning")
+def test_write_interval(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    written = []
+    extend = znh5md.IO.extend
+
+    def recording_extend(self, frames):
+        written.append(len(frames))
+        return extend(self, frames)
+
+    monkeypatch.setattr(znh5md.IO, "extend", recording_extend)
+    atoms = bulk("Cu", cubic=True)
+    atoms.rattle(0.05, seed=0)
+    node = mlipx.MolecularDynamics(
+        model=EMTModel(),
+        thermostat=LangevinConfig(timestep=2.0, temperature=300, friction=0.01),
+        data=[atoms],
+        steps=10,
+        write_interval=3,
+        flush_interval=2,
+    )
+    node.nwd.mkdir(parents=True, exist_ok=True)
+    node.run()
+
+    # steps 0, 3, 6 and 9 are written in blocks of two frames
+    assert written == [2, 2]
+    assert len(node.plots) == 11
+    assert node.frames_path.name == "frames.h5"
+    frames = znh5md.IO(node.frames_path)[:]
+    assert len(frames) == 4
+    np.testing.assert_allclose(
+        [x.get_potential_energy() for x in frames], node.plots["energy"][::3]
+    )
+    assert all(x.get_forces().shape == (len(atoms), 3) for x in frames)
+
+    figures = mlipx.MolecularDynamics.compare(node)["figures"]
+    for figure in figures.values():
+        np.testing.assert_array_equal(figure.data[0].x, [0, 3, 6, 9])
@@ -0,0 +1,206 @@
+import copy
+
+import ase.optimize
+import numpy as np
+import pytest
+from ase.build import bulk, molecule
+from ase.calculators.emt import EMT
+
+import mlipx
+from mlipx.batching import ASEBatchCalculator
+from mlipx.nodes.structure_optimization import BatchedOptimizer, get_inverse_hessian
+
+
+@pytest.mark.parametrize("optimizer", ["FIRE", "LBFGS"])
+def test_batched_optimizer(optimizer):
+    frames = [bulk("Cu", cubic=True) * (2, 1, 1), molecule("H2"), bulk("Au")]
+    for idx, atoms in enumerate(frames):
+        atoms.rattle(0.1, seed=idx)
+    frames[1].center(vacuum=5.0)
+    references = [atoms.copy() for atoms in frames]
+
+    dyn = BatchedOptimizer(
+        frames,
+        ASEBatchCalculator(EMT()),
+        getattr(ase.optimize, optimizer),
+        fmax=0.05,
+        steps=50,
+    )
+    n_active = [len(active) for active in dyn.irun()]
+
+    assert n_active == sorted(n_active, reverse=True)
+    for idx, (atoms, ref) in enumerate(zip(frames, references)):
+        ref.calc = EMT()
+        ref_dyn = getattr(ase.optimize, optimizer)(ref, logfile=None)
+        converged = ref_dyn.run(fmax=0.05, steps=50)
+        assert dyn.converged[idx] == converged
+        assert dyn.optimizers[idx].nsteps == ref_dyn.nsteps
+        np.testing.assert_allclose(atoms.positions, ref.positions, atol=1e-10)
+        assert atoms.get_potential_energy() == pytest.approx(ref.get_potential_energy())
+
+
+def test_lbfgs_inverse_hessian():
+    atoms = bulk("Cu", cubic=True) * (2, 1, 1)
+    atoms.rattle(0.1, seed=0)
+    atoms.calc = EMT()
+    dyn = ase.optimize.LBFGS(atoms, logfile=None)
+    dyn.run(fmax=0, steps=5)
+
+    inverse_hessian = get_inverse_hessian(dyn)
+    gradient = -atoms.get_forces().ravel()
+    # the two-loop recursion over the stored history applies the same matrix
+    state = copy.deepcopy(dyn.state)
+    state.iteration = len(state.s)
+    step = state.compute_step(gradient)
+
+    np.testing.assert_allclose(inverse_hessian, inverse_hessian.T, atol=1e-12)
+    np.testing.assert_allclose(-inverse_hessian @ gradient, step, atol=1e-10)
+
+
+@pytest.fixture
+def cascade(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    frames = []
+    # the last two structures are strained and high in energy
+    for idx, a in enumerate([3.6, 3.6, 3.9, 4.2]):
+        atoms = bulk("Cu", "fcc", a=a, cubic=True)
+        atoms.rattle(0.1, seed=idx)
+        frames.append(atoms)
+    emt = mlipx.GenericASECalculator(module="ase.calculators.emt", class_name="EMT")
+
+    def get_node(**kwargs) -> mlipx.CascadeStructureOptimization:
+        node = mlipx.CascadeStructureOptimization(
+            data=frames, models=[emt, emt], fmax=[0.2, 0.02], **kwargs
+        )
+        node.nwd.mkdir(parents=True, exist_ok=True)
+        return node
+
+    return get_node
+
+
+@pytest.mark.filterwarnings("ignore:Using the NWD outside a project")
+def test_cascade_structure_optimization(cascade):
+    node = cascade(energy_window=0.1, reference=True)
+    node.run()
+
+    stages = [node.metrics["stage_0"], node.metrics["stage_1"]]
+    assert [stage["n_structures"] for stage in stages] == [4, 2]
+    assert stages[0]["n_filtered"] == 2
+    assert all(stage["n_converged"] == stage["n_structures"] for stage in stages)
+    assert [atoms.info["structure"] for atoms in node.frames] == [0, 1]
+    for atoms in node.frames:
+        assert np.linalg.norm(atoms.get_forces(), axis=1).max() < 0.02
+    assert set(node.plots["stage"]) == {0, 1}
+
+    metrics = node.metrics
+    assert stages[0]["force_calls_saved"] == metrics["force_calls_saved_by_filter"] > 0
+    assert (
+        stages[1]["force_calls_saved"]
+        == (metrics["force_calls_saved_by_pre_relaxation"])
+    )
+    assert metrics["force_calls_saved"] == (
+        metrics["force_calls_saved_by_filter"]
+        + metrics["force_calls_saved_by_pre_relaxation"]
+    )
+    assert metrics["force_calls_saved"] == (
+        metrics["reference_force_calls"] - stages[1]["n_force_calls"]
+    )
+
+
+@pytest.mark.filterwarnings("ignore:Using the NWD outside a project")
+def test_cascade_without_reference(cascade):
+    node = cascade()
+    node.run()
+
+    assert node.metrics["stage_0"]["n_filtered"] == 0
+    assert node.metrics["stage_1"]["n_structures"] == 4
+    assert node.metrics["n_force_calls"] == sum(
+        node.metrics[f"stage_{stage}"]["n_force_calls"] for stage in range(2)
+    )
+    assert "force_calls_saved" not in node.metrics
+    assert "force_calls_saved" not in node.metrics["stage_1"]
+
+
+@pytest.mark.filterwarnings("ignore:Using the NWD outside a project")
+def test_cascade_empty_stage(cascade):
+    node = cascade(data_ids=[], reference=True)
+    with pytest.warns(UserWarning, match="No structures left"):
+        node.run()
+
+    assert node.metrics["stage_1"]["n_structures"] == 0
+    assert node.metrics["force_calls_saved"] == 0
+    assert len(node.frames) == 0
+
+
+@pytest.fixture
+def relax(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    emt = mlipx.GenericASECalculator(module="ase.calculators.emt", class_name="EMT")
+
+    def run(atoms, name, **kwargs) -> mlipx.StructureOptimization:
+        node = mlipx.StructureOptimization(
+            data=[atoms.copy()], model=emt, fmax=0.01, name=name, **kwargs
+        )
+        node.nwd.mkdir(parents=True, exist_ok=True)
+        node.run()
+        return node
+
+    return run
+
+
+@pytest.fixture
+def rattled():
+    atoms = bulk("Cu", cubic=True) * (2, 2, 1)
+    atoms.rattle(0.1, seed=0)
+    return atoms
+
+
+@pytest.mark.filterwarnings("ignore:Using the NWD outside a project")
+def test_structure_optimization_metrics(relax, rattled):
+    node = relax(rattled, "lbfgs", optimizer="LBFGS")
+
+    assert node.metrics["converged"]
+    # one force call per step, including the initial structure
+    assert node.metrics["n_force_calls"] == node.metrics["n_steps"] + 1
+    assert node.metrics["n_force_calls"] == len(node.plots)
+    assert node.inverse_hessian is None
+
+
+@pytest.mark.filterwarnings("ignore:Using the NWD outside a project")
+@pytest.mark.parametrize("optimizer", ["PreconLBFGS", "PreconFIRE"])
+def test_structure_optimization_precon(relax, rattled, optimizer):
+    node = relax(rattled, optimizer, optimizer=optimizer, precon="Exp")
+
+    assert node.metrics["converged"]
+    # line searches evaluate additional structures
+    assert node.metrics["n_force_calls"] >= node.metrics["n_steps"] + 1
+    with pytest.raises(ValueError, match="does not use a preconditioner"):
+        relax(rattled, "lbfgs", optimizer="LBFGS", precon="Exp")
+
+
+@pytest.mark.filterwarnings("ignore:Using the NWD outside a project")
+def test_structure_optimization_cell_filter(relax):
+    atoms = bulk("Cu", "fcc", a=3.7, cubic=True)
+    node = relax(atoms, "cell", cell_filter="FrechetCellFilter")
+
+    relaxed = node.frames[-1]
+    assert node.metrics["converged"]
+    assert relaxed.get_volume() < atoms.get_volume()
+    # EMT copper has a lattice constant of about 3.59 Å
+    assert relaxed.cell[0, 0] == pytest.approx(3.59, abs=0.01)
+
+
+@pytest.mark.filterwarnings("ignore:Using the NWD outside a project")
+def test_structure_optimization_warm_start(relax, rattled):
+    first = relax(rattled, "first", optimizer="LBFGS", save_inverse_hessian=True)
+    cold = relax(rattled, "cold", optimizer="LBFGS")
+    warm = relax(rattled, "warm", optimizer="LBFGS", warm_start=first)
+
+    n_dofs = 3 * len(rattled)
+    assert first.inverse_hessian.shape == (n_dofs, n_dofs)
+    np.testing.assert_allclose(first.inverse_hessian, first.inverse_hessian.T)
+    assert warm.metrics["converged"]
+    assert warm.metrics["n_force_calls"] < cold.metrics["n_force_calls"]
+    np.testing.assert_allclose(
+        warm.frames[-1].positions, cold.frames[-1].positions, atol=0.01
+    )